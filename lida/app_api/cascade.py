@@ -0,0 +1,180 @@
+"""Decay cascades of the LIDA states, served by the api/cascade/ endpoint.
+
+The cascade of a state is the subgraph of all the states reachable from it through
+the transitions (its decay channels, their decay channels, and so on), traversed
+breadth-first from the state. The traversal runs on the adjacency of the transitions
+held in memory in the compressed sparse row (CSR) layout: the decay channels of the
+state i are the transitions indptr[i]:indptr[i + 1], ordered by their partial
+lifetimes, with their final states in indices. The graph of each isotopologue is
+built from two queries and cached per process (settings.CASCADE_CACHE_SIZE graphs,
+least recently used dropped first), keyed by the version stamps of the isotopologue,
+so it is rebuilt whenever its data change.
+"""
+import threading
+from collections import OrderedDict, deque
+
+from django.conf import settings
+
+from app_site.models import Transition
+from app_site.models.utils import get_state_str
+from lida.db import iterate
+from lida.metrics import cache_requests
+
+from .export import CHUNK_SIZE
+
+
+class CascadeGraph:
+    """CSR adjacency of the transitions of a single isotopologue, with the states
+    indexed in the order of their primary keys.
+    """
+
+    def __init__(self, isotopologue):
+        import numpy as np
+
+        states = isotopologue.state_set.order_by("pk").values_list(
+            "pk", "slug", "el_state_str", "vib_state_str", "energy", "lifetime"
+        )
+        pks, self.slugs, self.state_strs = [], [], []
+        self.energies, self.lifetimes = [], []
+        for pk, slug, el_state_str, vib_state_str, energy, lifetime in iterate(
+            states, CHUNK_SIZE
+        ):
+            pks.append(pk)
+            self.slugs.append(slug)
+            self.state_strs.append(
+                get_state_str(isotopologue, el_state_str, vib_state_str)
+            )
+            self.energies.append(energy)
+            self.lifetimes.append(lifetime)
+        self.index = {pk: i for i, pk in enumerate(pks)}
+        self.slug_index = {slug: i for i, slug in enumerate(self.slugs)}
+
+        transitions = (
+            Transition.objects.filter(initial_state__isotopologue=isotopologue)
+            .order_by("initial_state_id", "partial_lifetime")
+            .values_list(
+                "initial_state_id",
+                "final_state_id",
+                "partial_lifetime",
+                "branching_ratio",
+            )
+        )
+        initial, final, partial_lifetimes, branching_ratios = [], [], [], []
+        for initial_pk, final_pk, partial_lifetime, branching_ratio in iterate(
+            transitions, CHUNK_SIZE
+        ):
+            initial.append(self.index[initial_pk])
+            final.append(self.index[final_pk])
+            partial_lifetimes.append(partial_lifetime)
+            branching_ratios.append(branching_ratio)
+        counts = np.bincount(np.array(initial, dtype=np.int64), minlength=len(pks))
+        self.indptr = np.zeros(len(pks) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.indptr[1:])
+        self.indices = np.array(final, dtype=np.int32)
+        self.partial_lifetimes = np.array(partial_lifetimes, dtype=float)
+        # undefined branching ratios (nan) never pass the min_branching_ratio
+        self.branching_ratios = np.array(branching_ratios, dtype=float)
+
+    def traverse(
+        self, start, max_depth=None, min_branching_ratio=None, max_states=None
+    ):
+        """Breadth-first traversal of the cascade of the state (index) start.
+
+        Only the transitions with branching ratios of at least min_branching_ratio
+        are followed, and only the states up to max_depth transitions away from the
+        start are expanded. At most max_states states are visited.
+
+        Returns
+        -------
+        depths : dict
+            {state index: its depth (the least number of transitions from start)},
+            in the order of the traversal.
+        edges : list
+            Indices of the transitions traversed (between the visited states).
+        truncated : bool
+            If any states were left out because of max_states.
+        """
+        depths = {start: 0}
+        edges = []
+        truncated = False
+        queue = deque([start])
+        while queue:
+            i = queue.popleft()
+            depth = depths[i]
+            if max_depth is not None and depth >= max_depth:
+                continue
+            channels = range(self.indptr[i], self.indptr[i + 1])
+            if min_branching_ratio is not None:
+                passed = (
+                    self.branching_ratios[channels.start : channels.stop]
+                    >= min_branching_ratio
+                )
+                channels = [t for t, ok in zip(channels, passed) if ok]
+            for t in channels:
+                j = int(self.indices[t])
+                if j not in depths:
+                    if max_states is not None and len(depths) >= max_states:
+                        truncated = True
+                        continue
+                    depths[j] = depth + 1
+                    queue.append(j)
+                edges.append(t)
+        return depths, edges, truncated
+
+    def get_cascade_dict(self, start, **limits):
+        """The json-serialisable cascade of the state, see traverse for the limits."""
+        import numpy as np
+
+        depths, edges, truncated = self.traverse(start, **limits)
+        # the initial state of the transition t is the row i of indptr holding t
+        initial_states = np.searchsorted(self.indptr, edges, side="right") - 1
+        states = [
+            {
+                "slug": self.slugs[i],
+                "state": self.state_strs[i],
+                "energy": self.energies[i],
+                "lifetime": self.lifetimes[i],
+                "depth": depth,
+            }
+            for i, depth in depths.items()
+        ]
+        transitions = [
+            {
+                "initial_state": self.slugs[i],
+                "final_state": self.slugs[self.indices[t]],
+                "partial_lifetime": float(self.partial_lifetimes[t]),
+                "branching_ratio": _nan_to_none(float(self.branching_ratios[t])),
+            }
+            for i, t in zip(initial_states.tolist(), edges)
+        ]
+        return {"states": states, "transitions": transitions, "truncated": truncated}
+
+
+def _nan_to_none(value):
+    return None if value != value else value
+
+
+_graphs = OrderedDict()
+_graphs_lock = threading.Lock()
+
+
+def get_graph(isotopologue, stamp):
+    """The (cached) CascadeGraph of the isotopologue, for its version stamp (any
+    value changing whenever the data of the isotopologue change).
+    """
+    key = (isotopologue.pk, stamp)
+    with _graphs_lock:
+        graph = _graphs.get(key)
+        if graph is not None:
+            _graphs.move_to_end(key)
+    cache_requests.inc(cache="cascade_graph", result="miss" if graph is None else "hit")
+    if graph is None:
+        # built outside the lock, two concurrent misses merely build it twice
+        graph = CascadeGraph(isotopologue)
+        with _graphs_lock:
+            for old_key in [k for k in _graphs if k[0] == isotopologue.pk]:
+                del _graphs[old_key]
+            _graphs[key] = graph
+            while len(_graphs) > getattr(settings, "CASCADE_CACHE_SIZE", 16):
+                _graphs.popitem(last=False)
+    return graph
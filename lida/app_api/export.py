@@ -0,0 +1,377 @@
+"""Serialisation of the LIDA data served by the API endpoints.
+
+All the rows are read with values_list queries and chunked iteration (no model
+instances and no per-row queries for the related states, isotopologues or molecules),
+so whole datasets can be streamed in bounded memory. The same row generators back the
+single-molecule and the batch endpoints.
+"""
+import csv
+import io
+import json
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from app_site.models import Transition
+from app_site.models.utils import get_state_str
+from lida.db import iterate
+
+CHUNK_SIZE = 2000
+
+STATES_CSV_HEADER = ["State", "Lifetime /s", "Energy /eV"]
+TRANSITIONS_CSV_HEADER = [
+    "Initial State",
+    "Final State",
+    "Partial Lifetime /s",
+    "Delta Energy /eV",
+    "Branching Ratio",
+]
+
+
+def get_meta_dict(isotopologue):
+    """The meta-data heading all the json responses."""
+    molecule_dict = {
+        "molecule_formula": isotopologue.molecule.formula_str,
+        "isotopologue_formula": isotopologue.iso_formula_str,
+    }
+    dataset_dict = {
+        "name": isotopologue.dataset_name,
+        "version": isotopologue.version,
+        "number_states": isotopologue.number_states,
+        "number_transitions": isotopologue.number_transitions,
+    }
+    return {"molecule": molecule_dict, "dataset": dataset_dict}
+
+
+def get_transitions(isotopologue, min_branching_ratio=None, state_filter=None):
+    """The transitions of the isotopologue, optionally only those of at least the
+    min_branching_ratio, and from the initial states passing the state_filter (see
+    get_states).
+    """
+    transitions = Transition.objects.filter(initial_state__isotopologue=isotopologue)
+    if min_branching_ratio is not None:
+        transitions = transitions.filter(branching_ratio__gte=min_branching_ratio)
+    if state_filter is not None:
+        transitions = transitions.filter(
+            initial_state__in=isotopologue.state_set.filter(state_filter)
+        )
+    return transitions
+
+
+def get_states(isotopologue, state_filter=None):
+    """The states of the isotopologue, optionally filtered by the state_filter Q
+    object (e.g. the ranges of the vibrational quanta, see get_range_filter).
+    """
+    states = isotopologue.state_set.order_by("pk")
+    if state_filter is not None:
+        states = states.filter(state_filter)
+    return states
+
+
+def get_state_strs(isotopologue):
+    """Dict of {state.pk: str(state)} for all the states of the isotopologue,
+    built with a single query.
+    """
+    states = get_states(isotopologue).values_list("pk", "el_state_str", "vib_state_str")
+    return {
+        pk: get_state_str(isotopologue, el_state_str, vib_state_str)
+        for pk, el_state_str, vib_state_str in iterate(states, CHUNK_SIZE)
+    }
+
+
+def iter_state_rows(isotopologue, state_filter=None):
+    """Yields (state_str, lifetime, energy) for all the states of the isotopologue."""
+    states = get_states(isotopologue, state_filter).values_list(
+        "el_state_str", "vib_state_str", "lifetime", "energy"
+    )
+    for el_state_str, vib_state_str, lifetime, energy in iterate(states, CHUNK_SIZE):
+        yield get_state_str(isotopologue, el_state_str, vib_state_str), lifetime, energy
+
+
+def iter_transition_rows(isotopologue, min_branching_ratio=None, state_filter=None):
+    """Yields (initial_state_str, final_state_str, partial_lifetime, delta_energy,
+    branching_ratio) for all the transitions of the isotopologue.
+    The state strings are looked up from a single states query, rather than joined
+    to each transition row.
+    """
+    state_strs = get_state_strs(isotopologue)
+    transitions = get_transitions(
+        isotopologue, min_branching_ratio, state_filter
+    ).values_list(
+        "initial_state_id",
+        "final_state_id",
+        "partial_lifetime",
+        "delta_energy",
+        "branching_ratio",
+    )
+    for initial_pk, final_pk, *values in iterate(transitions, CHUNK_SIZE):
+        yield (state_strs[initial_pk], state_strs[final_pk], *values)
+
+
+def iter_rows(isotopologue, category, min_branching_ratio=None, state_filter=None):
+    if category == "states":
+        return iter_state_rows(isotopologue, state_filter)
+    return iter_transition_rows(isotopologue, min_branching_ratio, state_filter)
+
+
+def iter_csv(isotopologue, category, min_branching_ratio=None, state_filter=None):
+    """Yields the csv text in chunks of CHUNK_SIZE rows."""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(
+        STATES_CSV_HEADER if category == "states" else TRANSITIONS_CSV_HEADER
+    )
+    for i, row in enumerate(
+        iter_rows(isotopologue, category, min_branching_ratio, state_filter)
+    ):
+        writer.writerow(row)
+        if (i + 1) % CHUNK_SIZE == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+
+def _state_entry(row):
+    state_str, lifetime, energy = row
+    return state_str, {"lifetime": lifetime, "energy": energy}
+
+
+def _transition_entry(row):
+    initial_state_str, final_state_str, partial_lifetime, delta_energy, br = row
+    return f"{initial_state_str} → {final_state_str}", {
+        "partial_lifetime": partial_lifetime,
+        "delta_energy": delta_energy,
+        "branching_ratio": br,
+    }
+
+
+def iter_json(isotopologue, category, min_branching_ratio=None, state_filter=None):
+    """Yields the json text in chunks of CHUNK_SIZE rows. The document has the same
+    structure (and content) as the JsonResponse of the api_endpoint, but is never
+    held in memory as a whole.
+    """
+    entry = _state_entry if category == "states" else _transition_entry
+    meta = json.dumps(get_meta_dict(isotopologue), cls=DjangoJSONEncoder)
+    chunk = [f'{meta[:-1]}, "{category}": {{']
+    for i, row in enumerate(
+        iter_rows(isotopologue, category, min_branching_ratio, state_filter)
+    ):
+        key, value = entry(row)
+        separator = ", " if i else ""
+        chunk.append(f"{separator}{json.dumps(key)}: {json.dumps(value)}")
+        if (i + 1) % CHUNK_SIZE == 0:
+            yield "".join(chunk)
+            chunk = []
+    chunk.append("}}")
+    yield "".join(chunk)
+
+
+def iter_ndjson(isotopologue, category, min_branching_ratio=None, state_filter=None):
+    """Yields newline-delimited json: one line for the dataset meta-data, and one
+    line per each state or transition, every line tagged by the molecule formula.
+    """
+    formula = isotopologue.molecule.formula_str
+    meta = {
+        "molecule": formula,
+        "category": "dataset",
+        "isotopologue_formula": isotopologue.iso_formula_str,
+        "dataset": get_meta_dict(isotopologue)["dataset"],
+    }
+    lines = [json.dumps(meta)]
+    for i, row in enumerate(
+        iter_rows(isotopologue, category, min_branching_ratio, state_filter)
+    ):
+        if category == "states":
+            state_str, lifetime, energy = row
+            record = {"state": state_str, "lifetime": lifetime, "energy": energy}
+        else:
+            initial_state_str, final_state_str, partial_lifetime, delta_energy, br = row
+            record = {
+                "initial_state": initial_state_str,
+                "final_state": final_state_str,
+                "partial_lifetime": partial_lifetime,
+                "delta_energy": delta_energy,
+                "branching_ratio": br,
+            }
+        lines.append(json.dumps({"molecule": formula, "category": category, **record}))
+        if (i + 1) % CHUNK_SIZE == 0:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def _import_pyarrow():
+    """The pyarrow library is an optional dependency, needed only for the parquet and
+    arrow formats. Returns None if not installed.
+    """
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def get_binary_formats():
+    """Columnar binary formats available with the installed libraries."""
+    if _import_pyarrow() is None:
+        return ["npz"]
+    return ["npz", "parquet", "arrow"]
+
+
+def get_columns(isotopologue, category, min_branching_ratio=None, state_filter=None):
+    """Numpy arrays of the data columns, as a dict {column_name: array}.
+
+    The states are always included (the "state" column, with the states ordered by
+    their primary keys), and the transitions reference the states by their integer
+    index into the states arrays, rather than repeating the state strings.
+    Infinite lifetimes are represented by inf, undefined branching ratios by nan.
+    """
+    import numpy as np
+
+    columns = {}
+    state_index, state_strs, lifetimes, energies = {}, [], [], []
+    # all the states referenced by the transitions, the filtered states otherwise
+    states = get_states(
+        isotopologue, state_filter if category == "states" else None
+    ).values_list("pk", "el_state_str", "vib_state_str", "lifetime", "energy")
+    for i, (pk, el_state_str, vib_state_str, lifetime, energy) in enumerate(
+        iterate(states, CHUNK_SIZE)
+    ):
+        state_index[pk] = i
+        state_strs.append(get_state_str(isotopologue, el_state_str, vib_state_str))
+        lifetimes.append(lifetime)
+        energies.append(energy)
+    columns["state"] = np.array(state_strs, dtype=str)
+    if category == "states":
+        columns["lifetime"] = np.array(lifetimes, dtype=float)
+        columns["lifetime"][np.isnan(columns["lifetime"])] = np.inf
+        columns["energy"] = np.array(energies, dtype=float)
+        return columns
+
+    transitions = get_transitions(
+        isotopologue, min_branching_ratio, state_filter
+    ).values_list(
+        "initial_state_id",
+        "final_state_id",
+        "partial_lifetime",
+        "delta_energy",
+        "branching_ratio",
+    )
+    rows = list(iterate(transitions, CHUNK_SIZE))
+    initial, final, partial_lifetime, delta_energy, branching_ratio = (
+        zip(*rows) if rows else ([],) * 5
+    )
+    index_dtype = np.int32
+    columns["initial_state"] = np.array(
+        [state_index[pk] for pk in initial], dtype=index_dtype
+    )
+    columns["final_state"] = np.array(
+        [state_index[pk] for pk in final], dtype=index_dtype
+    )
+    columns["partial_lifetime"] = np.array(partial_lifetime, dtype=float)
+    columns["delta_energy"] = np.array(delta_energy, dtype=float)
+    columns["branching_ratio"] = np.array(branching_ratio, dtype=float)
+    return columns
+
+
+def get_npz(isotopologue, category, min_branching_ratio=None, state_filter=None):
+    """Compressed numpy .npz archive of the columns (see get_columns)."""
+    import numpy as np
+
+    output = io.BytesIO()
+    np.savez_compressed(
+        output,
+        **get_columns(isotopologue, category, min_branching_ratio, state_filter),
+    )
+    return output.getvalue()
+
+
+def _get_arrow_table(
+    isotopologue, category, min_branching_ratio=None, state_filter=None
+):
+    """A single arrow table, where the states of the transitions are dictionary
+    encoded: stored as integer indices into the states dictionary, which holds each
+    state string only once.
+    """
+    pa = _import_pyarrow()
+    columns = get_columns(isotopologue, category, min_branching_ratio, state_filter)
+    states = pa.array(columns.pop("state"))
+    if category == "states":
+        return pa.table({"state": states, **columns})
+    for key in "initial_state", "final_state":
+        columns[key] = pa.DictionaryArray.from_arrays(columns[key], states)
+    return pa.table(columns)
+
+
+def get_parquet(isotopologue, category, min_branching_ratio=None, state_filter=None):
+    pa = _import_pyarrow()
+    output = pa.BufferOutputStream()
+    pa.parquet.write_table(
+        _get_arrow_table(isotopologue, category, min_branching_ratio, state_filter),
+        output,
+    )
+    return output.getvalue().to_pybytes()
+
+
+def get_arrow(isotopologue, category, min_branching_ratio=None, state_filter=None):
+    """Arrow IPC file format."""
+    pa = _import_pyarrow()
+    table = _get_arrow_table(isotopologue, category, min_branching_ratio, state_filter)
+    output = pa.BufferOutputStream()
+    with pa.ipc.new_file(output, table.schema) as writer:
+        writer.write_table(table)
+    return output.getvalue().to_pybytes()
+
+
+BINARY_FORMATS = {
+    "npz": (get_npz, "application/octet-stream"),
+    "parquet": (get_parquet, "application/vnd.apache.parquet"),
+    "arrow": (get_arrow, "application/vnd.apache.arrow.file"),
+}
+
+
+class _UnseekableStream(io.RawIOBase):
+    """Write-only stream collecting whatever the zipfile writes into it, so it can be
+    handed over to a streaming response piece by piece.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip(members):
+    """Streams a zip archive without ever holding it in memory.
+
+    Parameters
+    ----------
+    members : iterable[tuple[str, iterable[str | bytes]]]
+        The archive member names together with the text (or binary) chunks making
+        them up.
+    """
+    stream = _UnseekableStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, chunks in members:
+            with archive.open(name, "w", force_zip64=True) as member:
+                for chunk in chunks:
+                    member.write(chunk if isinstance(chunk, bytes) else chunk.encode())
+                    data = stream.pop()
+                    if data:
+                        yield data
+    yield stream.pop()
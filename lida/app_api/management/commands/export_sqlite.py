@@ -0,0 +1,62 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_api.snapshot import DATABASE_SNAPSHOT, get_snapshot, write_snapshot
+from app_site.models import Isotopologue
+
+
+class Command(BaseCommand):
+    help = (
+        "Writes the LIDA data into standalone SQLite database files, either the whole "
+        "database (or the selected molecules) into a single file, or each isotopologue "
+        "into a file of its own. Without the output, writes the snapshot of the whole "
+        "database served by the api/sqlite/ endpoint, to be re-run after the data "
+        "change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "output",
+            nargs="?",
+            help="The SQLite file to write, or the directory to write the files into "
+            "with --per-isotopologue.",
+        )
+        parser.add_argument(
+            "--molecule",
+            action="append",
+            help="Molecule formula to export (repeatable), defaults to all of them.",
+        )
+        parser.add_argument(
+            "--per-isotopologue",
+            action="store_true",
+            help="Write each isotopologue into {output}/{molecule slug}.sqlite3.",
+        )
+
+    def handle(self, *args, **options):
+        isotopologues = Isotopologue.objects.select_related("molecule")
+        molecules = options["molecule"]
+        if molecules:
+            isotopologues = isotopologues.filter(molecule__formula_str__in=molecules)
+            missing = set(molecules) - {str(iso) for iso in isotopologues}
+            if missing:
+                raise CommandError(f"Unknown molecules: {', '.join(sorted(missing))}")
+        if not isotopologues.exists():
+            raise CommandError("No data to export!")
+
+        if options["output"] is None:
+            if molecules or options["per_isotopologue"]:
+                raise CommandError("The output is required to export the molecules!")
+            path = get_snapshot(isotopologues, DATABASE_SNAPSHOT)
+            self.stdout.write(f"Written {path}")
+            return
+        output = Path(options["output"])
+        if not options["per_isotopologue"]:
+            write_snapshot(output, isotopologues)
+            self.stdout.write(f"Written {output}")
+            return
+        output.mkdir(parents=True, exist_ok=True)
+        for isotopologue in isotopologues.order_by("pk"):
+            path = output / f"{isotopologue.molecule.slug}.sqlite3"
+            write_snapshot(path, Isotopologue.objects.filter(pk=isotopologue.pk))
+            self.stdout.write(f"Written {path}")
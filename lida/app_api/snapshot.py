@@ -0,0 +1,272 @@
+"""Standalone SQLite snapshots of the LIDA data, for querying the data offline.
+
+The snapshots use a normalised schema of their own, rather than a copy of the site
+tables: the states are referenced by their integer ids, none of the html, sort-key
+or other redundant (synced) columns are included, and the indexes cover the typical
+analytical queries (states of an isotopologue by energy, decay channels of a state,
+transitions into a state). The ids are those of the LIDA database, so they are
+stable between the snapshots of the same data.
+
+The snapshots are written by the export_sqlite management command, and served by
+the api/sqlite/ endpoint, which caches them on disk (settings.SNAPSHOT_DIR) for as
+long as the data they were written from do not change. The snapshots of single
+molecules are written by the endpoint on demand, the snapshot of the whole database
+(which takes much longer to write) only by export_sqlite run without an output, to
+be re-run whenever the data change; the endpoint serves it once written.
+"""
+import hashlib
+import os
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+from app_site.models import Transition
+from app_site.models.utils import get_state_str
+from lida.db import iterate
+
+from .export import CHUNK_SIZE
+
+SCHEMA_VERSION = 1
+
+# name of the snapshot of the whole database
+DATABASE_SNAPSHOT = "lidb"
+
+SCHEMA = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE molecule (
+    id INTEGER PRIMARY KEY,
+    formula TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    charge INTEGER NOT NULL,
+    number_atoms INTEGER NOT NULL
+);
+CREATE TABLE isotopologue (
+    id INTEGER PRIMARY KEY,
+    molecule_id INTEGER NOT NULL REFERENCES molecule (id),
+    iso_formula TEXT NOT NULL,
+    dataset_name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    mass REAL NOT NULL,
+    ground_el_state TEXT NOT NULL,
+    vib_quantum_labels TEXT NOT NULL,
+    number_states INTEGER NOT NULL,
+    number_transitions INTEGER NOT NULL
+);
+CREATE TABLE state (
+    id INTEGER PRIMARY KEY,
+    isotopologue_id INTEGER NOT NULL REFERENCES isotopologue (id),
+    state TEXT NOT NULL,
+    el_state TEXT NOT NULL,
+    vib_state TEXT NOT NULL,
+    energy REAL NOT NULL,
+    lifetime REAL
+);
+CREATE TABLE "transition" (
+    id INTEGER PRIMARY KEY,
+    initial_state_id INTEGER NOT NULL REFERENCES state (id),
+    final_state_id INTEGER NOT NULL REFERENCES state (id),
+    partial_lifetime REAL NOT NULL,
+    delta_energy REAL NOT NULL,
+    branching_ratio REAL
+);
+"""
+
+# created after the data are inserted, which is faster than maintaining them
+INDEXES = """
+CREATE INDEX state_isotopologue_energy ON state (isotopologue_id, energy);
+CREATE INDEX transition_initial_state
+    ON "transition" (initial_state_id, partial_lifetime);
+CREATE INDEX transition_final_state ON "transition" (final_state_id);
+"""
+
+
+def _insert(db, table, columns, rows):
+    sql = (
+        f'INSERT INTO "{table}" ({", ".join(columns)}) '
+        f'VALUES ({", ".join("?" * len(columns))})'
+    )
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            db.executemany(sql, chunk)
+            chunk = []
+    db.executemany(sql, chunk)
+
+
+def _iter_state_rows(isotopologue):
+    states = isotopologue.state_set.order_by("pk").values_list(
+        "pk", "el_state_str", "vib_state_str", "energy", "lifetime"
+    )
+    for pk, el_state_str, vib_state_str, energy, lifetime in iterate(
+        states, CHUNK_SIZE
+    ):
+        state_str = get_state_str(isotopologue, el_state_str, vib_state_str)
+        yield (
+            pk,
+            isotopologue.pk,
+            state_str,
+            el_state_str,
+            vib_state_str,
+            energy,
+            lifetime,
+        )
+
+
+def write_snapshot(path, isotopologues):
+    """Writes the isotopologues (with their molecules, states and transitions) into
+    a new SQLite database file at the path (replacing any existing file).
+    """
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+    isotopologues = list(isotopologues.select_related("molecule").order_by("pk"))
+    db = sqlite3.connect(path)
+    try:
+        # the file is being written from scratch, no need for any crash safety:
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.executescript(SCHEMA)
+        with db:
+            _insert(
+                db,
+                "meta",
+                ["key", "value"],
+                [("schema_version", str(SCHEMA_VERSION))],
+            )
+            _insert(
+                db,
+                "molecule",
+                ["id", "formula", "name", "charge", "number_atoms"],
+                [
+                    (m.pk, m.formula_str, m.name, m.charge, m.number_atoms)
+                    for m in {iso.molecule for iso in isotopologues}
+                ],
+            )
+            _insert(
+                db,
+                "isotopologue",
+                [
+                    "id",
+                    "molecule_id",
+                    "iso_formula",
+                    "dataset_name",
+                    "version",
+                    "mass",
+                    "ground_el_state",
+                    "vib_quantum_labels",
+                    "number_states",
+                    "number_transitions",
+                ],
+                [
+                    (
+                        iso.pk,
+                        iso.molecule_id,
+                        iso.iso_formula_str,
+                        iso.dataset_name,
+                        iso.version,
+                        iso.mass,
+                        iso.ground_el_state_str,
+                        iso.vib_quantum_labels,
+                        iso.number_states,
+                        iso.number_transitions,
+                    )
+                    for iso in isotopologues
+                ],
+            )
+            for isotopologue in isotopologues:
+                _insert(
+                    db,
+                    "state",
+                    [
+                        "id",
+                        "isotopologue_id",
+                        "state",
+                        "el_state",
+                        "vib_state",
+                        "energy",
+                        "lifetime",
+                    ],
+                    _iter_state_rows(isotopologue),
+                )
+                transitions = (
+                    Transition.objects.filter(initial_state__isotopologue=isotopologue)
+                    .order_by("pk")
+                    .values_list(
+                        "pk",
+                        "initial_state_id",
+                        "final_state_id",
+                        "partial_lifetime",
+                        "delta_energy",
+                        "branching_ratio",
+                    )
+                )
+                _insert(
+                    db,
+                    "transition",
+                    [
+                        "id",
+                        "initial_state_id",
+                        "final_state_id",
+                        "partial_lifetime",
+                        "delta_energy",
+                        "branching_ratio",
+                    ],
+                    iterate(transitions, CHUNK_SIZE),
+                )
+            db.executescript(INDEXES)
+        db.execute("ANALYZE")
+    finally:
+        db.close()
+
+
+def get_snapshot_dir():
+    directory = getattr(settings, "SNAPSHOT_DIR", None)
+    if directory is None:
+        directory = Path(tempfile.gettempdir()) / "lida_snapshots"
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory
+
+
+def get_snapshot(isotopologues, name, write=True):
+    """Path of the (cached) snapshot of the isotopologues queryset, written if there
+    is none yet for the current version of their data (or None if not write). The
+    older snapshots of the same name are removed.
+    """
+    stamps = list(
+        isotopologues.order_by("pk").values_list(
+            "pk", "version", "time_modified", "molecule__time_modified"
+        )
+    )
+    digest = hashlib.md5(repr((SCHEMA_VERSION, stamps)).encode()).hexdigest()
+    directory = get_snapshot_dir()
+    path = directory / f"{name}.{digest}.sqlite3"
+    if path.exists():
+        return path
+    if not write:
+        return None
+    # written under a temporary name, so that no incomplete file is ever served
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        write_snapshot(tmp_path, isotopologues)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    # only the older ones, a newer one might have been written (and be being served)
+    # by another process, after the data changed again
+    modified = path.stat().st_mtime
+    for old_path in directory.glob(f"{name}.*.sqlite3"):
+        try:
+            if old_path != path and old_path.stat().st_mtime < modified:
+                old_path.unlink()
+        except FileNotFoundError:
+            pass
+    return path
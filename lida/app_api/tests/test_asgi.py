@@ -0,0 +1,94 @@
+import asyncio
+import json
+import threading
+
+from django.test import TransactionTestCase
+
+from app_site.models import Molecule, Isotopologue, State
+from lida.asgi import application, iterate_in_thread
+
+
+def get(path, query_string="", handler=application):
+    """Serves the GET request by the ASGI handler, returns the sent messages."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"testserver")],
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    return handler(scope, receive, send), messages
+
+
+class TestASGI(TransactionTestCase):
+    def setUp(self):
+        molecule = Molecule.create_from_data("CO")
+        isotopologue = Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)", dataset_name="name", version=1
+        )
+        for v in range(3):
+            State.create_from_data(
+                isotopologue,
+                lifetime=0.1 * v if v else None,
+                energy=0.2 * v,
+                vib_state_str=str(v),
+                vib_state_labels="v",
+            )
+
+    def test_iterate_in_thread(self):
+        threads = []
+
+        def chunks():
+            for i in range(3):
+                threads.append(threading.get_ident())
+                yield i
+
+        async def collect():
+            return [chunk async for chunk in iterate_in_thread(chunks())]
+
+        self.assertEqual(asyncio.run(collect()), [0, 1, 2])
+        self.assertEqual(len(set(threads)), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    def test_concurrent_downloads(self):
+        expected = b"".join(
+            self.client.get("/api/?molecule=CO&category=states").streaming_content
+        )
+        requests = [get("/api/", "molecule=CO&category=states") for _ in range(4)]
+
+        async def serve():
+            await asyncio.gather(*(request for request, _ in requests))
+
+        asyncio.run(serve())
+        for _, messages in requests:
+            self.assertEqual(messages[0]["type"], "http.response.start")
+            self.assertEqual(messages[0]["status"], 200)
+            headers = messages[0]["headers"]
+            self.assertIn((b"Content-Type", b"application/json"), headers)
+            body = b"".join(message.get("body", b"") for message in messages[1:])
+            self.assertEqual(body, expected)
+            self.assertEqual(len(json.loads(body)["states"]), 3)
+            self.assertFalse(messages[-1].get("more_body", False))
+
+    def test_not_modified(self):
+        etag = self.client.get("/api/?molecule=CO&category=states")["ETag"]
+        response = self.client.get(
+            "/api/?molecule=CO&category=states", HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
@@ -0,0 +1,90 @@
+from django.test import TestCase, override_settings
+
+from app_site.models import Molecule, Isotopologue, State, Transition
+from lida.metrics import cache_requests
+from ..cascade import get_graph
+
+
+class TestCascade(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        molecule = Molecule.create_from_data("CO")
+        cls.isotopologue = Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)", dataset_name="name", version=1
+        )
+        states = [
+            State.create_from_data(
+                cls.isotopologue,
+                lifetime=0.1 if v else None,
+                energy=0.2 * v,
+                vib_state_str=str(v),
+                vib_state_labels="v",
+            )
+            for v in range(5)
+        ]
+        # v4 -> v3 -> v2 -> v1 -> v0, with the weak shortcuts v4 -> v1, v3 -> v0
+        for v in range(1, 5):
+            Transition.create_from_data(states[v], states[v - 1], 0.1 * 10 / 9)
+        Transition.create_from_data(states[4], states[1], 1.0)
+        Transition.create_from_data(states[3], states[0], 1.0)
+
+    def get(self, **params):
+        return self.client.get("/api/cascade/", {"molecule": "CO", **params}).json()
+
+    @staticmethod
+    def edges(data):
+        transitions = data["transitions"]
+        return sorted((t["initial_state"], t["final_state"]) for t in transitions)
+
+    def test_cascade(self):
+        data = self.get(state="v4")
+        self.assertEqual(
+            [(s["slug"], s["depth"]) for s in data["states"]],
+            [("v4", 0), ("v3", 1), ("v1", 1), ("v2", 2), ("v0", 2)],
+        )
+        self.assertEqual(len(data["transitions"]), 6)
+        self.assertFalse(data["truncated"])
+        self.assertEqual(data["dataset"]["number_states"], 5)
+        transition = data["transitions"][0]
+        self.assertEqual(transition["initial_state"], "v4")
+        self.assertEqual(transition["final_state"], "v3")
+        self.assertAlmostEqual(transition["branching_ratio"], 0.9)
+
+    def test_limits(self):
+        data = self.get(state="v4", max_depth=1)
+        self.assertEqual(self.edges(data), [("v4", "v1"), ("v4", "v3")])
+        data = self.get(state="v4", min_branching_ratio=0.5)
+        self.assertEqual(
+            self.edges(data),
+            [("v1", "v0"), ("v2", "v1"), ("v3", "v2"), ("v4", "v3")],
+        )
+        data = self.get(state="v4", max_states=2)
+        self.assertEqual([s["slug"] for s in data["states"]], ["v4", "v3"])
+        self.assertEqual(self.edges(data), [("v4", "v3")])
+        self.assertTrue(data["truncated"])
+        data = self.get(state="v0")
+        self.assertEqual(len(data["states"]), 1)
+        self.assertEqual(data["transitions"], [])
+
+    def test_invalid(self):
+        self.assertIn("msg", self.get())
+        self.assertIn("msg", self.get(state="v4", max_depth=0))
+        self.assertIn("msg", self.get(state="v4", max_depth="foo"))
+        with override_settings(CASCADE_MAX_STATES=10):
+            self.assertIn("msg", self.get(state="v4", max_states=11))
+        response = self.client.get("/api/cascade/?molecule=CO&state=v5")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/api/cascade/?molecule=CN&state=v0")
+        self.assertEqual(response.status_code, 404)
+
+    def test_graph_cache(self):
+        self.get(state="v4")
+        key = ("cascade_graph", "hit")
+        hits = cache_requests.values.get(key, 0)
+        # no queries into the states and transitions once the graph is cached:
+        with self.assertNumQueries(2):
+            self.get(state="v3")
+        self.assertEqual(cache_requests.values[key], hits + 1)
+        graph = get_graph(self.isotopologue, "stamp")
+        self.assertIs(get_graph(self.isotopologue, "stamp"), graph)
+        self.assertIsNot(get_graph(self.isotopologue, "new stamp"), graph)
@@ -0,0 +1,64 @@
+import json
+import threading
+
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from app_site.models import Molecule, Isotopologue, State
+from lida.db import ConnectionPool, PoolTimeout, iterate, use_connection
+
+
+class TestConnectionPool(TransactionTestCase):
+    def setUp(self):
+        molecule = Molecule.create_from_data("CO")
+        isotopologue = Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)", dataset_name="name", version=1
+        )
+        for v in range(3):
+            State.create_from_data(
+                isotopologue,
+                lifetime=0.1 * v if v else None,
+                energy=0.2 * v,
+                vib_state_str=str(v),
+                vib_state_labels="v",
+            )
+
+    def test_pool(self):
+        pool = ConnectionPool(size=1, timeout=0.1)
+        with pool.connection() as pooled_connection:
+            self.assertIsNot(pooled_connection, connection)
+            with self.assertRaises(PoolTimeout):
+                with pool.connection():
+                    pass
+        # the idle connection is re-used, also by other threads:
+        checked_out = []
+
+        def check_out():
+            with pool.connection() as other_connection:
+                checked_out.append(other_connection)
+                with use_connection(other_connection):
+                    checked_out.append(list(iterate(State.objects.values_list("pk"))))
+
+        thread = threading.Thread(target=check_out)
+        thread.start()
+        thread.join()
+        self.assertIs(checked_out[0], pooled_connection)
+        self.assertEqual(len(checked_out[1]), 3)
+        pool.close()
+
+    def test_iterate(self):
+        states = State.objects.order_by("energy").values_list("energy", "lifetime")
+        pool = ConnectionPool(size=1)
+        with pool.connection() as pooled_connection:
+            with use_connection(pooled_connection):
+                pooled_rows = list(iterate(states, chunk_size=2))
+                with self.assertRaises(TypeError):
+                    iterate(State.objects.all())
+        self.assertEqual(pooled_rows, list(iterate(states)))
+        pool.close()
+
+    @override_settings(EXPORT_CONNECTION_POOL_SIZE=2)
+    def test_pooled_export(self):
+        response = self.client.get("/api/?molecule=CO&category=states")
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(data["states"]), 3)
@@ -0,0 +1,263 @@
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from app_site.models import Molecule, Isotopologue, State, Transition
+
+
+class TestExport(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for formula, iso_formula in [("CO", "(12C)(16O)"), ("CN", "(12C)(14N)")]:
+            molecule = Molecule.create_from_data(formula)
+            isotopologue = Isotopologue.create_from_data(
+                molecule, iso_formula_str=iso_formula, dataset_name="name", version=1
+            )
+            states = [
+                State.create_from_data(
+                    isotopologue,
+                    lifetime=0.1 * v if v else None,
+                    energy=0.2 * v,
+                    vib_state_str=str(v),
+                    vib_state_labels="v",
+                )
+                for v in range(3)
+            ]
+            Transition.create_from_data(states[1], states[0], 0.1)
+            Transition.create_from_data(states[2], states[1], 0.3)
+            Transition.create_from_data(states[2], states[0], 0.6)
+
+    @staticmethod
+    def content(response):
+        return b"".join(response.streaming_content)
+
+    def test_api_endpoint_json(self):
+        response = self.client.get("/api/?molecule=CO&category=transitions")
+        data = json.loads(self.content(response))
+        self.assertEqual(data["dataset"]["number_transitions"], 3)
+        self.assertEqual(
+            data["transitions"]["CO v=2 → CO v=1"],
+            {
+                "partial_lifetime": 0.3,
+                "delta_energy": -0.2,
+                "branching_ratio": 0.2 / 0.3,
+            },
+        )
+        response = self.client.get("/api/?molecule=CO&category=states")
+        data = json.loads(self.content(response))
+        self.assertEqual(data["states"]["CO v=0"], {"lifetime": None, "energy": 0})
+
+    def test_api_endpoint_csv(self):
+        response = self.client.get(
+            "/api/?molecule=CO&category=transitions&format=csv&min_branching_ratio=0.5"
+        )
+        lines = self.content(response).decode().splitlines()
+        self.assertEqual(len(lines), 1 + 2)
+        self.assertTrue(lines[0].startswith("Initial State,Final State"))
+        self.assertTrue(lines[1].startswith("CO v=1,CO v=0,0.1,"))
+
+    def test_api_endpoint_quanta(self):
+        response = self.client.get("/api/?molecule=CO&category=states&q1_min=1")
+        data = json.loads(self.content(response))
+        self.assertEqual(list(data["states"]), ["CO v=1", "CO v=2"])
+        # the transitions from the states in the ranges
+        response = self.client.get(
+            "/api/?molecule=CO&category=transitions&format=csv&q1_max=1"
+        )
+        lines = self.content(response).decode().splitlines()
+        self.assertEqual(len(lines), 1 + 1)
+        self.assertTrue(lines[1].startswith("CO v=1,CO v=0,"))
+        response = self.client.get("/api/?molecule=CO&category=states&q1_max=a")
+        self.assertIn("msg", response.json())
+
+    def test_api_endpoint_npz(self):
+        import numpy as np
+
+        response = self.client.get("/api/?molecule=CN&category=transitions&format=npz")
+        data = np.load(io.BytesIO(response.content))
+        self.assertEqual(list(data["state"]), ["CN v=0", "CN v=1", "CN v=2"])
+        initial_states = data["state"][data["initial_state"]]
+        final_states = data["state"][data["final_state"]]
+        self.assertEqual(
+            sorted(zip(initial_states, final_states)),
+            [("CN v=1", "CN v=0"), ("CN v=2", "CN v=0"), ("CN v=2", "CN v=1")],
+        )
+        response = self.client.get("/api/?molecule=CN&category=states&format=npz")
+        data = np.load(io.BytesIO(response.content))
+        self.assertEqual(list(data["lifetime"]), [float("inf"), 0.1, 0.2])
+
+    def test_batch_zip(self):
+        response = self.client.get("/api/batch/?molecule=all&category=all&format=json")
+        archive = zipfile.ZipFile(io.BytesIO(self.content(response)))
+        self.assertEqual(
+            sorted(archive.namelist()),
+            [
+                "CN/states.json",
+                "CN/transitions.json",
+                "CO/states.json",
+                "CO/transitions.json",
+            ],
+        )
+        single = self.client.get("/api/?molecule=CO&category=transitions")
+        self.assertEqual(
+            json.loads(archive.read("CO/transitions.json")),
+            json.loads(self.content(single)),
+        )
+
+    def test_batch_ndjson(self):
+        response = self.client.get(
+            "/api/batch/?molecule=CO&molecule=CN&category=states&format=ndjson"
+        )
+        records = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(len(records), 2 * (1 + 3))
+        self.assertEqual(
+            [r["molecule"] for r in records if r["category"] == "dataset"],
+            ["CN", "CO"],
+        )
+
+    def test_batch_invalid(self):
+        response = self.client.get("/api/batch/?molecule=CO,foo&category=states")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/api/batch/?molecule=CO&category=foo")
+        self.assertIn("msg", response.json())
+
+    def test_conditional_get(self):
+        url = "/api/?molecule=CO&category=states"
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("no-cache", response["Cache-Control"])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # re-populating the dataset invalidates the validators:
+        Isotopologue.objects.get(molecule__formula_str="CO").save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_compression(self):
+        url = "/api/?molecule=CO&category=transitions"
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        response = self.client.get(
+            "/api/?molecule=CO&category=states&format=npz", HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_export_sqlite(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            call_command(
+                "export_sqlite", tmp_dir, per_isotopologue=True, stdout=io.StringIO()
+            )
+            self.assertEqual(
+                sorted(path.name for path in Path(tmp_dir).iterdir()),
+                ["CN.sqlite3", "CO.sqlite3"],
+            )
+            path = Path(tmp_dir) / "lidb.sqlite3"
+            call_command("export_sqlite", str(path), stdout=io.StringIO())
+            db = sqlite3.connect(path)
+            self.assertEqual(
+                db.execute("SELECT COUNT(*) FROM state").fetchone()[0], 2 * 3
+            )
+            rows = db.execute(
+                """
+                SELECT initial.state, final.state, ROUND(t.branching_ratio, 3)
+                FROM "transition" t
+                JOIN state initial ON initial.id = t.initial_state_id
+                JOIN state final ON final.id = t.final_state_id
+                JOIN isotopologue i ON i.id = initial.isotopologue_id
+                JOIN molecule m ON m.id = i.molecule_id
+                WHERE m.formula = 'CO' AND t.branching_ratio > 0.5
+                ORDER BY initial.energy, final.energy
+                """
+            ).fetchall()
+            db.close()
+        self.assertEqual(
+            rows, [("CO v=1", "CO v=0", 1.0), ("CO v=2", "CO v=1", 0.667)]
+        )
+
+    def test_sqlite_endpoint(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with override_settings(SNAPSHOT_DIR=tmp_dir):
+                response = self.client.get("/api/sqlite/?molecule=CO")
+                self.assertEqual(
+                    response["Content-Disposition"],
+                    'attachment; filename="CO.sqlite3"',
+                )
+                content = b"".join(response.streaming_content)
+                response.close()
+                self.assertTrue(content.startswith(b"SQLite format 3"))
+                # cached until the data change:
+                snapshots = list(Path(tmp_dir).glob("CO.*.sqlite3"))
+                self.client.get("/api/sqlite/?molecule=CO").close()
+                self.assertEqual(list(Path(tmp_dir).glob("CO.*.sqlite3")), snapshots)
+                Isotopologue.objects.get(molecule__formula_str="CO").save()
+                # written by another process after the data changed yet again:
+                newer = Path(tmp_dir) / "CO.newer.sqlite3"
+                newer.touch()
+                os.utime(newer, (time.time() + 60, time.time() + 60))
+                self.client.get("/api/sqlite/?molecule=CO").close()
+                new_snapshots = list(Path(tmp_dir).glob("CO.*.sqlite3"))
+                self.assertEqual(len(new_snapshots), 2)
+                self.assertIn(newer, new_snapshots)
+                self.assertFalse(set(snapshots) & set(new_snapshots))
+                # the whole database only once written by export_sqlite:
+                response = self.client.get("/api/sqlite/?molecule=all")
+                self.assertEqual(response.status_code, 503)
+                self.assertFalse(list(Path(tmp_dir).glob("lidb.*.sqlite3")))
+                call_command("export_sqlite", stdout=io.StringIO())
+                response = self.client.get("/api/sqlite/?molecule=all")
+                response.close()
+                self.assertEqual(response.status_code, 200)
+                Isotopologue.objects.get(molecule__formula_str="CN").save()
+                response = self.client.get("/api/sqlite/?molecule=all")
+                self.assertEqual(response.status_code, 503)
+                response = self.client.get("/api/sqlite/?molecule=foo")
+                self.assertEqual(response.status_code, 404)
+
+    def test_state_endpoint(self):
+        with self.assertNumQueries(5):
+            response = self.client.get("/api/state/?molecule=CO&state=v1")
+        data = response.json()
+        self.assertEqual(
+            data["state"],
+            {"slug": "v1", "state": "CO v=1", "energy": 0.2, "lifetime": 0.1},
+        )
+        self.assertEqual(
+            [(t["slug"], t["partial_lifetime"]) for t in data["transitions_from"]],
+            [("v0", 0.1)],
+        )
+        self.assertEqual(
+            [(t["slug"], t["branching_ratio"]) for t in data["transitions_to"]],
+            [("v2", 0.2 / 0.3)],
+        )
+        response = self.client.get(
+            "/api/state/?molecule=CO&state=v0&min_branching_ratio=0.3"
+        )
+        self.assertEqual(
+            [t["slug"] for t in response.json()["transitions_to"]], ["v1", "v2"]
+        )
+        response = self.client.get(
+            "/api/state/?molecule=CO&state=v0&min_branching_ratio=0.5"
+        )
+        self.assertEqual(
+            [t["slug"] for t in response.json()["transitions_to"]], ["v1"]
+        )
+        # the other states in the ranges of the vibrational quanta
+        response = self.client.get("/api/state/?molecule=CO&state=v0&q1_min=2")
+        self.assertEqual(
+            [t["slug"] for t in response.json()["transitions_to"]], ["v2"]
+        )
+        response = self.client.get("/api/state/?molecule=CO&state=v0&q1_min=a")
+        self.assertIn("msg", response.json())
+        response = self.client.get("/api/state/?molecule=CO&state=v3")
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/api/state/?molecule=CO")
+        self.assertIn("msg", response.json())
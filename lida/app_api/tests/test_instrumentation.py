@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from app_site.models import Molecule, Isotopologue, State
+from lida.asgi import ASGIHandler, iterate_in_thread
+from lida.db import ConnectionPool, iterate, use_connection
+from lida.instrumentation import instrument
+
+from .test_asgi import get
+
+
+def create_states():
+    molecule = Molecule.create_from_data("CO")
+    isotopologue = Isotopologue.create_from_data(
+        molecule, iso_formula_str="(12C)(16O)", dataset_name="name", version=1
+    )
+    for v in range(3):
+        State.create_from_data(
+            isotopologue,
+            lifetime=None,
+            energy=v,
+            vib_state_str=str(v),
+            vib_state_labels="v",
+        )
+
+
+class TestInstrumentation(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_states()
+
+    def test_instrument(self):
+        with instrument("states") as metrics:
+            self.assertEqual(len(list(State.objects.all())), 3)
+            State.objects.count()
+        self.assertEqual(metrics.query_count, 2)
+        self.assertEqual(len(metrics.slowest_queries), 2)
+        self.assertGreaterEqual(metrics.total_time, metrics.db_time)
+        # no longer recording:
+        State.objects.count()
+        self.assertEqual(metrics.query_count, 2)
+
+    def test_middleware_disabled(self):
+        response = self.client.get("/api/?molecule=CO&category=states")
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_middleware(self):
+        with self.assertLogs("lida.instrumentation", "INFO") as logs:
+            response = self.client.get("/molecule/list/all/")
+            self.assertIn("db;dur=", response["Server-Timing"])
+            # streamed response, logged once exhausted:
+            response = self.client.get("/api/?molecule=CO&category=states")
+            content = b"".join(response.streaming_content)
+        html_record, api_record = [json.loads(r.split(":", 2)[2]) for r in logs.output]
+        self.assertGreater(html_record["template_time"], 0)
+        self.assertEqual(api_record["label"], "/api/")
+        self.assertEqual(api_record["response_size"], len(content))
+        self.assertGreater(api_record["query_count"], 0)
+
+
+class TestInstrumentationConnections(TransactionTestCase):
+    """The queries run outside the Django connections of the instrumented thread."""
+
+    def setUp(self):
+        create_states()
+
+    def test_pooled_connection(self):
+        pool = ConnectionPool(size=1)
+        with instrument() as metrics:
+            with pool.connection() as connection:
+                with use_connection(connection):
+                    self.assertEqual(len(list(iterate(State.objects.values_list()))), 3)
+        self.assertEqual(metrics.query_count, 1)
+        self.assertEqual(connection.execute_wrappers, [])
+        pool.close()
+
+    def test_streaming_thread(self):
+        def chunks():
+            for _ in range(3):
+                yield State.objects.count()
+
+        async def collect():
+            return [chunk async for chunk in iterate_in_thread(chunks())]
+
+        with instrument() as metrics:
+            self.assertEqual(asyncio.run(collect()), [3, 3, 3])
+        self.assertEqual(metrics.query_count, 3)
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_asgi_middleware(self):
+        def get_query_count():
+            with self.assertLogs("lida.instrumentation", "INFO") as logs:
+                # the middleware is loaded by the handler:
+                request, _ = get("/api/", "molecule=CO&category=states", ASGIHandler())
+                asyncio.run(request)
+            return json.loads(logs.output[0].split(":", 2)[2])["query_count"]
+
+        # all the queries are run by the request thread:
+        with self.assertLogs("lida.instrumentation", "INFO") as logs:
+            response = self.client.get("/api/?molecule=CO&category=states")
+            b"".join(response.streaming_content)
+        query_count = json.loads(logs.output[0].split(":", 2)[2])["query_count"]
+        self.assertEqual(get_query_count(), query_count)
+        with override_settings(EXPORT_CONNECTION_POOL_SIZE=1):
+            self.assertEqual(get_query_count(), query_count)
@@ -0,0 +1,88 @@
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase, TestCase
+
+from app_site.models import Molecule, Isotopologue
+from lida.metrics import Registry, http_requests
+
+
+class TestRegistry(SimpleTestCase):
+    def test_exposition(self):
+        registry = Registry()
+        counter = registry.counter("c_total", "A counter.", ["label"])
+        histogram = registry.histogram("h", "A histogram.", buckets=(1, 10))
+        counter.inc(label="a")
+        counter.inc(2, label='"b"')
+        for value in 0.5, 5, 50:
+            histogram.observe(value)
+        lines = registry.expose().splitlines()
+        self.assertIn("# TYPE c_total counter", lines)
+        self.assertIn('c_total{label="a"} 1', lines)
+        self.assertIn('c_total{label="\\"b\\""} 2', lines)
+        self.assertIn('h_bucket{le="1.0"} 1', lines)
+        self.assertIn('h_bucket{le="10.0"} 2', lines)
+        self.assertIn('h_bucket{le="+Inf"} 3', lines)
+        self.assertIn("h_sum 55.5", lines)
+        self.assertIn("h_count 3", lines)
+        with self.assertRaises(ValueError):
+            counter.inc(foo="a")
+
+    def test_multiprocess(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(METRICS_DIR=directory):
+                registries = [Registry(), Registry()]
+                for i, registry in enumerate(registries):
+                    registry.process_id += f"_{i}"
+                    registry.counter("c_total", "A counter.").inc(i + 1)
+                    registry.flush()
+                self.assertIn("c_total 3", registries[0].expose().splitlines())
+                # the files of the exited and of the dead processes are not counted
+                registries[1].remove()
+                self.assertIn("c_total 1", registries[0].expose().splitlines())
+                process = subprocess.Popen([sys.executable, "-c", ""])
+                process.wait()
+                dead = Path(directory) / f"{process.pid}_0.json"
+                dead.write_text(json.dumps({"c_total": [[[], 5]]}))
+                self.assertIn("c_total 1", registries[0].expose().splitlines())
+                self.assertFalse(dead.exists())
+
+
+class TestMetricsEndpoint(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        molecule = Molecule.create_from_data("CO")
+        Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)", dataset_name="name", version=1
+        )
+
+    def test_metrics(self):
+        labels = {"view": "api_endpoint", "method": "GET", "status": 200}
+        key = tuple(map(str, labels.values()))
+        before = http_requests.values.get(key, 0)
+        # not observed unless enabled
+        response = self.client.get("/api/?molecule=CO&category=states")
+        b"".join(response.streaming_content)
+        self.assertEqual(http_requests.values.get(key, 0), before)
+        with self.settings(METRICS_ENABLED=True):
+            # a new client, loading the middleware with the settings
+            self.client = self.client_class()
+            response = self.client.get("/api/?molecule=CO&category=states")
+            b"".join(response.streaming_content)
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 404)
+        with self.settings(METRICS_TOKEN="secret"):
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong")
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        lines = response.content.decode().splitlines()
+        self.assertIn(
+            'lida_http_requests_total{view="api_endpoint",method="GET",status="200"} '
+            f"{before + 1}",
+            lines,
+        )
+        self.assertIn("# TYPE lida_db_queries_per_request histogram", lines)
@@ -0,0 +1,120 @@
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from django.db import connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TransactionTestCase, override_settings
+
+from app_site.models import Molecule, Isotopologue
+from lida.routers import (
+    PIN_COOKIE,
+    ReplicaPinningMiddleware,
+    _pinned,
+    get_read_alias,
+    primary,
+)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class TestReplicaRouter(TransactionTestCase):
+    """The replica is a second SQLite database file, replicated from the (test)
+    default database by the sqlite3 backup.
+    """
+
+    def setUp(self):
+        # the writes of the other tests pin their (this thread's) context:
+        self.pinned_token = _pinned.set(False)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        connections.databases["replica"] = {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": str(Path(self.tmp_dir.name) / "replica.sqlite3"),
+        }
+        with primary():
+            self.create_molecule("CO", "(12C)(16O)")
+        self.replicate()
+
+    def tearDown(self):
+        connections["replica"].close()
+        del connections.databases["replica"]
+        delattr(connections._connections, "replica")
+        self.tmp_dir.cleanup()
+        _pinned.reset(self.pinned_token)
+
+    @staticmethod
+    def create_molecule(formula, iso_formula):
+        molecule = Molecule.create_from_data(formula)
+        Isotopologue.create_from_data(
+            molecule, iso_formula_str=iso_formula, dataset_name="name", version=1
+        )
+
+    @staticmethod
+    def replicate():
+        connections["replica"].close()
+        connections["default"].ensure_connection()
+        target = sqlite3.connect(connections["replica"].settings_dict["NAME"])
+        connections["default"].connection.backup(target)
+        target.close()
+
+    def test_routing(self):
+        self.assertEqual(Molecule.objects.db, "replica")
+        self.assertEqual(Molecule.objects.get().formula_str, "CO")
+        with primary():
+            self.assertEqual(Molecule.objects.db, "default")
+            self.create_molecule("CN", "(12C)(14N)")
+        # not replicated yet:
+        self.assertEqual(Molecule.objects.count(), 1)
+        with primary():
+            self.assertEqual(Molecule.objects.count(), 2)
+        self.replicate()
+        self.assertEqual(Molecule.objects.count(), 2)
+
+    def test_sticky_cookie(self):
+        with primary():
+            self.create_molecule("CN", "(12C)(14N)")
+        response = self.client.get("/api/?molecule=CN&category=states")
+        self.assertEqual(response.status_code, 404)
+        self.client.cookies[PIN_COOKIE] = "1"
+        response = self.client.get("/api/?molecule=CN&category=states")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"CN", b"".join(response.streaming_content))
+
+    def test_pinning_middleware(self):
+        def write_view(request):
+            self.create_molecule("CN", "(12C)(14N)")
+            # sticky-after-write within the request:
+            return HttpResponse(str(Molecule.objects.count()))
+
+        def read_view(request):
+            return HttpResponse(str(Molecule.objects.count()))
+
+        request = RequestFactory().get("/")
+        response = ReplicaPinningMiddleware(write_view)(request)
+        self.assertEqual(response.content, b"2")
+        self.assertIn(PIN_COOKIE, response.cookies)
+        # the pinning does not leak out of the request:
+        self.assertEqual(Molecule.objects.db, "replica")
+        response = ReplicaPinningMiddleware(read_view)(request)
+        self.assertEqual(response.content, b"1")
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=["replica", "other"])
+    def test_replica_per_request(self):
+        def view(request):
+            aliases = [get_read_alias() for _ in range(50)]
+
+            def stream():
+                yield from aliases
+                # read while streaming, after the middleware returned:
+                yield from (get_read_alias() for _ in range(50))
+
+            return StreamingHttpResponse(stream())
+
+        request = RequestFactory().get("/")
+        response = ReplicaPinningMiddleware(view)(request)
+        # the same replica for all the reads of the request, streamed ones included:
+        aliases = {chunk.decode() for chunk in response.streaming_content}
+        self.assertEqual(len(aliases), 1)
+        self.assertLess(aliases, {"replica", "other"})
+        # picked per query outside the requests:
+        self.assertEqual({get_read_alias() for _ in range(50)}, {"replica", "other"})
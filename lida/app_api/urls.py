@@ -1,9 +1,16 @@
 from django.urls import path
 
 from .views import ApiAboutView
-from .views import api_endpoint
+from .views import api_endpoint, batch_endpoint, cascade_endpoint
+from .views import decay_channels_endpoint
+from .views import sqlite_endpoint, state_endpoint
 
 urlpatterns = [
     path("", api_endpoint, name="api_endpoint"),
-    path("about/", ApiAboutView.as_view(), name="api-about")
+    path("about/", ApiAboutView.as_view(), name="api-about"),
+    path("batch/", batch_endpoint, name="api-batch"),
+    path("cascade/", cascade_endpoint, name="api-cascade"),
+    path("decay_channels/", decay_channels_endpoint, name="api-decay-channels"),
+    path("sqlite/", sqlite_endpoint, name="api-sqlite"),
+    path("state/", state_endpoint, name="api-state"),
 ]
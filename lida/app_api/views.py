@@ -1,12 +1,23 @@
 import io
 import csv
+from asgiref.sync import sync_to_async
 from django.utils.datastructures import MultiValueDictKeyError
+from django.conf import settings
 from django.views.generic import TemplateView
-from django.http import JsonResponse, Http404, HttpResponse
+from django.http import (JsonResponse, Http404, HttpResponse, StreamingHttpResponse,
+                         FileResponse)
 #from django.core import serializers
 
+from app_site.models.isotopologue import Isotopologue
 from app_site.models.molecule import Molecule
+from app_site.models.state import State
 from app_site.models.transition import Transition
+from app_site.models.utils import get_range_filter, get_state_str
+from app_site.views.conditional import conditional_on_isotopologues
+from lida.db import pooled
+from . import export
+from .cascade import get_graph
+from .snapshot import DATABASE_SNAPSHOT, get_snapshot
 
 class ApiAboutView(TemplateView):
     template_name = "api/about.html"
@@ -14,36 +25,64 @@ class ApiAboutView(TemplateView):
 
 
 
-def get_state_lifetimes_dict(isotopologue, states):
-    return dict([(str(state), {'lifetime': state.lifetime,
-                               'energy': state.energy}) for state in states])
- 
-def get_transition_lifetimes_dict(isotopologue, transitions):
-    return dict([(str(transition), {'partial_lifetime': transition.partial_lifetime,
-                                    'delta_energy': transition.delta_energy})
-                 for transition in transitions])
- 
-def get_state_lifetimes_csv(isotopologue, states):
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(["State", "Lifetime /s", "Energy /eV"])
-    for state in states:
-        csv_row_data = [str(state), state.lifetime, state.energy]
-        writer.writerow(csv_row_data)
-    return output.getvalue()
+def get_decay_channels_dict(isotopologue, transitions):
+    decay_channels = {}
+    for transition in transitions:
+        decay_channels.setdefault(str(transition.initial_state), []).append(
+            {'final_state': str(transition.final_state),
+             'partial_lifetime': transition.partial_lifetime,
+             'branching_ratio': transition.branching_ratio})
+    return decay_channels
 
-def get_transitions_lifetimes_csv(isotopologue, transitions):
+def get_decay_channels_csv(isotopologue, transitions):
     output = io.StringIO()
     writer = csv.writer(output)
-    writer.writerow(["Initial State", "Final State", "Partial Lifetime /s",
-                     "Delta Energy /eV"])
+    writer.writerow(["Initial State", "Rank", "Final State", "Partial Lifetime /s",
+                     "Branching Ratio"])
     for transition in transitions:
-        csv_row_data = [transition.initial_state, transition.final_state,
-                        transition.partial_lifetime, transition.delta_energy]
+        csv_row_data = [transition.initial_state, transition.decay_rank,
+                        transition.final_state,
+                        transition.partial_lifetime, transition.branching_ratio]
         writer.writerow(csv_row_data)
     return output.getvalue()
 
-def api_endpoint(request):
+def _quoted(formats):
+    quoted = [f"'{fmt}'" for fmt in formats]
+    return f"{', '.join(quoted[:-1])} or {quoted[-1]}"
+
+def _get_min_branching_ratio(request):
+    min_branching_ratio = request.GET.get('min_branching_ratio')
+    if min_branching_ratio is None:
+        return None
+    return float(min_branching_ratio)
+
+def _get_quanta_filter(request, prefix=''):
+    """The Q object of the q{n}_min and q{n}_max ranges of the vibrational quanta of
+    the states (prefixed by the path to the states), raising ValueError for the
+    non-numeric ones.
+    """
+    return get_range_filter(request.GET, State.vib_quanta_fields, prefix=prefix)
+
+def _get_positive_int(request, key, default=None):
+    value = request.GET.get(key)
+    if value is None:
+        return default
+    value = int(value)
+    if value < 1:
+        raise ValueError(f'{key} must be positive')
+    return value
+
+def _requested_isotopologue(request):
+    return Isotopologue.objects.filter(
+        molecule__formula_str=request.GET.get('molecule'))
+
+def _requested_isotopologues(request):
+    molecules = _get_list(request, 'molecule')
+    if molecules == ['all']:
+        return Isotopologue.objects.all()
+    return Isotopologue.objects.filter(molecule__formula_str__in=molecules)
+
+def _api_response(request):
     try:
         molecule = request.GET.get('molecule')
         category = request.GET['category'].lower()
@@ -62,49 +101,333 @@ def api_endpoint(request):
 
     fmt = request.GET.get('format', 'json').lower()
 
+    formats = ['json', 'csv'] + export.get_binary_formats()
+    if fmt not in formats:
+        json_response = {'msg': f"{fmt} is not a supported output format; format"
+                                f" must be one of {_quoted(formats)}."}
+        return JsonResponse(json_response)
+
+    try:
+        min_branching_ratio = _get_min_branching_ratio(request)
+    except ValueError:
+        json_response = {'msg': 'min_branching_ratio must be a number'}
+        return JsonResponse(json_response)
+    try:
+        quanta_filter = _get_quanta_filter(request)
+    except ValueError:
+        json_response = {'msg': 'q{n}_min and q{n}_max must be numbers'}
+        return JsonResponse(json_response)
+    args = isotopologue, category, min_branching_ratio, quanta_filter
+
+    if fmt in export.BINARY_FORMATS:
+        get_binary, content_type = export.BINARY_FORMATS[fmt]
+        response = HttpResponse(get_binary(*args), content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="{molecule.slug}_{category}.{fmt}"')
+        return response
+    if fmt == 'csv':
+        return StreamingHttpResponse(pooled(export.iter_csv(*args)),
+                                     content_type='text/csv')
+    return StreamingHttpResponse(pooled(export.iter_json(*args)),
+                                 content_type='application/json')
+
+
+@conditional_on_isotopologues(_requested_isotopologue)
+async def api_endpoint(request):
+    """The query is validated and the response set up in the sync thread (as the sync
+    views), the streamed exports are then generated lazily, as sent (under ASGI, in
+    a thread of their own, see lida.asgi).
+    """
+    return await sync_to_async(_api_response)(request)
+
+
+def _get_list(request, key):
+    """Values of a list parameter passed either repeated (?key=a&key=b) or comma
+    separated (?key=a,b).
+    """
+    return [value.strip() for values in request.GET.getlist(key)
+            for value in values.split(',') if value.strip()]
+
+
+def _batch_response(request):
+    molecules = _get_list(request, 'molecule')
+    categories = [category.lower() for category in _get_list(request, 'category')]
+    if not molecules or not categories:
+        json_response = {'msg': 'API query must include molecule and category'}
+        return JsonResponse(json_response)
+    if categories == ['all']:
+        categories = ['states', 'transitions']
+    if not set(categories).issubset({'states', 'transitions'}):
+        json_response = {'msg': "category must be one of states, transitions or all"}
+        return JsonResponse(json_response)
+
+    fmt = request.GET.get('format', 'json').lower()
+    formats = ['json', 'csv', 'ndjson'] + export.get_binary_formats()
+    if fmt not in formats:
+        json_response = {'msg': f"{fmt} is not a supported output format; format"
+                                f" must be one of {_quoted(formats)}."}
+        return JsonResponse(json_response)
+
+    try:
+        min_branching_ratio = _get_min_branching_ratio(request)
+    except ValueError:
+        json_response = {'msg': 'min_branching_ratio must be a number'}
+        return JsonResponse(json_response)
+    try:
+        quanta_filter = _get_quanta_filter(request)
+    except ValueError:
+        json_response = {'msg': 'q{n}_min and q{n}_max must be numbers'}
+        return JsonResponse(json_response)
+
+    isotopologues = Isotopologue.objects.select_related('molecule').order_by(
+        'molecule__formula_str')
+    if molecules != ['all']:
+        isotopologues = list(isotopologues.filter(molecule__formula_str__in=molecules))
+        missing = set(molecules) - {str(iso) for iso in isotopologues}
+        if missing:
+            json_response = {'msg': f"unknown molecules: {', '.join(sorted(missing))}"}
+            return JsonResponse(json_response, status=404)
+
+    if fmt == 'ndjson':
+        chunks = (chunk for isotopologue in isotopologues for category in categories
+                  for chunk in export.iter_ndjson(isotopologue, category,
+                                                  min_branching_ratio, quanta_filter))
+        return StreamingHttpResponse(
+            pooled(chunk.encode() for chunk in chunks),
+            content_type='application/x-ndjson')
+
+    if fmt in export.BINARY_FORMATS:
+        get_binary, _ = export.BINARY_FORMATS[fmt]
+
+        def iter_file(*args):
+            yield get_binary(*args)
+    else:
+        iter_file = export.iter_csv if fmt == 'csv' else export.iter_json
+    members = ((f"{isotopologue}/{category}.{fmt}",
+                iter_file(isotopologue, category, min_branching_ratio, quanta_filter))
+               for isotopologue in isotopologues for category in categories)
+    response = StreamingHttpResponse(pooled(export.iter_zip(members)),
+                                     content_type='application/zip')
+    response['Content-Disposition'] = 'attachment; filename="lidb.zip"'
+    return response
+
+
+@conditional_on_isotopologues(_requested_isotopologues)
+async def batch_endpoint(request):
+    """Serves several molecules and categories in a single streamed response: either
+    a zip archive of {molecule}/{category}.{format} files (format json, csv, or
+    any of the binary formats), or newline-delimited json (format ndjson).
+    Asynchronous, as the api_endpoint.
+    """
+    return await sync_to_async(_batch_response)(request)
+
+
+@conditional_on_isotopologues(_requested_isotopologues)
+def sqlite_endpoint(request):
+    """Serves a standalone SQLite snapshot (see app_api.snapshot) of a single molecule,
+    or of the whole database (molecule=all). The snapshots are cached on disk until
+    the data change. The snapshot of the whole database is only served once written by
+    the export_sqlite command, too slow to be written on a request.
+    """
+    molecule = request.GET.get('molecule')
+    if not molecule:
+        json_response = {'msg': 'API query must include molecule'}
+        return JsonResponse(json_response)
+    if molecule == 'all':
+        isotopologues, name = Isotopologue.objects.all(), DATABASE_SNAPSHOT
+    else:
+        try:
+            molecule = Molecule.objects.get(formula_str=molecule)
+        except Molecule.DoesNotExist:
+            raise Http404
+        isotopologues, name = _requested_isotopologue(request), molecule.slug
+    if not isotopologues.exists():
+        raise Http404
+    path = get_snapshot(isotopologues, name, write=molecule != 'all')
+    if path is None:
+        json_response = {'msg': 'The snapshot of the current data is not ready yet, '
+                                'please try again later'}
+        response = JsonResponse(json_response, status=503)
+        response['Retry-After'] = 3600
+        return response
+    return FileResponse(open(path, 'rb'), as_attachment=True,
+                        filename=f'{name}.sqlite3',
+                        content_type='application/vnd.sqlite3')
+
+
+@conditional_on_isotopologues(_requested_isotopologue)
+def decay_channels_endpoint(request):
+    """Serves the k dominant decay channels (transitions with the shortest partial
+    lifetimes) of each state of the requested molecule, using the decay ranks
+    precomputed by Transition.rank_decay_channels.
+    """
+    try:
+        molecule = request.GET['molecule']
+    except MultiValueDictKeyError:
+        json_response = {'msg': 'API query must include molecule'}
+        return JsonResponse(json_response)
+    try:
+        k = int(request.GET.get('k', 3))
+    except ValueError:
+        k = 0
+    if not 1 <= k <= Transition.max_decay_rank:
+        json_response = {'msg': f"k must be an integer between 1 and "
+                                f"{Transition.max_decay_rank}"}
+        return JsonResponse(json_response)
+
+    try:
+        molecule = Molecule.objects.get(formula_str=molecule)
+    except Molecule.DoesNotExist:
+        raise Http404
+    isotopologue = molecule.isotopologue
+
+    fmt = request.GET.get('format', 'json').lower()
+
     if fmt not in ('json', 'csv'):
         json_response = {'msg': f"{fmt} is not a supported output format; format"
                                 f" must be one of 'json' or 'csv'."}
         return JsonResponse(json_response)
 
-    if category == 'states':
-        states = isotopologue.state_set.all()
-    else:
-        transitions = Transition.objects.filter(initial_state__isotopologue=isotopologue)
+    transitions = isotopologue.transition_set.filter(
+        decay_rank__lte=k
+    ).select_related(
+        'initial_state__isotopologue__molecule', 'final_state__isotopologue__molecule'
+    ).order_by('initial_state_id', 'decay_rank')
 
     if fmt == 'csv':
-        if category == 'states':
-            return HttpResponse(get_state_lifetimes_csv(isotopologue, states),
-                                content_type='text/csv')
-        else:
-            return HttpResponse(get_transitions_lifetimes_csv(isotopologue,
-                                transitions),
-                                content_type='text/csv')
-
-    #molecule = serializers.serialize('json', [molecule,])
-    molecule_formula = molecule.formula_str
-    isotopologue_formula = isotopologue.iso_formula_str
-    dataset_name = isotopologue.dataset_name
-    version = isotopologue.version
-    number_states = isotopologue.number_states
-    number_transitions = isotopologue.number_transitions
-    molecule_dict = {'molecule_formula': molecule_formula,
-                     'isotopologue_formula': isotopologue_formula,
-                    }
-    dataset_dict = {'name': dataset_name,
-                    'version': version,
-                    'number_states': number_states,
-                    'number_transitions': number_transitions
-                   }
-
-    json_response = {'molecule': molecule_dict, 'dataset': dataset_dict}
-
-    if category == 'states':
-        json_response['states'] = get_state_lifetimes_dict(isotopologue, states)
-    else:
-        json_response['transitions'] = get_transition_lifetimes_dict(
-                                                    isotopologue, transitions)
+        return HttpResponse(get_decay_channels_csv(isotopologue, transitions),
+                            content_type='text/csv')
 
+    json_response = {**export.get_meta_dict(isotopologue), 'k': k,
+                     'decay_channels': get_decay_channels_dict(isotopologue,
+                                                               transitions)}
     return JsonResponse(json_response)
 
 
+def _get_state_transitions(isotopologue, transitions, state_field,
+                           min_branching_ratio, request):
+    """The transitions to (or from) the state, listing the other state of each, with
+    the other states filtered by the ranges of their vibrational quanta.
+    """
+    if min_branching_ratio is not None:
+        transitions = transitions.filter(branching_ratio__gte=min_branching_ratio)
+    transitions = transitions.filter(
+        _get_quanta_filter(request, prefix=f'{state_field}__'))
+    transitions = transitions.order_by('partial_lifetime').values_list(
+        f'{state_field}__slug', f'{state_field}__el_state_str',
+        f'{state_field}__vib_state_str', f'{state_field}__energy',
+        'partial_lifetime', 'delta_energy', 'branching_ratio')
+    return [{'slug': slug,
+             'state': get_state_str(isotopologue, el_state_str, vib_state_str),
+             'energy': energy, 'partial_lifetime': partial_lifetime,
+             'delta_energy': delta_energy, 'branching_ratio': branching_ratio}
+            for (slug, el_state_str, vib_state_str, energy, partial_lifetime,
+                 delta_energy, branching_ratio) in transitions]
+
+
+@conditional_on_isotopologues(_requested_isotopologue)
+def state_endpoint(request):
+    """Serves a single state (identified by its slug) of the requested molecule,
+    with all its decay channels (transitions_from) and the transitions feeding it
+    (transitions_to), each listing the slug of the other state, so that the decay
+    chains can be followed state by state, optionally only those with the other
+    states within the q{n}_min and q{n}_max ranges of the vibrational quanta. A fixed
+    number of queries, however many transitions the state has.
+    """
+    try:
+        molecule = request.GET['molecule']
+        slug = request.GET['state']
+    except MultiValueDictKeyError:
+        json_response = {'msg': 'API query must include molecule and state'}
+        return JsonResponse(json_response)
+
+    try:
+        min_branching_ratio = _get_min_branching_ratio(request)
+    except ValueError:
+        json_response = {'msg': 'min_branching_ratio must be a number'}
+        return JsonResponse(json_response)
+
+    try:
+        _get_quanta_filter(request)
+    except ValueError:
+        json_response = {'msg': 'q{n}_min and q{n}_max must be numbers'}
+        return JsonResponse(json_response)
+
+    try:
+        isotopologue = Isotopologue.objects.select_related('molecule').get(
+            molecule__formula_str=molecule)
+        state = isotopologue.state_set.get(slug=slug)
+    except (Isotopologue.DoesNotExist, State.DoesNotExist):
+        raise Http404
+
+    state_dict = {'slug': slug,
+                  'state': get_state_str(isotopologue, state.el_state_str,
+                                         state.vib_state_str),
+                  'energy': state.energy, 'lifetime': state.lifetime}
+    json_response = {
+        **export.get_meta_dict(isotopologue), 'state': state_dict,
+        'transitions_from': _get_state_transitions(
+            isotopologue, Transition.objects.filter(initial_state_id=state.pk),
+            'final_state', min_branching_ratio, request),
+        'transitions_to': _get_state_transitions(
+            isotopologue, Transition.objects.filter(final_state_id=state.pk),
+            'initial_state', min_branching_ratio, request),
+    }
+    return JsonResponse(json_response)
+
+
+@conditional_on_isotopologues(_requested_isotopologue)
+def cascade_endpoint(request):
+    """Serves the decay cascade of a state (identified by its slug): all the states
+    reachable from it through the transitions, breadth-first, with the transitions
+    between them (see app_api.cascade). The traversal can be limited by max_depth
+    (number of transitions from the state), min_branching_ratio (of the transitions
+    followed) and max_states (at most settings.CASCADE_MAX_STATES). Two queries once
+    the transitions graph of the molecule is cached.
+    """
+    try:
+        molecule = request.GET['molecule']
+        slug = request.GET['state']
+    except MultiValueDictKeyError:
+        json_response = {'msg': 'API query must include molecule and state'}
+        return JsonResponse(json_response)
+
+    try:
+        min_branching_ratio = _get_min_branching_ratio(request)
+    except ValueError:
+        json_response = {'msg': 'min_branching_ratio must be a number'}
+        return JsonResponse(json_response)
+    try:
+        max_depth = _get_positive_int(request, 'max_depth')
+    except ValueError:
+        json_response = {'msg': 'max_depth must be a positive integer'}
+        return JsonResponse(json_response)
+    try:
+        max_states = _get_positive_int(request, 'max_states',
+                                       settings.CASCADE_MAX_STATES)
+    except ValueError:
+        max_states = 0
+    if not 0 < max_states <= settings.CASCADE_MAX_STATES:
+        json_response = {'msg': f"max_states must be a positive integer of at most "
+                                f"{settings.CASCADE_MAX_STATES}"}
+        return JsonResponse(json_response)
+
+    try:
+        isotopologue = Isotopologue.objects.select_related('molecule').get(
+            molecule__formula_str=molecule)
+    except Isotopologue.DoesNotExist:
+        raise Http404
+    stamp = (isotopologue.version, isotopologue.time_modified,
+             isotopologue.molecule.time_modified)
+    graph = get_graph(isotopologue, stamp)
+    try:
+        start = graph.slug_index[slug]
+    except KeyError:
+        raise Http404
+
+    json_response = {**export.get_meta_dict(isotopologue),
+                     **graph.get_cascade_dict(
+                         start, max_depth=max_depth,
+                         min_branching_ratio=min_branching_ratio,
+                         max_states=max_states)}
+    return JsonResponse(json_response)
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class AppSiteConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app_site"
+
+    def ready(self):
+        from django.core.signals import request_started
+
+        from lida.db import check_connections_health
+
+        request_started.connect(check_connections_health)
@@ -0,0 +1,202 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Abs, Coalesce, Least, NullIf
+
+from app_site.models import (
+    ElectronicState,
+    Isotopologue,
+    Molecule,
+    State,
+    Transition,
+    VibrationalState,
+)
+from app_site.models.utils import count_subquery, normalised_states, strip_tags
+
+# relative tolerance of the float fields computed from the fields of other rows
+TOLERANCE = 1e-9
+
+
+def _state_checks():
+    states = State.objects.order_by()
+    transitions = Transition.objects.all()
+    yield "number_transitions_from", states.alias(
+        expected=count_subquery(transitions, "initial_state")
+    ).exclude(number_transitions_from=F("expected"))
+    yield "number_transitions_to", states.alias(
+        expected=count_subquery(transitions, "final_state")
+    ).exclude(number_transitions_to=F("expected"))
+    yield "el_state", states.filter(
+        Q(el_state=None) | ~Q(el_state__el_state_str=F("el_state_str"))
+    )
+    yield "vib_state", states.filter(
+        Q(vib_state=None) | ~Q(vib_state__vib_state_str=F("vib_state_str"))
+    )
+    labels = [*State.lookup_labels, *State.composite_labels]
+    if normalised_states():
+        # the derived labels are not stored with the states at all
+        yield "labels", states.exclude(**{name: "" for name in labels})
+    else:
+        # the labels of the lookups, and the composite labels joined from those
+        yield "labels", states.exclude(
+            **{
+                name: State.label_expression(
+                    name, from_lookups=name in State.lookup_labels
+                )
+                for name in labels
+            }
+        )
+
+
+def _transition_checks():
+    transitions = Transition.objects.order_by()
+    expected = F("final_state__energy") - F("initial_state__energy")
+    yield "delta_energy", transitions.alias(
+        drift=Abs(F("delta_energy") - expected)
+    ).filter(drift__gt=TOLERANCE * (Abs(expected) + Value(1.0)))
+    # null for the infinite lifetimes and the vanishing partial lifetimes
+    expected = F("initial_state__lifetime") / NullIf(
+        F("partial_lifetime"), Value(0.0)
+    )
+    yield "branching_ratio", transitions.alias(
+        expected=expected, drift=Abs(F("branching_ratio") - expected)
+    ).filter(
+        Q(branching_ratio=None, expected__isnull=False)
+        | Q(branching_ratio__isnull=False, expected=None)
+        | Q(drift__gt=TOLERANCE * Abs(expected))
+    )
+    # the decay channels of each state ranked by their (partial_lifetime, pk): each
+    # ranked channel preceded by decay_rank - 1 channels of its state (a bounded
+    # number of ranked channels per state, so linear in the number of channels)...
+    preceding = (
+        Transition.objects.filter(
+            Q(partial_lifetime__lt=OuterRef("partial_lifetime"))
+            | Q(partial_lifetime=OuterRef("partial_lifetime"), pk__lt=OuterRef("pk")),
+            initial_state=OuterRef("initial_state"),
+        )
+        .order_by()
+        .values("initial_state")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    max_rank = Transition.max_decay_rank
+    ranked = transitions.filter(decay_rank__isnull=False)
+    misranked = ranked.alias(rank=Coalesce(Subquery(preceding), 0) + 1).filter(
+        Q(decay_rank__gt=max_rank) | ~Q(decay_rank=F("rank"))
+    )
+    # ... and as many ranked channels as ranks, the unranked channels of the states
+    # missing some of them are reported
+    unranked_states = State.objects.alias(
+        ranked=count_subquery(ranked, "initial_state"),
+        total=count_subquery(transitions, "initial_state"),
+    ).exclude(ranked=Least(F("total"), Value(max_rank)))
+    yield "decay_rank", transitions.filter(
+        Q(pk__in=misranked.values("pk"))
+        | Q(initial_state__in=unranked_states, decay_rank=None)
+    )
+
+
+def _isotopologue_checks():
+    isotopologues = Isotopologue.objects.order_by()
+    yield "number_states", isotopologues.alias(
+        expected=count_subquery(State.objects.all(), "isotopologue")
+    ).exclude(number_states=F("expected"))
+    yield "number_transitions", isotopologues.alias(
+        expected=count_subquery(
+            Transition.objects.all(), "initial_state__isotopologue"
+        )
+    ).exclude(number_transitions=F("expected"))
+
+
+# the checks of each model, with the path to the molecule formula of its rows
+SQL_CHECKS = [
+    (State, _state_checks, "isotopologue__molecule__formula_str"),
+    (
+        Transition,
+        _transition_checks,
+        "initial_state__isotopologue__molecule__formula_str",
+    ),
+    (Isotopologue, _isotopologue_checks, "molecule__formula_str"),
+]
+
+
+def _formula_checks():
+    """The fields derived from the formulas (by pyvalem) of the few molecules and
+    isotopologues, checked in python.
+    """
+    molecules = [
+        (molecule, molecule.formula_str) for molecule in Molecule.objects.all()
+    ]
+    isotopologues = [
+        (isotopologue, isotopologue.molecule.formula_str)
+        for isotopologue in Isotopologue.objects.select_related("molecule")
+    ]
+    for model, instances, fields in [
+        (Molecule, molecules, ["slug", "html", "charge", "number_atoms"]),
+        (Isotopologue, isotopologues, ["iso_slug", "html", "mass"]),
+    ]:
+        for instance, formula_str in instances:
+            for field in fields:
+                if model.sync_functions[field](instance) != getattr(instance, field):
+                    yield model, field, formula_str, 1
+
+
+def _lookup_checks():
+    """The notags labels of the lookups (shared by the molecules), checked in
+    python.
+    """
+    for model, field in [
+        (ElectronicState, "el_state_html"),
+        (VibrationalState, "vib_state_html"),
+    ]:
+        count = sum(
+            strip_tags(html) != notags
+            for html, notags in model.objects.values_list(
+                field, f"{field}_notags"
+            ).iterator()
+        )
+        if count:
+            yield model, f"{field}_notags", "(shared)", count
+
+
+def find_inconsistencies():
+    """All the rows with their redundant fields out of sync with the other fields
+    (see sync_inconsistent_db), found by a single aggregate query per check, without
+    loading the rows. Returns the list of (model, field, molecule formula, number of
+    inconsistent rows) of the inconsistent fields.
+    """
+    inconsistencies = []
+    for model, checks, formula_path in SQL_CHECKS:
+        for field, queryset in checks():
+            counts = (
+                queryset.values(formula_path)
+                .annotate(count=Count("pk"))
+                .values_list(formula_path, "count")
+                .order_by(formula_path)
+            )
+            inconsistencies.extend(
+                (model, field, formula_str, count) for formula_str, count in counts
+            )
+    inconsistencies.extend(_formula_checks())
+    inconsistencies.extend(_lookup_checks())
+    return inconsistencies
+
+
+class Command(BaseCommand):
+    help = (
+        "Read-only check of the redundant (denormalised) fields of all the models: "
+        "the counters, the delta energies, branching ratios and decay ranks of the "
+        "transitions, and the labels of the states. Reports the numbers of the "
+        "inconsistent rows per model and molecule, and fails if any are found (fixed "
+        "by the sync_inconsistent_db command)."
+    )
+
+    def handle(self, *args, **options):
+        inconsistencies = find_inconsistencies()
+        for model, field, formula_str, count in inconsistencies:
+            self.stdout.write(
+                f"{model.__name__}.{field:<28} {formula_str:<16} {count:>10}"
+            )
+        if inconsistencies:
+            total = sum(count for *_, count in inconsistencies)
+            raise CommandError(f"Found {total} inconsistent rows!")
+        self.stdout.write("All the redundant fields are consistent.")
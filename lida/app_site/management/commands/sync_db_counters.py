@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from app_site.models.counters import (
+    TRIGGERS,
+    drop_triggers,
+    install_triggers,
+    refresh_counters,
+)
+from app_site.models.utils import db_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-computes the counters of all the isotopologues and states and the delta "
+        "energies of all the transitions in bulk, and installs the triggers "
+        "maintaining them in the database counters mode (settings.DB_COUNTERS), or "
+        "drops them otherwise. To be run after switching the mode."
+    )
+
+    def handle(self, *args, **options):
+        # the primary database, which all the writes are routed to
+        using = DEFAULT_DB_ALIAS
+        vendor = connections[using].vendor
+        if db_counters() and vendor not in TRIGGERS:
+            raise CommandError(
+                f"The database counters are not supported on {vendor}, only on "
+                f"{', '.join(TRIGGERS)}!"
+            )
+        with transaction.atomic(using=using):
+            refresh_counters()
+            if db_counters():
+                install_triggers(using)
+                self.stdout.write("Installed the database counter triggers.")
+            else:
+                drop_triggers(using)
+                self.stdout.write("Dropped the database counter triggers, if any.")
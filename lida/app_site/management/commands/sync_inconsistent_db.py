@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from tqdm import tqdm
+
+from app_site.models import Molecule, Isotopologue, State, Transition
+from lida.routers import primary
+
+
+def sync_inconsistent_db(verbose=True):
+    """Syncs and saves all the instances of all the models, bringing all the redundant
+    data fields in sync with each other.
+    """
+    with primary():
+        for model in [Molecule, Isotopologue, State]:
+            for instance in tqdm(model.objects.all(), disable=not verbose):
+                instance.sync(verbose=verbose, save=False)
+                instance.save()
+        for transition in tqdm(Transition.objects.all(), disable=not verbose):
+            transition.sync(verbose=verbose, save=False)
+            # ranked below, once per isotopologue, rather than after each transition
+            transition.save(rank=False)
+        for isotopologue in Isotopologue.objects.all():
+            isotopologue.rank_decay_channels()
+
+
+class Command(BaseCommand):
+    help = (
+        "Syncs and saves all the instances of all the models, bringing all the "
+        "redundant data fields in sync with each other. To be run whenever the "
+        "database is left inconsistent (see the check_consistency command)."
+    )
+
+    def handle(self, *args, **options):
+        sync_inconsistent_db(verbose=options["verbosity"] > 0)
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from app_site.models import ElectronicState, State, VibrationalState
+from app_site.models.utils import normalised_states
+
+
+class Command(BaseCommand):
+    help = (
+        "Links all the states to their electronic and vibrational label lookups, and "
+        "stores the derived labels with each state, or clears them in the normalised "
+        "storage mode (settings.NORMALISED_STATES). To be run after switching the mode."
+    )
+
+    def handle(self, *args, **options):
+        states = State.objects.order_by()
+        with transaction.atomic():
+            for el_state_str in (
+                states.filter(el_state=None).values_list("el_state_str", flat=True)
+            ).distinct():
+                ElectronicState.get_or_create_from_str(el_state_str)
+            for vib_state_str in (
+                states.filter(vib_state=None).values_list("vib_state_str", flat=True)
+            ).distinct():
+                VibrationalState.get_or_create_from_str(vib_state_str)
+            states.filter(el_state=None).update(
+                el_state=Subquery(
+                    ElectronicState.objects.filter(
+                        el_state_str=OuterRef("el_state_str")
+                    ).values("pk")[:1]
+                )
+            )
+            states.filter(vib_state=None).update(
+                vib_state=Subquery(
+                    VibrationalState.objects.filter(
+                        vib_state_str=OuterRef("vib_state_str")
+                    ).values("pk")[:1]
+                )
+            )
+
+            if normalised_states():
+                states.update(
+                    **{name: "" for name in State.lookup_labels},
+                    **{name: "" for name in State.composite_labels},
+                )
+                self.stdout.write("Cleared the derived labels of all the states.")
+                return
+
+            # the labels of the lookups first, the composite labels joined from those
+            lookups = {"el_state": ElectronicState, "vib_state": VibrationalState}
+            label_updates = {}
+            for name, path in State.lookup_labels.items():
+                lookup_name, attr = path.split("__")
+                label_updates[name] = Subquery(
+                    lookups[lookup_name]
+                    .objects.filter(pk=OuterRef(f"{lookup_name}_id"))
+                    .values(attr)[:1]
+                )
+            states.update(**label_updates)
+            states.update(
+                **{
+                    name: State.label_expression(name, from_lookups=False)
+                    for name in State.composite_labels
+                }
+            )
+            self.stdout.write("Stored the derived labels of all the states.")
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_site', '0003_auto_20240708_1102'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transition',
+            name='decay_rank',
+            field=models.PositiveSmallIntegerField(default=None, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transition',
+            index=models.Index(fields=['initial_state', 'decay_rank'], name='app_site_tr_initial_763e41_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:41
+
+from django.db import migrations, models
+from django.db.models import Case, F, OuterRef, Subquery, When
+
+
+def sync_branching_ratios(apps, schema_editor):
+    # mirrors Transition.sync_branching_ratios on the historical models
+    State = apps.get_model('app_site', 'State')
+    Transition = apps.get_model('app_site', 'Transition')
+    lifetime = State.objects.filter(pk=OuterRef('initial_state_id')).values(
+        'lifetime'
+    )[:1]
+    Transition.objects.update(
+        branching_ratio=Case(
+            When(partial_lifetime=0, then=None),
+            default=Subquery(lifetime) / F('partial_lifetime'),
+            output_field=models.FloatField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_site', '0004_transition_decay_rank'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transition',
+            name='branching_ratio',
+            field=models.FloatField(db_index=True, null=True),
+        ),
+        migrations.RunPython(sync_branching_ratios, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 3.2.25 on 2026-10-19 04:18
+
+import app_site.models.utils
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def populate_label_lookups(apps, schema_editor):
+    # the lookups get the labels already stored with the states, and the states are
+    # linked to them by a single UPDATE per lookup table
+    State = apps.get_model('app_site', 'State')
+    ElectronicState = apps.get_model('app_site', 'ElectronicState')
+    VibrationalState = apps.get_model('app_site', 'VibrationalState')
+    states = State.objects.order_by()
+    el_states = {
+        el_state_str: (html, html_notags) for el_state_str, html, html_notags in
+        states.values_list('el_state_str', 'el_state_html', 'el_state_html_notags')
+        .distinct()
+    }
+    ElectronicState.objects.bulk_create(
+        ElectronicState(el_state_str=el_state_str, el_state_html=html,
+                        el_state_html_notags=html_notags)
+        for el_state_str, (html, html_notags) in el_states.items()
+    )
+    vib_states = {
+        vib_state_str: labels for vib_state_str, *labels in
+        states.values_list('vib_state_str', 'vib_state_html', 'vib_state_html_notags',
+                           'vib_state_sort_key').distinct()
+    }
+    VibrationalState.objects.bulk_create(
+        VibrationalState(vib_state_str=vib_state_str, vib_state_html=html,
+                         vib_state_html_notags=html_notags, vib_state_sort_key=key)
+        for vib_state_str, (html, html_notags, key) in vib_states.items()
+    )
+    State.objects.update(
+        el_state=Subquery(ElectronicState.objects.filter(
+            el_state_str=OuterRef('el_state_str')).values('pk')[:1]),
+        vib_state=Subquery(VibrationalState.objects.filter(
+            vib_state_str=OuterRef('vib_state_str')).values('pk')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_site', '0005_transition_branching_ratio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ElectronicState',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('el_state_str', models.CharField(max_length=64, unique=True)),
+                ('el_state_html', models.CharField(max_length=64)),
+                ('el_state_html_notags', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VibrationalState',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('vib_state_str', models.CharField(max_length=128, unique=True)),
+                ('vib_state_html', models.CharField(max_length=128)),
+                ('vib_state_html_notags', models.CharField(max_length=128)),
+                ('vib_state_sort_key', models.CharField(max_length=128)),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name='state',
+            options={'base_manager_name': 'objects'},
+        ),
+        migrations.AlterField(
+            model_name='state',
+            name='el_state_html',
+            field=app_site.models.utils.DerivedCharField(max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='state',
+            name='el_state_html_notags',
+            field=app_site.models.utils.DerivedCharField(max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='state',
+            name='state_html',
+            field=app_site.models.utils.DerivedCharField(max_length=128),
+        ),
+        migrations.AlterField(
+            model_name='state',
+            name='state_html_notags',
+            field=app_site.models.utils.DerivedCharField(max_length=128),
+        ),
+        migrations.AlterField(
+            model_name='state',
+            name='state_sort_key',
+            field=app_site.models.utils.DerivedCharField(max_length=128),
+        ),
+        migrations.AlterField(
+            model_name='state',
+            name='vib_state_html',
+            field=app_site.models.utils.DerivedCharField(max_length=128),
+        ),
+        migrations.AlterField(
+            model_name='state',
+            name='vib_state_html_notags',
+            field=app_site.models.utils.DerivedCharField(max_length=128),
+        ),
+        migrations.AlterField(
+            model_name='state',
+            name='vib_state_sort_key',
+            field=app_site.models.utils.DerivedCharField(max_length=128),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='el_state',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='states', to='app_site.electronicstate'),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='vib_state',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='states', to='app_site.vibrationalstate'),
+        ),
+        migrations.RunPython(populate_label_lookups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 3.2.25 on 2026-10-19 04:40
+
+from django.db import migrations, models
+
+
+
+def get_vib_quanta(vib_state_str):
+    # frozen copy of app_site.models.utils.get_vib_quanta, for the (already validated)
+    # vib_state_str of the existing states
+    vib_state_str = vib_state_str.strip()
+    if vib_state_str == '':
+        return ()
+    if len(vib_state_str) >= 2 and vib_state_str[1] in 'spdfgh':
+        # the atomic configurations
+        return (1,)
+    return tuple(int(q) for q in vib_state_str.strip('()').split(', '))
+
+
+def populate_vib_quanta(apps, schema_editor):
+    # a single UPDATE per distinct vib_state_str
+    State = apps.get_model('app_site', 'State')
+    states = State.objects.order_by()
+    fields = [f'q{i + 1}' for i in range(12)]
+    for vib_state_str in states.values_list('vib_state_str', flat=True).distinct():
+        quanta = get_vib_quanta(vib_state_str)[:len(fields)]
+        if quanta:
+            states.filter(vib_state_str=vib_state_str).update(**dict(zip(fields, quanta)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_site', '0006_state_label_lookups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='state',
+            name='q1',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='q10',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='q11',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='q12',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='q2',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='q3',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='q4',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='q5',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='q6',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='q7',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='q8',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='state',
+            name='q9',
+            field=models.PositiveSmallIntegerField(null=True),
+        ),
+        migrations.RunPython(populate_vib_quanta, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='state',
+            index=models.Index(fields=['isotopologue', 'q1', 'q2', 'q3', 'q4', 'q5', 'q6', 'q7', 'q8', 'q9', 'q10', 'q11', 'q12'], name='app_site_st_isotopo_229771_idx'),
+        ),
+    ]
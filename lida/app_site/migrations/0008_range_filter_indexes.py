@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-19 04:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_site', '0007_state_vib_quanta'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transition',
+            name='delta_energy',
+            field=models.FloatField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='transition',
+            name='partial_lifetime',
+            field=models.FloatField(db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='state',
+            index=models.Index(fields=['isotopologue', 'energy'], name='app_site_st_isotopo_f08e58_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='state',
+            index=models.Index(fields=['isotopologue', 'lifetime'], name='app_site_st_isotopo_e2885c_idx'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 3.2.25 on 2026-10-19 09:12
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+SLUG_CODES = {
+    '+': 'plus',
+    '-': 'minus',
+    '/': 'slash',
+    '_': 'sub',
+    '[': 'lbrack',
+    ']': 'rbrack',
+    ' ': 'space',
+}
+
+
+def _slug_part(label):
+    chars = []
+    for char in label:
+        if char.isascii() and (char.isalnum() or char in ',.'):
+            chars.append(char)
+        elif char in '()':
+            continue
+        elif char in SLUG_CODES:
+            chars.append(f'-{SLUG_CODES[char]}')
+        else:
+            match = re.fullmatch(
+                r'GREEK (CAPITAL|SMALL) LETTER ([A-Z]+)', unicodedata.name(char, '')
+            )
+            if match:
+                case, name = match.groups()
+                chars.append(f'-{name if case == "CAPITAL" else name.lower()}')
+            else:
+                chars.append(f'-u{ord(char):06x}')
+    return ''.join(chars)
+
+
+def get_state_slug(el_state_str, vib_state_str):
+    # frozen copy of app_site.models.utils.get_state_slug as of this migration
+    if re.fullmatch(r'[\d, ()]+', vib_state_str):
+        vib_slug = 'v' + vib_state_str.strip('()').replace(' ', '')
+    elif vib_state_str:
+        vib_slug = 'v.' + _slug_part(vib_state_str)
+    else:
+        vib_slug = ''
+    return '_'.join(part for part in [_slug_part(el_state_str), vib_slug] if part)
+
+
+def populate_slugs(apps, schema_editor):
+    State = apps.get_model('app_site', 'State')
+    states = State.objects.order_by('pk').only('el_state_str', 'vib_state_str')
+    batch = []
+    for state in states.iterator(chunk_size=2000):
+        state.slug = get_state_slug(state.el_state_str, state.vib_state_str)
+        batch.append(state)
+        if len(batch) == 2000:
+            State.objects.bulk_update(batch, ['slug'])
+            batch = []
+    State.objects.bulk_update(batch, ['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_site', '0008_range_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='state',
+            name='slug',
+            field=models.CharField(default='', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_slugs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='state',
+            constraint=models.UniqueConstraint(fields=('isotopologue', 'slug'), name='unique_state_slug'),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from .molecule import Molecule
 from .isotopologue import Isotopologue
+from .electronic_state import ElectronicState
+from .vibrational_state import VibrationalState
 from .state import State
 from .transition import Transition
@@ -0,0 +1,171 @@
+"""The counters maintained by the database itself, in the database counters mode
+(settings.DB_COUNTERS).
+
+The redundant counters (the db_counter_fields of the models: the number_states and
+number_transitions of the isotopologues, the number_transitions_from and
+number_transitions_to of the states, and the delta_energy of the transitions) are
+otherwise kept in sync by the save and delete methods of the models, which are
+bypassed by the QuerySet.update, the bulk_create and the bulk deletes. In the
+database counters mode, they are kept in sync by the triggers installed into the
+database (SQLite or MySQL) by the sync_db_counters command instead, for any writes
+whatsoever. The triggers also bump the time_modified of the isotopologues with the
+counters changed, so the HTTP validators and the caches keyed by them (see
+app_site.views.conditional) follow the data.
+
+On any backend, refresh_counters re-computes all the counters in a few set-based
+UPDATE statements.
+"""
+from django.db import connections
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .isotopologue import Isotopologue
+from .state import State
+from .transition import Transition
+from .utils import count_subquery
+
+ISOTOPOLOGUE = Isotopologue._meta.db_table
+STATE = State._meta.db_table
+TRANSITION = Transition._meta.db_table
+
+
+def _transition_counters(row, sign, now):
+    """The statements adding (sign "+") or subtracting (sign "-") the transition
+    row (NEW or OLD) to or from the counters of its states and isotopologue.
+    """
+    return (
+        f"UPDATE {STATE} SET number_transitions_from = number_transitions_from "
+        f"{sign} 1 WHERE id = {row}.initial_state_id; "
+        f"UPDATE {STATE} SET number_transitions_to = number_transitions_to {sign} 1 "
+        f"WHERE id = {row}.final_state_id; "
+        f"UPDATE {ISOTOPOLOGUE} SET number_transitions = number_transitions {sign} 1, "
+        f"time_modified = {now} WHERE id = (SELECT isotopologue_id FROM {STATE} "
+        f"WHERE id = {row}.initial_state_id); "
+    )
+
+
+def _delta_energy(row):
+    """The delta energy of the transition row (NEW or OLD) from its states."""
+    return (
+        f"(SELECT energy FROM {STATE} WHERE id = {row}.final_state_id) - "
+        f"(SELECT energy FROM {STATE} WHERE id = {row}.initial_state_id)"
+    )
+
+
+def _state_counters(row, sign, now):
+    return (
+        f"UPDATE {ISOTOPOLOGUE} SET number_states = number_states {sign} 1, "
+        f"time_modified = {now} WHERE id = {row}.isotopologue_id; "
+    )
+
+
+# the delta energies of the transitions from and to the state NEW
+_STATE_ENERGY = (
+    f"UPDATE {TRANSITION} SET delta_energy = (SELECT energy FROM {STATE} "
+    f"WHERE id = {TRANSITION}.final_state_id) - NEW.energy "
+    f"WHERE initial_state_id = NEW.id; "
+    f"UPDATE {TRANSITION} SET delta_energy = NEW.energy - (SELECT energy FROM {STATE} "
+    f"WHERE id = {TRANSITION}.initial_state_id) "
+    f"WHERE final_state_id = NEW.id; "
+)
+_STATES_CHANGED = (
+    "NEW.initial_state_id <> OLD.initial_state_id "
+    "OR NEW.final_state_id <> OLD.final_state_id"
+)
+
+
+def _sqlite_triggers():
+    now = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+    set_delta_energy = (
+        f"UPDATE {TRANSITION} SET delta_energy = {_delta_energy('NEW')} "
+        f"WHERE id = NEW.id; "
+    )
+    return {
+        "lida_state_insert": f"AFTER INSERT ON {STATE} "
+        f"BEGIN {_state_counters('NEW', '+', now)}END",
+        "lida_state_delete": f"AFTER DELETE ON {STATE} "
+        f"BEGIN {_state_counters('OLD', '-', now)}END",
+        "lida_state_energy": f"AFTER UPDATE OF energy ON {STATE} "
+        f"WHEN NEW.energy <> OLD.energy BEGIN {_STATE_ENERGY}END",
+        "lida_transition_insert": f"AFTER INSERT ON {TRANSITION} "
+        f"BEGIN {_transition_counters('NEW', '+', now)}{set_delta_energy}END",
+        "lida_transition_delete": f"AFTER DELETE ON {TRANSITION} "
+        f"BEGIN {_transition_counters('OLD', '-', now)}END",
+        "lida_transition_states": "AFTER UPDATE OF initial_state_id, final_state_id "
+        f"ON {TRANSITION} WHEN {_STATES_CHANGED} "
+        f"BEGIN {_transition_counters('OLD', '-', now)}"
+        f"{_transition_counters('NEW', '+', now)}{set_delta_energy}END",
+    }
+
+
+def _mysql_triggers():
+    # MySQL triggers cannot update their own table, the delta energies of the new
+    # transitions are set before they are written
+    now = "UTC_TIMESTAMP(6)"
+    return {
+        "lida_state_insert": f"AFTER INSERT ON {STATE} FOR EACH ROW "
+        f"BEGIN {_state_counters('NEW', '+', now)}END",
+        "lida_state_delete": f"AFTER DELETE ON {STATE} FOR EACH ROW "
+        f"BEGIN {_state_counters('OLD', '-', now)}END",
+        "lida_state_energy": f"AFTER UPDATE ON {STATE} FOR EACH ROW "
+        f"BEGIN IF NEW.energy <> OLD.energy THEN {_STATE_ENERGY}END IF; END",
+        "lida_transition_delta_energy": f"BEFORE INSERT ON {TRANSITION} FOR EACH ROW "
+        f"SET NEW.delta_energy = {_delta_energy('NEW')}",
+        "lida_transition_insert": f"AFTER INSERT ON {TRANSITION} FOR EACH ROW "
+        f"BEGIN {_transition_counters('NEW', '+', now)}END",
+        "lida_transition_delete": f"AFTER DELETE ON {TRANSITION} FOR EACH ROW "
+        f"BEGIN {_transition_counters('OLD', '-', now)}END",
+        "lida_transition_states_delta_energy": f"BEFORE UPDATE ON {TRANSITION} "
+        f"FOR EACH ROW BEGIN IF {_STATES_CHANGED} THEN "
+        f"SET NEW.delta_energy = {_delta_energy('NEW')}; END IF; END",
+        "lida_transition_states": f"AFTER UPDATE ON {TRANSITION} FOR EACH ROW "
+        f"BEGIN IF {_STATES_CHANGED} THEN {_transition_counters('OLD', '-', now)}"
+        f"{_transition_counters('NEW', '+', now)}END IF; END",
+    }
+
+
+TRIGGERS = {"sqlite": _sqlite_triggers, "mysql": _mysql_triggers}
+
+
+def install_triggers(using="default"):
+    """(Re-)creates the counter triggers in the database, which needs to be one of
+    the TRIGGERS vendors.
+    """
+    triggers = TRIGGERS[connections[using].vendor]()
+    drop_triggers(using)
+    with connections[using].cursor() as cursor:
+        for name, definition in triggers.items():
+            cursor.execute(f"CREATE TRIGGER {name} {definition}")
+
+
+def drop_triggers(using="default"):
+    """Drops the counter triggers from the database, if any."""
+    vendor = connections[using].vendor
+    if vendor not in TRIGGERS:
+        return
+    with connections[using].cursor() as cursor:
+        for name in TRIGGERS[vendor]():
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def refresh_counters(isotopologues=None):
+    """Set-based re-computation of all the counters of the isotopologues queryset
+    (all of them by default) and of their states and transitions, in four UPDATE
+    statements with correlated sub-queries, bypassing the save methods.
+    """
+    if isotopologues is None:
+        isotopologues = Isotopologue.objects.all()
+    states = State.objects.filter(isotopologue__in=isotopologues)
+    Transition.sync_transition_counts(states)
+    energy = State.objects.values("energy")
+    Transition.objects.filter(initial_state__in=states).update(
+        delta_energy=Subquery(energy.filter(pk=OuterRef("final_state_id")))
+        - Subquery(energy.filter(pk=OuterRef("initial_state_id")))
+    )
+    isotopologues.update(
+        number_states=count_subquery(State.objects.all(), "isotopologue"),
+        number_transitions=count_subquery(
+            Transition.objects.all(), "initial_state__isotopologue"
+        ),
+        time_modified=timezone.now(),
+    )
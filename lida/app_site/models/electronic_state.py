@@ -0,0 +1,61 @@
+from django.db import models
+
+from .utils import (
+    canonicalise_and_parse_el_state_str,
+    get_or_create_lookups,
+    strip_tags,
+)
+
+
+class ElectronicState(models.Model):
+    """A lookup table of the distinct (canonicalised) electronic state labels, shared
+    by all the State instances (of any isotopologue) with the same el_state_str,
+    together with their derived representations. The empty el_state_str (electronic
+    states not resolved) has its instance as well.
+
+    Attributes
+    ----------
+    el_state_str : str
+        Example: 'X(1Σ+)'
+    el_state_html : str
+        Example: 'X<sup>1</sup>Σ<sup>+</sup>'
+    el_state_html_notags : str
+        Example: 'X1Σ+'
+    """
+
+    id = models.AutoField(primary_key=True)
+    el_state_str = models.CharField(max_length=64, unique=True)
+    el_state_html = models.CharField(max_length=64)
+    el_state_html_notags = models.CharField(max_length=64)
+
+    def __str__(self):
+        return self.el_state_str
+
+    @classmethod
+    def get_or_create_from_str(cls, el_state_str):
+        """The instance of the el_state_str (canonicalised first), created if needed."""
+        el_state_str, el_state_html = canonicalise_and_parse_el_state_str(el_state_str)
+        instance, _ = cls.objects.get_or_create(
+            el_state_str=el_state_str,
+            defaults={
+                "el_state_html": el_state_html,
+                "el_state_html_notags": strip_tags(el_state_html),
+            },
+        )
+        return instance
+
+    @classmethod
+    def get_or_create_from_strs(cls, el_state_strs):
+        """The instances of all the el_state_strs, in a dict keyed by the canonicalised
+        strings, with the missing ones created in bulk.
+        """
+        defaults = {}
+        for el_state_str in set(el_state_strs):
+            el_state_str, el_state_html = canonicalise_and_parse_el_state_str(
+                el_state_str
+            )
+            defaults[el_state_str] = {
+                "el_state_html": el_state_html,
+                "el_state_html_notags": strip_tags(el_state_html),
+            }
+        return get_or_create_lookups(cls, "el_state_str", defaults)
@@ -1,11 +1,15 @@
 import re
 
 from django.db import models
-from pyvalem.formula import Formula as PVFormula
 
 from .exceptions import MoleculeError
 from .molecule import Molecule
-from .utils import canonicalise_and_parse_el_state_str, get_el_state_html, BaseModel
+from .utils import (
+    canonicalise_and_parse_el_state_str,
+    get_el_state_html,
+    pyvalem_formula,
+    BaseModel,
+)
 
 
 class Isotopologue(BaseModel):
@@ -64,9 +68,9 @@ class Isotopologue(BaseModel):
     vib_state_dim = models.PositiveSmallIntegerField(default=0)
 
     sync_functions = {
-        "iso_slug": lambda iso: PVFormula(iso.iso_formula_str).slug,
-        "html": lambda iso: PVFormula(iso.iso_formula_str).html,
-        "mass": lambda iso: PVFormula(iso.iso_formula_str).mass,
+        "iso_slug": lambda iso: pyvalem_formula(iso.iso_formula_str).slug,
+        "html": lambda iso: pyvalem_formula(iso.iso_formula_str).html,
+        "mass": lambda iso: pyvalem_formula(iso.iso_formula_str).mass,
         "number_states": lambda iso: iso.state_set.count(),
         "number_transitions": lambda iso: iso.transition_set.count(),
     }
@@ -77,6 +81,7 @@ class Isotopologue(BaseModel):
     # auto-increase/decrease on states creation/deletion:
     number_states = models.PositiveIntegerField()
     number_transitions = models.PositiveIntegerField()
+    db_counter_fields = ["number_states", "number_transitions"]
 
     def __str__(self):
         return str(self.molecule)
@@ -117,14 +122,14 @@ class Isotopologue(BaseModel):
             version = 20180501
         The arguments should be compatible with ExoMol database itself.
         """
-        pyvalem_formula = PVFormula(iso_formula_str)
+        formula = pyvalem_formula(iso_formula_str)
 
         # ensure the passed formula_str is canonicalised (canonicalisation offloaded to
         # pyvalem)
-        if repr(pyvalem_formula) != iso_formula_str:
+        if repr(formula) != iso_formula_str:
             raise MoleculeError(
                 f"Non-canonicalised formula {iso_formula_str} passed, instead of "
-                f"{repr(pyvalem_formula)}"
+                f"{repr(formula)}"
             )
         # Only a single instance per iso_formula_str should live in the database:
         try:
@@ -158,6 +163,28 @@ class Isotopologue(BaseModel):
 
         return Transition.objects.filter(initial_state__isotopologue=self)
 
+    def rank_decay_channels(self):
+        """Rank the dominant decay channels of all the states of this Isotopologue in
+        a single grouped pass. See Transition.rank_decay_channels.
+        """
+        from .transition import Transition
+
+        Transition.rank_decay_channels(self.transition_set)
+        # bump the time_modified, as the bulk update bypasses the save methods
+        self.save(update_fields=["time_modified"])
+
+    def sync_branching_ratios(self):
+        """Re-compute the branching ratios of all the transitions of this
+        Isotopologue in a single UPDATE statement.
+        See Transition.sync_branching_ratios.
+        """
+        from .transition import Transition
+
+        Transition.sync_branching_ratios(
+            Transition.objects.filter(initial_state__in=self.state_set.all())
+        )
+        self.save(update_fields=["time_modified"])
+
     def set_ground_el_state_str(self, ground_el_state_str):
         """Set the electronic ground state string representation belonging to this
         molecule.
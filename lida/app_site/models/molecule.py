@@ -1,8 +1,7 @@
 from django.db import models
-from pyvalem.formula import Formula as PVFormula
 
 from .exceptions import MoleculeError
-from .utils import BaseModel
+from .utils import pyvalem_formula, BaseModel
 
 
 class Molecule(BaseModel):
@@ -19,10 +18,12 @@ class Molecule(BaseModel):
     name = models.CharField(max_length=64, default="")
 
     sync_functions = {
-        "slug": lambda molecule: PVFormula(molecule.formula_str).slug,
-        "html": lambda molecule: PVFormula(molecule.formula_str).html,
-        "charge": lambda molecule: PVFormula(molecule.formula_str).charge,
-        "number_atoms": lambda molecule: PVFormula(molecule.formula_str).natoms,
+        "slug": lambda molecule: pyvalem_formula(molecule.formula_str).slug,
+        "html": lambda molecule: pyvalem_formula(molecule.formula_str).html,
+        "charge": lambda molecule: pyvalem_formula(molecule.formula_str).charge,
+        "number_atoms": lambda molecule: (
+            pyvalem_formula(molecule.formula_str).natoms
+        ),
     }
 
     slug = models.CharField(max_length=16)
@@ -52,14 +53,14 @@ class Molecule(BaseModel):
             name = 'Water'
         The arguments should be compatible with ExoMol database itself.
         """
-        pyvalem_formula = PVFormula(formula_str)
+        formula = pyvalem_formula(formula_str)
 
         # ensure the passed formula_str is canonicalised (canonicalisation offloaded to
         # pyvalem)
-        if repr(pyvalem_formula) != formula_str:
+        if repr(formula) != formula_str:
             raise MoleculeError(
                 f"Non-canonicalised formula {formula_str} passed, "
-                f"instead of {repr(pyvalem_formula)}"
+                f"instead of {repr(formula)}"
             )
 
         try:
@@ -1,17 +1,45 @@
 from collections import OrderedDict
 
 from django.db import models
+from django.db.models.functions import Concat
 
+from .electronic_state import ElectronicState
 from .exceptions import StateError
 from .isotopologue import Isotopologue
 from .utils import (
     validate_and_parse_vib_state_str,
     canonicalise_and_parse_el_state_str,
+    db_counters,
+    get_state_slug,
     get_state_str,
-    leading_zeros,
-    strip_tags,
+    get_vib_quanta,
+    normalised_states,
     BaseModel,
+    DerivedCharField,
 )
+from .vibrational_state import VibrationalState
+
+
+# the vibrational quanta stored as integers with each state, up to 12 quanta
+VIB_QUANTA_FIELDS = [f"q{i + 1}" for i in range(12)]
+
+
+def _join_labels(*labels):
+    return "; ".join(label for label in labels if label)
+
+
+def _vib_quantum(state, i):
+    quanta = get_vib_quanta(state.vib_state_str)
+    return quanta[i] if i < len(quanta) else None
+
+
+class StateManager(models.Manager):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if normalised_states():
+            # the derived labels are read from the lookup tables:
+            queryset = queryset.select_related("el_state", "vib_state")
+        return queryset
 
 
 class State(BaseModel):
@@ -41,6 +69,20 @@ class State(BaseModel):
         Example: 'v=0'
     state_sort_key : str
         Example: '(00)'
+    slug : str
+        Example: 'v0'
+        URL-safe identifier of the state, unique within its isotopologue.
+    el_state : ElectronicState
+        The lookup table entry of the el_state_str.
+    vib_state : VibrationalState
+        The lookup table entry of the vib_state_str.
+
+    The html, notags and sort key attributes are all derived from the el_state_str
+    and vib_state_str, through the ElectronicState and VibrationalState lookups. In
+    the normalised storage mode (settings.NORMALISED_STATES), they are not stored
+    with the states at all (their columns are left empty), but derived from the
+    lookups whenever accessed. The queries filtering or ordering by them then need
+    to go through the lookups, see the label_path and label_expression methods.
 
     Attribute Examples
     ------------------
@@ -56,6 +98,7 @@ class State(BaseModel):
     state_html              | 'a<sup>3</sup>Π; <i>v</i>=1'  | '<b><i>v</i></b>=(0, 3, 0)'
     state_html_notags       | 'a3Π; v=1'                    | 'v=(0, 3, 0)'
     state_sort_key          | 'a(3Π); (01)'                 | '(00, 03, 00)'
+    slug                    | 'a3-PI_v1'                    | 'v0,3,0'
     """
     isotopologue = models.ForeignKey(Isotopologue, on_delete=models.CASCADE)
 
@@ -70,6 +113,52 @@ class State(BaseModel):
     # e.g. '(0, 1, 0, 3)', '(0, 0, 0, 0)', and '5'
     vib_state_str = models.CharField(max_length=128)
 
+    # lookups of the above, holding all the labels derived from them:
+    el_state = models.ForeignKey(
+        ElectronicState, on_delete=models.PROTECT, null=True, related_name="states"
+    )
+    vib_state = models.ForeignKey(
+        VibrationalState, on_delete=models.PROTECT, null=True, related_name="states"
+    )
+
+    # the vibrational quanta of the vib_state_str, as integers (null if not resolved),
+    # for the (index-backed) sorting and filtering by the vibrational states
+    q1 = models.PositiveSmallIntegerField(null=True)
+    q2 = models.PositiveSmallIntegerField(null=True)
+    q3 = models.PositiveSmallIntegerField(null=True)
+    q4 = models.PositiveSmallIntegerField(null=True)
+    q5 = models.PositiveSmallIntegerField(null=True)
+    q6 = models.PositiveSmallIntegerField(null=True)
+    q7 = models.PositiveSmallIntegerField(null=True)
+    q8 = models.PositiveSmallIntegerField(null=True)
+    q9 = models.PositiveSmallIntegerField(null=True)
+    q10 = models.PositiveSmallIntegerField(null=True)
+    q11 = models.PositiveSmallIntegerField(null=True)
+    q12 = models.PositiveSmallIntegerField(null=True)
+
+    vib_quanta_fields = VIB_QUANTA_FIELDS
+
+    # URL-safe identifier of the state within its isotopologue (the state_sort_key
+    # parts without the padding), e.g. 'a3-PI_v0,3,0', see get_state_slug
+    slug = models.CharField(max_length=255)
+
+    objects = StateManager()
+
+    class Meta:
+        # also the related states (e.g. transition.initial_state) get their lookups
+        base_manager_name = "objects"
+        # the datatables sort and range-filter the states of each isotopologue by these
+        indexes = [
+            models.Index(fields=["isotopologue", *VIB_QUANTA_FIELDS]),
+            models.Index(fields=["isotopologue", "energy"]),
+            models.Index(fields=["isotopologue", "lifetime"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["isotopologue", "slug"], name="unique_state_slug"
+            ),
+        ]
+
     # the sync functions dict needs to be ordered, as the html attribute sync function
     # expects el_state_html and vib_state_html already synced
     sync_functions = OrderedDict(
@@ -81,30 +170,44 @@ class State(BaseModel):
                 ],
             ),
             (
-                "el_state_html",
-                lambda state: canonicalise_and_parse_el_state_str(state.el_state_str)[
-                    1
-                ],
+                "el_state",
+                lambda state: ElectronicState.get_or_create_from_str(
+                    state.el_state_str
+                ),
             ),
-            ("el_state_html_notags", lambda state: strip_tags(state.el_state_html)),
             (
-                "vib_state_html",
-                lambda state: validate_and_parse_vib_state_str(state.vib_state_str)[1],
+                "vib_state",
+                lambda state: VibrationalState.get_or_create_from_str(
+                    state.vib_state_str
+                ),
             ),
-            ("vib_state_html_notags", lambda state: strip_tags(state.vib_state_html)),
-            ("vib_state_sort_key", lambda state: leading_zeros(state.vib_state_str)),
+            ("el_state_html", lambda state: state.derive_field("el_state_html")),
             (
-                "state_html",
-                lambda state: "; ".join(
-                    s for s in [state.el_state_html, state.vib_state_html] if s
-                ),
+                "el_state_html_notags",
+                lambda state: state.derive_field("el_state_html_notags"),
             ),
-            ("state_html_notags", lambda state: strip_tags(state.state_html)),
+            ("vib_state_html", lambda state: state.derive_field("vib_state_html")),
             (
-                "state_sort_key",
-                lambda state: "; ".join(
-                    s for s in [state.el_state_str, state.vib_state_sort_key] if s
-                ),
+                "vib_state_html_notags",
+                lambda state: state.derive_field("vib_state_html_notags"),
+            ),
+            (
+                "vib_state_sort_key",
+                lambda state: state.derive_field("vib_state_sort_key"),
+            ),
+            ("state_html", lambda state: state.derive_field("state_html")),
+            (
+                "state_html_notags",
+                lambda state: state.derive_field("state_html_notags"),
+            ),
+            ("state_sort_key", lambda state: state.derive_field("state_sort_key")),
+            (
+                "slug",
+                lambda state: get_state_slug(state.el_state_str, state.vib_state_str),
+            ),
+            *(
+                (name, lambda state, i=i: _vib_quantum(state, i))
+                for i, name in enumerate(VIB_QUANTA_FIELDS)
             ),
             (
                 "number_transitions_from",
@@ -115,20 +218,21 @@ class State(BaseModel):
     )
 
     # following fields are auto-added when using the dedicated create_from methods
-    # (or the sync method).
-    el_state_html = models.CharField(max_length=64)
-    el_state_html_notags = models.CharField(max_length=64)
-    vib_state_html = models.CharField(max_length=128)
-    vib_state_html_notags = models.CharField(max_length=128)
-    vib_state_sort_key = models.CharField(max_length=128)
-    state_html = models.CharField(max_length=128)
-    state_html_notags = models.CharField(max_length=128)
-    state_sort_key = models.CharField(max_length=128)
+    # (or the sync method), and not stored at all in the normalised storage mode.
+    el_state_html = DerivedCharField(max_length=64)
+    el_state_html_notags = DerivedCharField(max_length=64)
+    vib_state_html = DerivedCharField(max_length=128)
+    vib_state_html_notags = DerivedCharField(max_length=128)
+    vib_state_sort_key = DerivedCharField(max_length=128)
+    state_html = DerivedCharField(max_length=128)
+    state_html_notags = DerivedCharField(max_length=128)
+    state_sort_key = DerivedCharField(max_length=128)
     # The following fields describe the meta-data about the transitions assigned to the
     # state, handled automatically when using the dedicated create_from methods...
     # auto-inc/dec on transition creation/deletion:
     number_transitions_from = models.PositiveIntegerField()
     number_transitions_to = models.PositiveIntegerField()
+    db_counter_fields = ["number_transitions_from", "number_transitions_to"]
 
     def __str__(self):
         return get_state_str(self.isotopologue, self.el_state_str, self.vib_state_str)
@@ -207,6 +311,42 @@ class State(BaseModel):
         (if all or none can have empty vib_state_str or all or none can have the empty
         el_state_str.)
 
+        """
+        lifetime, el_state_str = cls._clean_data(
+            isotopologue,
+            lifetime,
+            el_state_str,
+            vib_state_labels,
+            vib_state_str,
+            first_state=not isotopologue.state_set.exists(),
+        )
+
+        instance = cls(
+            isotopologue=isotopologue,
+            lifetime=lifetime,
+            energy=energy,
+            el_state_str=el_state_str,
+            vib_state_str=vib_state_str,
+        )
+        instance.sync()
+        return instance
+
+    @classmethod
+    def _clean_data(
+        cls,
+        isotopologue,
+        lifetime,
+        el_state_str="",
+        vib_state_labels="",
+        vib_state_str="",
+        first_state=False,
+        existing=None,
+    ):
+        """Validates the create_from_data arguments (see there) of a new state,
+        returns its lifetime (None if infinite) and its canonicalised el_state_str.
+        The first_state sets the isotopologue vib_quantum_labels. The duplicate states
+        are looked for in the existing set of (el_state_str, vib_state_str) pairs, or
+        in the database if not passed.
         """
         if not el_state_str and not vib_state_str:
             raise StateError(
@@ -230,15 +370,16 @@ class State(BaseModel):
         state_str = get_state_str(isotopologue, el_state_str, vib_state_str)
 
         # Only a single instance per isotopologue and both state_str should ever exist:
-        try:
-            cls.objects.get(
+        if existing is None:
+            exists = cls.objects.filter(
                 isotopologue=isotopologue,
                 el_state_str=el_state_str,
                 vib_state_str=vib_state_str,
-            )
+            ).exists()
+        else:
+            exists = (el_state_str, vib_state_str) in existing
+        if exists:
             raise StateError(f'State "{state_str}" already exists!')
-        except cls.DoesNotExist:
-            pass
 
         # deal with the infinite lifetimes, swap for None
         if lifetime in {float("inf"), None}:
@@ -251,7 +392,7 @@ class State(BaseModel):
         # check if the vibrational state dimension matches the other states of the
         # Isotopologue, the same with the vibrational quanta labels:
         if vib_state_dim:
-            if not isotopologue.state_set.count():
+            if first_state:
                 # first State being saved for the given isotopologue
                 isotopologue.set_vib_quantum_labels(vib_state_labels)
                 if isotopologue.vib_state_dim != vib_state_dim:
@@ -292,15 +433,154 @@ class State(BaseModel):
                 f"vib_state_dim > 0 or non-empty ground_el_state_str."
             )
 
-        instance = cls(
-            isotopologue=isotopologue,
-            lifetime=lifetime,
-            energy=energy,
-            el_state_str=el_state_str,
-            vib_state_str=vib_state_str,
+        return lifetime, el_state_str
+
+    @classmethod
+    def bulk_create_from_data(cls, isotopologue, states_data, batch_size=2000):
+        """Creates many states of the isotopologue at once, much faster than one by one
+        with create_from_data.
+
+        The states_data is an iterable of dicts of the create_from_data keyword
+        arguments (apart from the isotopologue), validated in the same way. Each
+        distinct electronic and vibrational state label is only parsed and looked up
+        once, the states are then all inserted in bulk, with their labels derived from
+        the lookups. Returns the list of the new State instances, in the order of the
+        states_data.
+        """
+        existing = set(
+            isotopologue.state_set.values_list("el_state_str", "vib_state_str")
+        )
+        first_state = not existing
+        rows = []
+        for data in states_data:
+            data = dict(data)
+            energy = data.pop("energy")
+            lifetime, el_state_str = cls._clean_data(
+                isotopologue,
+                first_state=first_state,
+                existing=existing,
+                **data,
+            )
+            vib_state_str = data.get("vib_state_str", "")
+            existing.add((el_state_str, vib_state_str))
+            first_state = False
+            rows.append((lifetime, energy, el_state_str, vib_state_str))
+
+        el_states = ElectronicState.get_or_create_from_strs(row[2] for row in rows)
+        vib_states = VibrationalState.get_or_create_from_strs(row[3] for row in rows)
+        instances = []
+        for lifetime, energy, el_state_str, vib_state_str in rows:
+            instance = cls(
+                isotopologue=isotopologue,
+                lifetime=lifetime,
+                energy=energy,
+                el_state_str=el_state_str,
+                vib_state_str=vib_state_str,
+                el_state=el_states[el_state_str],
+                vib_state=vib_states[vib_state_str],
+                number_transitions_from=0,
+                number_transitions_to=0,
+            )
+            # the lookup labels first, the composite labels are joined from those
+            for field_name in [*cls.lookup_labels, *cls.composite_labels]:
+                setattr(instance, field_name, instance.derive_field(field_name))
+            for field_name in ["slug", *cls.vib_quanta_fields]:
+                setattr(instance, field_name, cls.sync_functions[field_name](instance))
+            instances.append(instance)
+        cls.objects.bulk_create(instances, batch_size=batch_size)
+
+        # not all the databases return the primary keys of the bulk-created rows
+        if instances and instances[0].pk is None:
+            states = isotopologue.state_set.values_list(
+                "pk", "el_state_str", "vib_state_str"
+            )
+            pks = {(el_str, vib_str): pk for pk, el_str, vib_str in states}
+            for instance in instances:
+                instance.pk = pks[(instance.el_state_str, instance.vib_state_str)]
+        isotopologue.sync(sync_only=["number_states"])
+        return instances
+
+    # the derived labels read from the lookups, and the composite ones joined from
+    # the electronic and vibrational parts (state_html = "{el html}; {vib html}")
+    lookup_labels = {
+        "el_state_html": "el_state__el_state_html",
+        "el_state_html_notags": "el_state__el_state_html_notags",
+        "vib_state_html": "vib_state__vib_state_html",
+        "vib_state_html_notags": "vib_state__vib_state_html_notags",
+        "vib_state_sort_key": "vib_state__vib_state_sort_key",
+    }
+    composite_labels = {
+        "state_html": ("el_state_html", "vib_state_html"),
+        "state_html_notags": ("el_state_html_notags", "vib_state_html_notags"),
+        "state_sort_key": ("el_state_str", "vib_state_sort_key"),
+    }
+
+    def derive_field(self, field_name):
+        """The value of the derived label field, computed from the lookups."""
+        if field_name in self.composite_labels:
+            return _join_labels(
+                *(getattr(self, name) for name in self.composite_labels[field_name])
+            )
+        lookup_name, attr = self.lookup_labels[field_name].split("__")
+        lookup = getattr(self, lookup_name)
+        return getattr(lookup, attr) if lookup is not None else ""
+
+    @classmethod
+    def label_relations(cls, prefix=""):
+        """The select_related paths of the lookups needed for the derived labels of
+        the (prefixed) related states, none unless in the normalised storage mode.
+        """
+        if normalised_states():
+            return [f"{prefix}el_state", f"{prefix}vib_state"]
+        return []
+
+    @classmethod
+    def label_path(cls, field_name, prefix="", from_lookups=None):
+        """The query path of the field, e.g. for the queryset filters or ordering,
+        prefixed by the prefix (e.g. "initial_state__"). The derived labels resolve to
+        the lookup table fields in the normalised storage mode (or if from_lookups),
+        where the composite labels have none (see label_expression).
+        """
+        if from_lookups is None:
+            from_lookups = normalised_states()
+        if from_lookups and field_name in cls.lookup_labels:
+            return prefix + cls.lookup_labels[field_name]
+        return prefix + field_name
+
+    @classmethod
+    def vib_state_order(cls, prefix=""):
+        """The fields to sort the (prefixed) states by their vibrational states: the
+        integer quanta, and the vib_state_str for the states not resolving them (e.g.
+        the atomic configurations).
+        """
+        return [prefix + name for name in [*cls.vib_quanta_fields, "vib_state_str"]]
+
+    @classmethod
+    def label_expression(cls, field_name, prefix="", from_lookups=None):
+        """The query expression of the field (as label_path), for the queryset
+        annotations, aliases or updates. The composite labels are joined in SQL from
+        their parts (which resolve as in label_path).
+        """
+        if field_name not in cls.composite_labels:
+            return models.F(cls.label_path(field_name, prefix, from_lookups))
+        el_path, vib_path = (
+            cls.label_path(name, prefix, from_lookups)
+            for name in cls.composite_labels[field_name]
+        )
+        separator = models.Case(
+            models.When(
+                models.Q((el_path, "")) | models.Q((vib_path, "")),
+                then=models.Value(""),
+            ),
+            default=models.Value("; "),
+            output_field=models.CharField(),
+        )
+        return Concat(
+            models.F(el_path),
+            separator,
+            models.F(vib_path),
+            output_field=models.CharField(),
         )
-        instance.sync()
-        return instance
 
     def get_html(self):
         molecule_html = self.isotopologue.molecule.html
@@ -319,6 +599,17 @@ class State(BaseModel):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
+        from .transition import Transition
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not {"energy", "lifetime"} & {*update_fields}:
+            # e.g. only the counters, nothing the transitions are synced from
+            return
+        if db_counters():
+            # the counters and delta energies are maintained by the triggers
+            self.isotopologue.save(update_fields=["time_modified"])
+            Transition.sync_branching_ratios(self.transition_from_set.all())
+            return
         self.isotopologue.sync(sync_only=["number_states"])
         for transition in self.transition_set.all():
             transition.sync(sync_only=["delta_energy"], save=False)
@@ -327,7 +618,10 @@ class State(BaseModel):
             transition.__class__.objects.filter(pk=transition.pk).update(
                 delta_energy=transition.delta_energy
             )
+        # the branching ratios depend on the lifetime, all updated in a single query:
+        Transition.sync_branching_ratios(self.transition_from_set.all())
 
     def delete(self, *args, **kwargs):
         super().delete(*args, **kwargs)
-        self.isotopologue.sync(sync_only=["number_states"])
+        if not db_counters():
+            self.isotopologue.sync(sync_only=["number_states"])
@@ -1,7 +1,10 @@
+from collections import defaultdict
+
 from django.db import models
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
 
 from .exceptions import TransitionError
-from .utils import BaseModel
+from .utils import BaseModel, count_subquery, db_counters, get_branching_ratio
 from .state import State
 
 
@@ -20,14 +23,33 @@ class Transition(BaseModel):
     final_state = models.ForeignKey(
         State, on_delete=models.CASCADE, related_name="transition_to_set"
     )
-    partial_lifetime = models.FloatField()
+    partial_lifetime = models.FloatField(db_index=True)
 
     sync_functions = {
         "delta_energy": lambda trans: trans.final_state.energy
         - trans.initial_state.energy,
+        "branching_ratio": lambda trans: get_branching_ratio(
+            trans.initial_state.lifetime, trans.partial_lifetime
+        ),
     }
 
-    delta_energy = models.FloatField()
+    delta_energy = models.FloatField(db_index=True)
+    # initial_state.lifetime / partial_lifetime, null for infinite lifetimes,
+    # re-synced in bulk whenever the initial state lifetime changes
+    branching_ratio = models.FloatField(null=True, db_index=True)
+
+    # rank of the transition amongst all the transitions from the same initial state,
+    # ordered by the partial lifetime (1 for the dominant decay channel). Only the
+    # max_decay_rank most dominant channels of each state are ranked, the rest is null.
+    # Handled automatically on save/delete (unless rank=False is passed), and by
+    # rank_decay_channels in bulk.
+    decay_rank = models.PositiveSmallIntegerField(null=True, default=None)
+    max_decay_rank = 10
+
+    db_counter_fields = ["delta_energy"]
+
+    class Meta:
+        indexes = [models.Index(fields=["initial_state", "decay_rank"])]
 
     def __str__(self):
         return f"{self.initial_state} → {self.final_state}"
@@ -81,15 +103,191 @@ class Transition(BaseModel):
         instance.sync()
         return instance
 
-    def after_save_and_delete(self):
-        self.initial_state.sync(sync_only=["number_transitions_from"])
-        self.final_state.sync(sync_only=["number_transitions_to"])
+    @classmethod
+    def bulk_create_from_data(cls, transitions_data, batch_size=2000):
+        """Creates many transitions of a single isotopologue at once, much faster than
+        one by one with create_from_data.
+
+        The transitions_data is an iterable of (initial_state, final_state,
+        partial_lifetime) tuples, validated in the same way as by create_from_data.
+        The delta energies and branching ratios are computed from the passed states,
+        the transitions are then all inserted in bulk, and the decay ranks and the
+        transition counts (of the states and the isotopologue) re-synced in bulk
+        once, rather than after each transition. Returns the list of the new
+        Transition instances, in the order of the transitions_data.
+        """
+        instances, pairs, isotopologue = [], set(), None
+        for initial_state, final_state, partial_lifetime in transitions_data:
+            if initial_state == final_state:
+                raise TransitionError(f"Initial and final states must differ!")
+            isotopologue = isotopologue or initial_state.isotopologue
+            if {initial_state.isotopologue_id, final_state.isotopologue_id} != {
+                isotopologue.pk
+            }:
+                raise TransitionError(
+                    f"Transition creation failed! States {initial_state} and "
+                    f"{final_state} do not share the same isotopologue!"
+                )
+            if (initial_state.pk, final_state.pk) in pairs:
+                raise TransitionError(
+                    f"Transition({initial_state}, {final_state}) already exists!"
+                )
+            if partial_lifetime < 0:
+                raise TransitionError(
+                    f"Partial lifetime needs to be positive! Passed "
+                    f"partial_lifetime={partial_lifetime}!"
+                )
+            pairs.add((initial_state.pk, final_state.pk))
+            instance = cls(
+                initial_state=initial_state,
+                final_state=final_state,
+                partial_lifetime=partial_lifetime,
+            )
+            for field_name, sync_function in cls.sync_functions.items():
+                setattr(instance, field_name, sync_function(instance))
+            instances.append(instance)
+        if not instances:
+            return instances
+
+        existing = isotopologue.transition_set.values_list(
+            "initial_state_id", "final_state_id"
+        )
+        for initial_pk, final_pk in existing.iterator():
+            if (initial_pk, final_pk) in pairs:
+                raise TransitionError(
+                    f"Transition({State.objects.get(pk=initial_pk)}, "
+                    f"{State.objects.get(pk=final_pk)}) already exists!"
+                )
+        cls.objects.bulk_create(instances, batch_size=batch_size)
+
+        # not all the databases return the primary keys of the bulk-created rows
+        if instances[0].pk is None:
+            pks = {
+                (initial_pk, final_pk): pk
+                for pk, initial_pk, final_pk in isotopologue.transition_set.values_list(
+                    "pk", "initial_state_id", "final_state_id"
+                )
+            }
+            for instance in instances:
+                instance.pk = pks[(instance.initial_state_id, instance.final_state_id)]
+        cls.rank_decay_channels(isotopologue.transition_set)
+        if not db_counters():
+            cls.sync_transition_counts(isotopologue.state_set.all())
+        isotopologue.sync(sync_only=["number_transitions"])
+        return instances
+
+    @classmethod
+    def rank_decay_channels(cls, queryset):
+        """Rank the decay channels of all the initial states present in the queryset in
+        a single grouped pass.
+        The queryset needs to contain *all* the transitions from each of the initial
+        states involved, e.g. state.transition_from_set.all(), or
+        isotopologue.transition_set.
+        Only the decay_rank values which have changed are updated, with a single
+        update query per each rank value (and batch of transitions), bypassing the
+        save method.
+        """
+        rows = queryset.order_by("initial_state_id", "partial_lifetime", "pk")
+        to_update = defaultdict(list)
+        state_pk, rank = None, 0
+        for pk, initial_state_pk, decay_rank in rows.values_list(
+            "pk", "initial_state_id", "decay_rank"
+        ).iterator():
+            if initial_state_pk != state_pk:
+                state_pk, rank = initial_state_pk, 0
+            rank += 1
+            new_rank = rank if rank <= cls.max_decay_rank else None
+            if new_rank != decay_rank:
+                to_update[new_rank].append(pk)
+
+        batch_size = 500
+        for new_rank, pks in to_update.items():
+            for i in range(0, len(pks), batch_size):
+                cls.objects.filter(pk__in=pks[i : i + batch_size]).update(
+                    decay_rank=new_rank
+                )
+
+    @classmethod
+    def sync_branching_ratios(cls, queryset):
+        """Set-based re-computation of the branching ratios of all the transitions in
+        the queryset, in a single UPDATE statement with a correlated sub-query for
+        the initial state lifetime, bypassing the save method.
+        For the update to be performed without pre-selecting the primary keys on all
+        the backends, the queryset should not span relations (use e.g.
+        initial_state__in=..., rather than initial_state__isotopologue=...).
+        """
+        lifetime = State.objects.filter(pk=OuterRef("initial_state_id")).values(
+            "lifetime"
+        )[:1]
+        queryset.update(
+            branching_ratio=Case(
+                When(partial_lifetime=0, then=None),
+                default=Subquery(lifetime) / F("partial_lifetime"),
+                output_field=models.FloatField(),
+            )
+        )
+
+    @classmethod
+    def sync_transition_counts(cls, states):
+        """Set-based re-computation of the number_transitions_from and
+        number_transitions_to of all the states in the states queryset, in a single
+        UPDATE statement with correlated counting sub-queries, bypassing the save
+        method.
+        """
+        states.update(
+            number_transitions_from=count_subquery(cls.objects.all(), "initial_state"),
+            number_transitions_to=count_subquery(cls.objects.all(), "final_state"),
+        )
+
+    def rank_initial_state_channels(self):
+        """Re-ranks the decay channels of the initial state after this transition has
+        been saved or deleted. Only the channels ranked before and after are read
+        (at most max_decay_rank of each), and only the changed ranks are updated, in a
+        single query, so the cost does not grow with the number of the channels of
+        the state (see rank_decay_channels for ranking all of them).
+        """
+        channels = Transition.objects.filter(initial_state_id=self.initial_state_id)
+        top = channels.order_by("partial_lifetime", "pk").values_list("pk", flat=True)
+        new_ranks = {pk: rank for rank, pk in enumerate(top[: self.max_decay_rank], 1)}
+        old_ranks = dict(
+            channels.filter(decay_rank__isnull=False).values_list("pk", "decay_rank")
+        )
+        changed = {
+            pk: new_ranks.get(pk)
+            for pk in new_ranks.keys() | old_ranks.keys()
+            if new_ranks.get(pk) != old_ranks.get(pk)
+        }
+        if changed:
+            channels.filter(pk__in=changed).update(
+                decay_rank=Case(
+                    *(When(pk=pk, then=Value(rank)) for pk, rank in changed.items()),
+                    output_field=models.PositiveSmallIntegerField(),
+                )
+            )
+
+    def after_save_and_delete(self, rank=True):
+        if rank:
+            self.rank_initial_state_channels()
+        if db_counters():
+            # the counters are maintained by the triggers
+            self.initial_state.isotopologue.save(update_fields=["time_modified"])
+            return
+        # only the counters are saved, not re-syncing all the transitions of the states
+        for state, counter in [
+            (self.initial_state, "number_transitions_from"),
+            (self.final_state, "number_transitions_to"),
+        ]:
+            state.sync(sync_only=[counter], save=False)
+            state.save(update_fields=[counter, "time_modified"])
         self.initial_state.isotopologue.sync(sync_only=["number_transitions"])
 
-    def save(self, *args, **kwargs):
+    # rank=False skips re-ranking the decay channels of the initial state, for the
+    # callers saving many transitions and ranking them all once at the end (see
+    # Isotopologue.rank_decay_channels)
+    def save(self, *args, rank=True, **kwargs):
         super().save(*args, **kwargs)
-        self.after_save_and_delete()
+        self.after_save_and_delete(rank=rank)
 
-    def delete(self, *args, **kwargs):
+    def delete(self, *args, rank=True, **kwargs):
         super().delete(*args, **kwargs)
-        self.after_save_and_delete()
+        self.after_save_and_delete(rank=rank)
@@ -1,18 +1,116 @@
 #from lxml import html
+import math
 import re
-from pyvalem.states import MolecularTermSymbol
-from pyvalem.states import AtomicTermSymbol
-from pyvalem.states import AtomicConfiguration
-from pyvalem.states import RacahSymbol
-from pyvalem.states import CompoundLSCoupling
-from pyvalem.states.J1K_LK_coupling import J1K_LK_Coupling
-from pyvalem.states.J1K_LK_coupling import J1K_LK_CouplingError
+import unicodedata
+from functools import lru_cache
 
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.db.models.query_utils import DeferredAttribute
 
 from .exceptions import StateError
 
 
+# pyvalem (and pyparsing under it) is imported only when first needed, in the functions
+# below, as it makes up the bulk of the import time of the models (so of the start-up
+# time of every worker process and manage.py command).
+
+
+def pyvalem_formula(formula_str):
+    """The pyvalem.formula.Formula of the formula_str."""
+    from pyvalem.formula import Formula
+
+    return Formula(formula_str)
+
+
+def normalised_states():
+    """True in the normalised storage mode (settings.NORMALISED_STATES), where the
+    labels derived from the el_state_str and vib_state_str are not stored with each
+    State, but only once in the ElectronicState and VibrationalState lookup tables.
+    """
+    return getattr(settings, "NORMALISED_STATES", False)
+
+
+def db_counters():
+    """True in the database counters mode (settings.DB_COUNTERS), where the counters
+    (the db_counter_fields of the models) are maintained by the database triggers
+    (see the counters module), rather than by the save and delete methods.
+    """
+    return getattr(settings, "DB_COUNTERS", False)
+
+
+class DerivedAttribute(DeferredAttribute):
+    def __get__(self, instance, cls=None):
+        value = super().__get__(instance, cls)
+        if instance is not None and not value and normalised_states():
+            return instance.derive_field(self.field.attname)
+        return value
+
+    # a data descriptor, so that the values in the instance __dict__ go through __get__
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class DerivedCharField(models.CharField):
+    """CharField holding a value derived from other fields (or related models).
+
+    In the normalised storage mode, the value is saved empty (the column costs next
+    to no space) and the instances derive it on the fly, when accessed, by their
+    derive_field(field_name) method. The column itself is then unusable in queries.
+    """
+
+    descriptor_class = DerivedAttribute
+
+    def pre_save(self, model_instance, add):
+        value = super().pre_save(model_instance, add)
+        return "" if normalised_states() else value
+
+
+def get_or_create_lookups(model, key_field, defaults, chunk_size=500):
+    """The instances of the lookup model (e.g. ElectronicState), in a dict keyed by
+    their (unique) key_field values. The defaults dict maps the key_field values to
+    the dicts of the other field values of the instances, used for the missing
+    instances, which are all created in bulk.
+    """
+
+    def fetch(keys):
+        keys = list(keys)
+        for i in range(0, len(keys), chunk_size):
+            lookups = model.objects.filter(
+                **{f"{key_field}__in": keys[i : i + chunk_size]}
+            )
+            instances.update((getattr(lookup, key_field), lookup) for lookup in lookups)
+
+    instances = {}
+    fetch(defaults)
+    missing = [key for key in defaults if key not in instances]
+    if missing:
+        model.objects.bulk_create(
+            [model(**{key_field: key}, **defaults[key]) for key in missing],
+            batch_size=chunk_size,
+            ignore_conflicts=True,
+        )
+        # (re)fetched with their primary keys, also any created concurrently
+        fetch(missing)
+    return instances
+
+
+def count_subquery(queryset, field):
+    """The query expression counting the rows of the queryset whose (foreign key)
+    field refers to the outer row, 0 if none, e.g.
+    count_subquery(Transition.objects.all(), "initial_state") annotating states.
+    """
+    counts = (
+        queryset.filter(**{field: models.OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(count=models.Count("pk"))
+        .values("count")
+    )
+    return Coalesce(models.Subquery(counts), 0)
+
+
 class BaseModel(models.Model):
     """Abstract base class for all the models implemented in the models sub-package."""
 
@@ -25,6 +123,8 @@ class BaseModel(models.Model):
 
     # abstract attributes:
     sync_functions = {}
+    # the fields maintained by the database triggers in the database counters mode
+    db_counter_fields = []
 
     def str_to_repr(self, text):
         # noinspection PyUnresolvedReferences
@@ -37,6 +137,22 @@ class BaseModel(models.Model):
     def model_name(self):
         return self._meta.model.__name__
 
+    def save(self, *args, **kwargs):
+        if (
+            db_counters()
+            and self.db_counter_fields
+            and not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            # the counters of the saved instance might be outdated by the triggers
+            kwargs["update_fields"] = [
+                field.attname
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in self.db_counter_fields
+            ]
+        super().save(*args, **kwargs)
+
     def sync(self, verbose=False, sync_only=None, skip=None, save=True):
         """Method to sync the instance with all the other related database models.
         All the fields which are not explicit inputs to the create_from_data method
@@ -94,11 +210,15 @@ def validate_and_parse_vib_state_str(vib_state_str):
     #ALEC
     # Check if the vib_state_str has the form e.g."1s2.2s2(3P).3s"
     if len(vib_state_str) >= 2 and vib_state_str[1] in valid_shells and "(" in vib_state_str and ")" in vib_state_str:
+        from pyvalem.states import CompoundLSCoupling
+
         vib_state_html = CompoundLSCoupling(vib_state_str).html
         quanta_int = [1]
         return quanta_int, vib_state_html
     # If not check is atomic configuration format e.g. "1s2.2s2.2p6"
     if len(vib_state_str) >= 2 and vib_state_str[1] in valid_shells:
+        from pyvalem.states import AtomicConfiguration
+
         vib_state_html = AtomicConfiguration(vib_state_str).html
         quanta_int = [1]
         return quanta_int, vib_state_html
@@ -141,6 +261,17 @@ def validate_and_parse_vib_state_str(vib_state_str):
     return quanta_int, vib_state_html
 
 
+@lru_cache(maxsize=65536)
+def get_vib_quanta(vib_state_str):
+    """Tuple of the vibrational quanta (ints) of the valid vib_state_str, e.g.
+    (0, 3, 0) for '(0, 3, 0)', empty if the vibrational states are not resolved.
+    """
+    quanta_int, _ = validate_and_parse_vib_state_str(vib_state_str)
+    return tuple(quanta_int)
+
+
+# only a handful of distinct electronic states per isotopologue, each parsed only once
+@lru_cache(maxsize=4096)
 def canonicalise_and_parse_el_state_str(el_state_str):
     """Helper function canonicalizing the el_state_str using the pyvalem package.
     Example:
@@ -149,6 +280,9 @@ def canonicalise_and_parse_el_state_str(el_state_str):
     el_state_str = el_state_str.strip()
     if el_state_str == "":
         return "", ""
+    from pyvalem.states import AtomicTermSymbol, MolecularTermSymbol, RacahSymbol
+    from pyvalem.states.J1K_LK_coupling import J1K_LK_Coupling, J1K_LK_CouplingError
+
     #ALEC
     # Handling for the special case using J1K_LK_Coupling or RacahSymbol
     if "[" in el_state_str and "]" in el_state_str:
@@ -177,6 +311,9 @@ def get_el_state_html(el_state_str):
     el_state_str = el_state_str.strip()
     if el_state_str == "":
         return ""
+    from pyvalem.states import AtomicTermSymbol, MolecularTermSymbol, RacahSymbol
+    from pyvalem.states.J1K_LK_coupling import J1K_LK_Coupling, J1K_LK_CouplingError
+
     #ALEC
     # Check if the el_state_str has J1K_LK_Coupling Racah Symbol form, e.g. 2[3/2]
     if "[" in el_state_str and "]" in el_state_str:
@@ -200,6 +337,94 @@ def get_state_str(isotopologue, el_state_str, vib_state_str):
     return f"{molecule_str} {state_str}"
 
 
+# the characters spelled out in the slugs (after "-"), none of the codes (and of the
+# names of the Greek letters) is a prefix of another one
+SLUG_CODES = {
+    "+": "plus",
+    "-": "minus",
+    "/": "slash",
+    "_": "sub",
+    "[": "lbrack",
+    "]": "rbrack",
+    " ": "space",
+}
+
+
+def _slug_part(label):
+    chars = []
+    for char in label:
+        if char.isascii() and (char.isalnum() or char in ",."):
+            chars.append(char)
+        elif char in "()":
+            # only ever wrapping the term symbols in the canonical strings
+            continue
+        elif char in SLUG_CODES:
+            chars.append(f"-{SLUG_CODES[char]}")
+        else:
+            # the Greek letters spelled out, e.g. "SIGMA" for "Σ", "sigma" for "σ"
+            match = re.fullmatch(
+                r"GREEK (CAPITAL|SMALL) LETTER ([A-Z]+)", unicodedata.name(char, "")
+            )
+            if match:
+                case, name = match.groups()
+                chars.append(f"-{name if case == 'CAPITAL' else name.lower()}")
+            else:
+                chars.append(f"-u{ord(char):06x}")
+    return "".join(chars)
+
+
+def get_state_slug(el_state_str, vib_state_str):
+    """Compact, URL-safe identifier of the state (of the characters A-Z, a-z, 0-9, and
+    "_.,-"), derived from its canonical el_state_str and vib_state_str, and distinct
+    for distinct states of the isotopologue. The numeric vibrational states are
+    written as "v" with the quanta, the other (labelled) ones after "v.". Examples:
+        get_state_slug('X(1Σ+)', '1') = 'X1-SIGMA-plus_v1',
+        get_state_slug('X(2Π_1/2)', '(0, 3, 0)') = 'X2-PI-sub1-slash2_v0,3,0',
+        get_state_slug('5p[1/2]', '1s2.2s2') = '5p-lbrack1-slash2-rbrack_v.1s2.2s2',
+        get_state_slug('', '1') = 'v1'
+    """
+    if re.fullmatch(r"[\d, ()]+", vib_state_str):
+        vib_slug = "v" + vib_state_str.strip("()").replace(" ", "")
+    elif vib_state_str:
+        vib_slug = "v." + _slug_part(vib_state_str)
+    else:
+        vib_slug = ""
+    return "_".join(part for part in [_slug_part(el_state_str), vib_slug] if part)
+
+
+def get_branching_ratio(lifetime, partial_lifetime):
+    """Branching ratio of a decay channel, given the lifetime of the initial state and
+    the partial lifetime of the transition. Returns None for infinite lifetimes (None)
+    and vanishing partial lifetimes.
+    """
+    if lifetime is None or not partial_lifetime:
+        return None
+    return lifetime / partial_lifetime
+
+
+def get_range_filter(params, fields, prefix="", infinite_nulls=()):
+    """The Q object of the range filters of the fields in the params (e.g. the
+    request.GET): the inclusive {field}_min and {field}_max bounds, with the query
+    paths of the fields prefixed by the prefix. The null values of the fields in the
+    infinite_nulls (the lifetimes) stand for infinity. The empty values are ignored,
+    the non-numeric ones raise ValueError.
+    """
+    query = models.Q()
+    for field in fields:
+        for suffix, lookup in [("min", "gte"), ("max", "lte")]:
+            value = params.get(f"{field}_{suffix}", "")
+            if value == "":
+                continue
+            value = float(value)
+            if not math.isfinite(value):
+                raise ValueError(f"{field}_{suffix} must be a finite number")
+            condition = models.Q((f"{prefix}{field}__{lookup}", value))
+            if suffix == "min" and field in infinite_nulls:
+                condition |= models.Q((f"{prefix}{field}__isnull", True))
+            query &= condition
+    return query
+
+
 def leading_zeros(vib_state_str):
     quanta_int, _ = validate_and_parse_vib_state_str(vib_state_str)
     return "(" + ", ".join(f"{q:02d}" for q in quanta_int) + ")"
@@ -0,0 +1,65 @@
+from django.db import models
+
+from .utils import (
+    validate_and_parse_vib_state_str,
+    get_or_create_lookups,
+    leading_zeros,
+    strip_tags,
+)
+
+
+class VibrationalState(models.Model):
+    """A lookup table of the distinct vibrational state labels, shared by all the
+    State instances (of any isotopologue) with the same vib_state_str, together with
+    their derived representations. The empty vib_state_str (vibrational states not
+    resolved) has its instance as well.
+
+    Attributes
+    ----------
+    vib_state_str : str
+        Example: '(0, 3, 0)'
+    vib_state_html : str
+        Example: '<b><i>v</i></b>=(0, 3, 0)'
+    vib_state_html_notags : str
+        Example: 'v=(0, 3, 0)'
+    vib_state_sort_key : str
+        Example: '(00, 03, 00)'
+    """
+
+    id = models.AutoField(primary_key=True)
+    vib_state_str = models.CharField(max_length=128, unique=True)
+    vib_state_html = models.CharField(max_length=128)
+    vib_state_html_notags = models.CharField(max_length=128)
+    vib_state_sort_key = models.CharField(max_length=128)
+
+    def __str__(self):
+        return self.vib_state_str
+
+    @classmethod
+    def get_or_create_from_str(cls, vib_state_str):
+        """The instance for the (valid) vib_state_str, created if needed."""
+        _, vib_state_html = validate_and_parse_vib_state_str(vib_state_str)
+        instance, _ = cls.objects.get_or_create(
+            vib_state_str=vib_state_str,
+            defaults={
+                "vib_state_html": vib_state_html,
+                "vib_state_html_notags": strip_tags(vib_state_html),
+                "vib_state_sort_key": leading_zeros(vib_state_str),
+            },
+        )
+        return instance
+
+    @classmethod
+    def get_or_create_from_strs(cls, vib_state_strs):
+        """The instances of all the (valid) vib_state_strs, in a dict keyed by the
+        strings, with the missing ones created in bulk.
+        """
+        defaults = {}
+        for vib_state_str in set(vib_state_strs):
+            _, vib_state_html = validate_and_parse_vib_state_str(vib_state_str)
+            defaults[vib_state_str] = {
+                "vib_state_html": vib_state_html,
+                "vib_state_html_notags": strip_tags(vib_state_html),
+                "vib_state_sort_key": leading_zeros(vib_state_str),
+            }
+        return get_or_create_lookups(cls, "vib_state_str", defaults)
@@ -0,0 +1,99 @@
+"""Factories of synthetic LIDA datasets for the tests, built through the bulk paths
+(State.bulk_create_from_data and Transition.bulk_create_from_data), so datasets of
+10^4 states and 10^5 transitions take seconds rather than minutes to build. Build
+them once per test class in setUpTestData, where they are shared by all the tests
+of the class (each test runs in a transaction rolled back to the built dataset).
+The datatable_params factory builds the query parameters of the datatables ajax
+views.
+"""
+import random
+
+from ..models import Molecule, Isotopologue, State, Transition
+
+
+def create_dataset(
+    formula="CO",
+    iso_formula="(12C)(16O)",
+    number_states=10,
+    number_transitions=None,
+    seed=0,
+):
+    """Creates the molecule with a single isotopologue, its number_states
+    vibrational states v=0, 1, ... (of energies 0.1 * v) and number_transitions
+    random transitions between them (all the v -> v - 1 transitions by default),
+    each from a higher to a lower state. The lifetimes of the states are consistent
+    with the partial lifetimes of their decay channels, the states with no decay
+    channels are stable. The data are reproducible for the same seed.
+
+    Returns
+    -------
+    isotopologue : Isotopologue
+    states : list[State]
+        Indexed by the vibrational quantum v.
+    """
+    if number_transitions is None:
+        number_transitions = number_states - 1
+    if number_transitions > number_states * (number_states - 1) // 2:
+        raise ValueError(
+            f"At most {number_states * (number_states - 1) // 2} transitions between "
+            f"{number_states} states!"
+        )
+    rng = random.Random(seed)
+    # all the v -> v - 1 cascades first, then random pairs of (higher, lower) states
+    pairs = {(v, v - 1) for v in range(1, min(number_states, number_transitions + 1))}
+    while len(pairs) < number_transitions:
+        pair = tuple(rng.sample(range(number_states), 2))
+        pairs.add((max(pair), min(pair)))
+    transitions = [(i, f, rng.uniform(0.1, 10)) for i, f in sorted(pairs)]
+    decay_rates = [0.0] * number_states
+    for i, _, partial_lifetime in transitions:
+        decay_rates[i] += 1 / partial_lifetime
+
+    molecule = Molecule.create_from_data(formula)
+    isotopologue = Isotopologue.create_from_data(
+        molecule, iso_formula_str=iso_formula, dataset_name="factory", version=1
+    )
+    states = State.bulk_create_from_data(
+        isotopologue,
+        (
+            dict(
+                lifetime=1 / decay_rate if decay_rate else None,
+                energy=0.1 * v,
+                vib_state_str=str(v),
+                vib_state_labels="v",
+            )
+            for v, decay_rate in enumerate(decay_rates)
+        ),
+    )
+    Transition.bulk_create_from_data(
+        (states[i], states[f], partial_lifetime)
+        for i, f, partial_lifetime in transitions
+    )
+    return isotopologue, states
+
+
+def datatable_params(columns, order_column=0, order_dir="asc", search=""):
+    """The query parameters of a datatables ajax request of the (named) columns,
+    ordered by the order_column index.
+    """
+    params = {
+        "draw": 1,
+        "start": 0,
+        "length": 50,
+        "search[value]": search,
+        "search[regex]": "false",
+        "order[0][column]": order_column,
+        "order[0][dir]": order_dir,
+    }
+    for i, name in enumerate(columns):
+        params.update(
+            {
+                f"columns[{i}][data]": i,
+                f"columns[{i}][name]": name,
+                f"columns[{i}][searchable]": "true",
+                f"columns[{i}][orderable]": "true",
+                f"columns[{i}][search][value]": "",
+                f"columns[{i}][search][regex]": "false",
+            }
+        )
+    return params
@@ -0,0 +1,87 @@
+import io
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+
+from ..management.commands.check_consistency import find_inconsistencies
+from ..models import Isotopologue, Molecule, State, Transition, VibrationalState
+from .factories import create_dataset
+
+
+class TestConsistency(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.isotopologue, cls.states = create_dataset(
+            number_states=20, number_transitions=60
+        )
+        create_dataset(formula="CN", iso_formula="(12C)(14N)", number_states=5)
+
+    def get_inconsistencies(self):
+        return [
+            (model.__name__, field, formula_str, count)
+            for model, field, formula_str, count in find_inconsistencies()
+        ]
+
+    def test_consistent(self):
+        stdout = io.StringIO()
+        # a fixed number of aggregate queries, however many rows:
+        with self.assertNumQueries(14):
+            call_command("check_consistency", stdout=stdout)
+        self.assertIn("consistent", stdout.getvalue())
+        with override_settings(NORMALISED_STATES=True):
+            call_command("sync_state_labels", stdout=io.StringIO())
+            self.assertEqual(self.get_inconsistencies(), [])
+        # the cleared labels are inconsistent in the denormalised mode:
+        self.assertEqual(
+            self.get_inconsistencies(),
+            [("State", "labels", "CN", 5), ("State", "labels", "CO", 20)],
+        )
+
+    def test_inconsistent(self):
+        states = State.objects.filter(isotopologue=self.isotopologue)
+        states.filter(vib_state_str__in=["3", "4"]).update(number_transitions_to=42)
+        states.filter(vib_state_str="5").update(state_html_notags="v=6")
+        transitions = Transition.objects.filter(initial_state=self.states[10])
+        transitions.filter(decay_rank=1).update(delta_energy=1, decay_rank=2)
+        transitions.update(branching_ratio=None)
+        Isotopologue.objects.filter(pk=self.isotopologue.pk).update(number_states=0)
+        Molecule.objects.filter(formula_str="CN").update(html="CO")
+        VibrationalState.objects.filter(vib_state_str="5").update(
+            vib_state_html_notags="v=6"
+        )
+        self.assertEqual(
+            self.get_inconsistencies(),
+            [
+                ("State", "number_transitions_to", "CO", 2),
+                ("State", "labels", "CO", 1),
+                ("Transition", "delta_energy", "CO", 1),
+                ("Transition", "branching_ratio", "CO", transitions.count()),
+                ("Transition", "decay_rank", "CO", 1),
+                ("Isotopologue", "number_states", "CO", 1),
+                ("Molecule", "html", "CN", 1),
+                ("VibrationalState", "vib_state_html_notags", "(shared)", 1),
+            ],
+        )
+        stdout = io.StringIO()
+        with self.assertRaises(CommandError):
+            call_command("check_consistency", stdout=stdout)
+        self.assertIn("Transition.decay_rank", stdout.getvalue())
+
+    def test_missing_decay_rank(self):
+        transitions = Transition.objects.filter(initial_state=self.states[10])
+        transitions.filter(decay_rank=1).update(decay_rank=None)
+        self.assertEqual(
+            self.get_inconsistencies(), [("Transition", "decay_rank", "CO", 1)]
+        )
+        transitions.update(decay_rank=None)
+        self.assertEqual(
+            self.get_inconsistencies(),
+            [("Transition", "decay_rank", "CO", transitions.count())],
+        )
+
+    def test_sync_inconsistent_db(self):
+        State.objects.update(number_transitions_to=42)
+        Transition.objects.update(delta_energy=1, decay_rank=None)
+        self.assertEqual(len(self.get_inconsistencies()), 6)
+        call_command("sync_inconsistent_db", verbosity=0)
+        self.assertEqual(self.get_inconsistencies(), [])
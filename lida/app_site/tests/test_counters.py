@@ -0,0 +1,116 @@
+import io
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from ..management.commands.check_consistency import find_inconsistencies
+from ..models import Isotopologue, State, Transition
+from ..models.counters import refresh_counters
+from .factories import create_dataset
+
+COUNTER_FIELDS = [
+    "number_states",
+    "number_transitions",
+    "number_transitions_from",
+    "number_transitions_to",
+    "delta_energy",
+]
+
+
+def get_inconsistent_counters():
+    return [
+        (model.__name__, field, formula_str, count)
+        for model, field, formula_str, count in find_inconsistencies()
+        if field in COUNTER_FIELDS
+    ]
+
+
+@override_settings(DB_COUNTERS=True)
+class TestDBCounters(TestCase):
+    def setUp(self):
+        call_command("sync_db_counters", stdout=io.StringIO())
+        self.isotopologue, self.states = create_dataset(
+            number_states=10, number_transitions=20
+        )
+
+    def test_bulk_writes(self):
+        time_modified = self.isotopologue.time_modified
+        states = State.objects.filter(isotopologue=self.isotopologue)
+        states.filter(vib_state_str__in=["2", "3"]).update(energy=42)
+        Transition.objects.filter(initial_state=self.states[9]).delete()
+        Transition.objects.bulk_create(
+            [
+                Transition(
+                    initial_state=self.states[9],
+                    final_state=state,
+                    partial_lifetime=1,
+                    delta_energy=0,
+                )
+                for state in self.states[:3]
+            ]
+        )
+        # the cascade deletes of the transitions from and to the states:
+        states.filter(vib_state_str__in=["5", "6"]).delete()
+        self.assertEqual(get_inconsistent_counters(), [])
+        isotopologue = Isotopologue.objects.get(pk=self.isotopologue.pk)
+        self.assertEqual(isotopologue.number_states, 8)
+        self.assertGreater(isotopologue.time_modified, time_modified)
+        self.assertEqual(
+            Transition.objects.get(
+                initial_state=self.states[9], final_state=self.states[2]
+            ).delta_energy,
+            42 - 0.9,
+        )
+
+    def test_saves(self):
+        # the counters of the instances saved after they changed are not overwritten
+        state = State.objects.get(pk=self.states[0].pk)
+        number_transitions_to = state.number_transitions_to
+        isotopologue = Isotopologue.objects.get(pk=self.isotopologue.pk)
+        Transition.create_from_data(self.states[9], self.states[0], 1)
+        State.create_from_data(
+            self.isotopologue,
+            lifetime=1,
+            energy=5,
+            vib_state_str="10",
+            vib_state_labels="v",
+        )
+        state.energy = -1
+        state.save()
+        isotopologue.version = 2
+        isotopologue.save()
+        self.assertEqual(get_inconsistent_counters(), [])
+        state.refresh_from_db()
+        self.assertEqual(state.number_transitions_to, number_transitions_to + 1)
+        isotopologue.refresh_from_db()
+        self.assertEqual(isotopologue.number_states, 11)
+        self.assertEqual(isotopologue.version, 2)
+
+    def test_switched_off(self):
+        with override_settings(DB_COUNTERS=False):
+            call_command("sync_db_counters", stdout=io.StringIO())
+            State.objects.filter(vib_state_str="2").update(energy=42)
+            self.assertEqual(len(get_inconsistent_counters()), 1)
+            refresh_counters()
+            self.assertEqual(get_inconsistent_counters(), [])
+
+
+class TestRefreshCounters(TestCase):
+    def test_refresh_counters(self):
+        isotopologue, states = create_dataset(number_states=10, number_transitions=20)
+        State.objects.update(number_transitions_from=0, energy=1)
+        Transition.objects.filter(initial_state=states[9]).delete()
+        Isotopologue.objects.update(number_states=0)
+        self.assertEqual(
+            [field for _, field, *_ in get_inconsistent_counters()],
+            [
+                "number_transitions_from",
+                "number_transitions_to",
+                "delta_energy",
+                "number_states",
+                "number_transitions",
+            ],
+        )
+        with self.assertNumQueries(3):
+            refresh_counters(Isotopologue.objects.filter(pk=isotopologue.pk))
+        self.assertEqual(get_inconsistent_counters(), [])
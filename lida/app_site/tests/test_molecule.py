@@ -1,8 +1,11 @@
 import pyvalem.formula
 from django.test import TestCase
+from django.urls import reverse
 
-from ..models import Molecule
+from lida.metrics import cache_requests
+from ..models import Molecule, Isotopologue
 from ..models.exceptions import MoleculeError
+from .factories import datatable_params
 
 
 # Create your tests here.
@@ -75,3 +78,56 @@ class TestMolecule(TestCase):
         self.assertEqual(m.charge, 0)
         self.assertEqual(m.slug, "H2O_m")
         self.assertEqual(m.number_atoms, 2)
+
+
+class TestMoleculeList(TestCase):
+    columns = [
+        "html",
+        "number_atoms",
+        "isotopologue__mass",
+        "isotopologue__number_states",
+        "isotopologue__number_transitions",
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        for formula, iso_formula in [("CO", "(12C)(16O)"), ("CN", "(12C)(14N)")]:
+            molecule = Molecule.create_from_data(formula)
+            Isotopologue.create_from_data(
+                molecule, iso_formula_str=iso_formula, dataset_name="name", version=1
+            )
+
+    def get_data(self, **kwargs):
+        response = self.client.get(
+            reverse("molecule-list-ajax"),
+            datatable_params(self.columns, **kwargs),
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+        return response.json()["data"]
+
+    def test_cached_rows(self):
+        data = self.get_data()
+        self.assertEqual(len(data), 2)
+        self.assertIn('id="molecule-details-CN"', data[0][0])
+        self.assertEqual(data[1][2], "27.99")
+        key = ("molecule_list", "hit")
+        hits = cache_requests.values.get(key, 0)
+        # the stamps, the two counts and the molecules page, nothing rendered:
+        with self.assertNumQueries(4):
+            self.assertEqual(self.get_data(order_dir="desc"), data[::-1])
+        self.assertEqual(cache_requests.values[key], hits + 1)
+
+        # any saved isotopologue invalidates the cached rows:
+        isotopologue = Isotopologue.objects.get(molecule__formula_str="CO")
+        isotopologue.number_states = 5
+        isotopologue.save()
+        self.assertIn(">5</a>", self.get_data()[1][3])
+        self.assertEqual(cache_requests.values[key], hits + 1)
+        Molecule.create_from_data("NO")
+        Isotopologue.create_from_data(
+            Molecule.objects.get(formula_str="NO"),
+            iso_formula_str="(14N)(16O)",
+            dataset_name="name",
+            version=1,
+        )
+        self.assertEqual(len(self.get_data()), 3)
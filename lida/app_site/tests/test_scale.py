@@ -0,0 +1,108 @@
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Least
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import State, Transition
+from .factories import create_dataset, datatable_params
+
+
+class TestScale(TestCase):
+    number_states = 10**4
+    number_transitions = 2 * 10**4
+
+    @classmethod
+    def setUpTestData(cls):
+        # built once for all the tests of the class, in seconds through the bulk paths
+        cls.isotopologue, cls.states = create_dataset(
+            number_states=cls.number_states,
+            number_transitions=cls.number_transitions,
+        )
+        cls.small_isotopologue, cls.small_states = create_dataset(
+            formula="CN", iso_formula="(12C)(14N)", number_states=10
+        )
+
+    def test_counts(self):
+        self.isotopologue.refresh_from_db()
+        self.assertEqual(self.isotopologue.number_states, self.number_states)
+        self.assertEqual(self.isotopologue.number_transitions, self.number_transitions)
+        mismatched = self.isotopologue.state_set.annotate(
+            n_from=Count("transition_from_set", distinct=True),
+            n_to=Count("transition_to_set", distinct=True),
+        ).exclude(number_transitions_from=F("n_from"), number_transitions_to=F("n_to"))
+        self.assertFalse(mismatched.exists())
+
+    def test_decay_channels(self):
+        transitions = self.isotopologue.transition_set
+        self.assertFalse(transitions.filter(decay_rank__gt=10).exists())
+        self.assertEqual(
+            transitions.filter(decay_rank__isnull=False).count(),
+            transitions.filter(initial_state__number_transitions_from__gt=0)
+            .values("initial_state")
+            .annotate(ranked=Least(Count("pk"), Transition.max_decay_rank))
+            .aggregate(total=Sum("ranked"))["total"],
+        )
+        # the branching ratios of the decay channels of each unstable state add up to 1
+        totals = (
+            transitions.values("initial_state")
+            .annotate(total=Sum("branching_ratio"))
+            .values_list("total", flat=True)
+        )
+        for total in totals:
+            self.assertAlmostEqual(total, 1)
+        self.assertEqual(
+            State.objects.filter(isotopologue=self.isotopologue, lifetime=None)
+            .exclude(number_transitions_from=0)
+            .count(),
+            0,
+        )
+
+    def assertSameNumQueries(self, get_response):
+        """The same number of queries for the small and the large dataset."""
+        num_queries = []
+        for molecule, state in [("CN", self.small_states[5]), ("CO", self.states[5])]:
+            with CaptureQueriesContext(connection) as context:
+                response = get_response(molecule, state)
+            self.assertEqual(response.status_code, 200)
+            num_queries.append(len(context))
+        self.assertEqual(num_queries[0], num_queries[1])
+
+    def test_ajax_views(self):
+        state_columns = ["vib_state_html", "energy", "lifetime"]
+        transition_columns = [
+            "initial_state__state_html",
+            "final_state__state_html",
+            "delta_energy",
+        ]
+        for url_name, args, columns in [
+            ("state-list-ajax", lambda mol, state: [mol], state_columns),
+            ("transition-list-ajax", lambda mol, state: [mol], transition_columns),
+            (
+                "transition-from-state-list-ajax",
+                lambda mol, state: [state.pk],
+                transition_columns,
+            ),
+            (
+                "transition-to-state-list-ajax",
+                lambda mol, state: [state.pk],
+                transition_columns,
+            ),
+            ("state-decay-channels-ajax", lambda mol, state: [state.pk], []),
+        ]:
+            self.assertSameNumQueries(
+                lambda molecule, state: self.client.get(
+                    reverse(url_name, args=args(molecule, state)),
+                    datatable_params(columns, order_column=1),
+                    HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+                )
+            )
+
+    def test_api(self):
+        for url in ["/api/state/", "/api/cascade/"]:
+            self.assertSameNumQueries(
+                lambda molecule, state: self.client.get(
+                    url, {"molecule": molecule, "state": state.slug}
+                )
+            )
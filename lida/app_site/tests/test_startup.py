@@ -0,0 +1,30 @@
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+BOOT = """
+import json, os, sys
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lida.settings")
+from lida.wsgi import application
+import lida.urls
+print(json.dumps(sorted(sys.modules)))
+"""
+
+
+class TestStartup(SimpleTestCase):
+    def test_lazy_imports(self):
+        # a fresh interpreter, booted as a WSGI worker ready to serve:
+        process = subprocess.run(
+            [sys.executable, "-c", BOOT],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        modules = {name.split(".")[0] for name in json.loads(process.stdout)}
+        self.assertIn("app_site", modules)
+        for package in ["pyvalem", "pyparsing", "numpy", "pandas", "tqdm"]:
+            self.assertNotIn(package, modules)
@@ -1,17 +1,66 @@
-from django.test import TestCase
+import io
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.test import TestCase, override_settings
 
 # noinspection PyProtectedMember
 from pyvalem.states._base_state import StateParseError
 
-from ..models import Molecule, Isotopologue, State
+from ..models import Molecule, Isotopologue, State, Transition, ElectronicState
 from ..models.exceptions import StateError
 from ..models.utils import (
     validate_and_parse_vib_state_str,
     canonicalise_and_parse_el_state_str,
+    get_state_slug,
+    SLUG_CODES,
 )
+from .factories import datatable_params
 
 
 class TestUtils(TestCase):
+    def test_state_slug(self):
+        self.assertEqual(get_state_slug("a(3Π)", "2"), "a3-PI_v2")
+        self.assertEqual(get_state_slug("X(1Σ-)", ""), "X1-SIGMA-minus")
+        self.assertEqual(get_state_slug("", "(0, 13, 0)"), "v0,13,0")
+        self.assertEqual(get_state_slug("b(3σ+)", "0"), "b3-sigma-plus_v0")
+        # the half-integer Omega, and the J1K coupling (Racah) symbols
+        self.assertEqual(get_state_slug("X(2Π_1/2)", "1"), "X2-PI-sub1-slash2_v1")
+        self.assertEqual(
+            get_state_slug("5p[1/2]_0", "(0)"), "5p-lbrack1-slash2-rbrack-sub0_v0"
+        )
+        self.assertEqual(get_state_slug("2[3/2]o", ""), "2-lbrack3-slash2-rbracko")
+        self.assertEqual(get_state_slug("", "1s2.2s2"), "v.1s2.2s2")
+
+    def test_state_slug_url_safe(self):
+        for el_state_str, vib_state_str in [
+            ("X(2Π_1/2)", "(0, 3, 0)"),
+            ("5p[1/2]_0", "1s2.2s2"),
+            ("A(2Δ)°", "2v1 + v3"),
+        ]:
+            self.assertRegex(
+                get_state_slug(el_state_str, vib_state_str), r"^[A-Za-z0-9_.,-]+$"
+            )
+
+    def test_state_slug_collisions(self):
+        for first, second in [
+            (("", "1"), ("", "v1")),
+            (("A 1", ""), ("A1", "")),
+            (("A", "1"), ("A_1", "")),
+            (("X(1Σ+)", ""), ("X(1Σ-)", "")),
+            (("X(1Σ+)", ""), ("X(1SIGMAplus)", "")),
+            (("2[1/2]", ""), ("2[1_2]", "")),
+        ]:
+            self.assertNotEqual(get_state_slug(*first), get_state_slug(*second))
+        # the escaped characters are spelled out after "-", with none of the codes
+        # a prefix of another, so the slugs decode uniquely
+        codes = [*SLUG_CODES.values()]
+        codes += [get_state_slug(chr(i), "")[1:] for i in range(0x391, 0x3CA)]
+        for code in codes:
+            self.assertFalse(
+                [other for other in codes if other != code and other.startswith(code)]
+            )
+
     def test_vib_state_str_valid(self):
         self.assertEqual(([], ""), validate_and_parse_vib_state_str(""))
         self.assertEqual(([0], "<i>v</i>=0"), validate_and_parse_vib_state_str("0"))
@@ -586,3 +635,334 @@ class TestState(TestCase):
 
         # any indirect or batch saving/deleting methods will not trigger the sync, but
         # tough luck!
+
+    def test_bulk_create_from_data(self):
+        State.create_from_data(
+            self.diff_isotopologue,
+            1,
+            0.5,
+            el_state_str="X(2PI)",
+            vib_state_str="0",
+            vib_state_labels="v",
+        )
+        states_data = [
+            dict(
+                lifetime=lifetime,
+                energy=energy,
+                el_state_str=el_state_str,
+                vib_state_str=vib_state_str,
+                vib_state_labels="v",
+            )
+            for lifetime, energy, el_state_str, vib_state_str in [
+                (None, 0, "X(2PI)", "1"),
+                (0.1, 2, "A(2SIGMA+)", "0"),
+                (0.2, 3, "A(2SIGMA+)", "10"),
+            ]
+        ]
+        # the same number of queries for any number of states:
+        with self.assertNumQueries(11):
+            states = State.bulk_create_from_data(self.diff_isotopologue, states_data)
+        self.assertEqual(
+            [state.state_html for state in states],
+            [
+                "X<sup>2</sup>Π; <i>v</i>=1",
+                "A<sup>2</sup>Σ<sup>+</sup>; <i>v</i>=0",
+                "A<sup>2</sup>Σ<sup>+</sup>; <i>v</i>=10",
+            ],
+        )
+        self.assertEqual(self.diff_isotopologue.number_states, 4)
+        for state in states:
+            saved_state = State.objects.get(pk=state.pk)
+            self.assertEqual(saved_state.energy, state.energy)
+            self.assertEqual(saved_state.state_sort_key, state.state_sort_key)
+            # the same as synced one by one:
+            values = {name: getattr(saved_state, name) for name in State.sync_functions}
+            saved_state.sync(save=False)
+            for name, value in values.items():
+                self.assertEqual(getattr(saved_state, name), value)
+        self.assertEqual(
+            State.objects.filter(el_state_str="X(2Π)")
+            .values("el_state")
+            .distinct()
+            .count(),
+            1,
+        )
+        with self.assertRaises(StateError):
+            State.bulk_create_from_data(self.diff_isotopologue, states_data[:1])
+        with self.assertRaises(StateError):
+            State.bulk_create_from_data(self.diff_isotopologue, [states_data[1]] * 2)
+        self.assertEqual(self.diff_isotopologue.state_set.count(), 4)
+
+    def test_slug(self):
+        state = State.create_from_data(
+            self.diff_isotopologue,
+            1,
+            0.5,
+            el_state_str="A(2SIGMA+)",
+            vib_state_str="1",
+            vib_state_labels="v",
+        )
+        self.assertEqual(state.slug, "A2-SIGMA-plus_v1")
+        self.assertEqual(
+            self.diff_isotopologue.state_set.get(slug="A2-SIGMA-plus_v1"), state
+        )
+        state = State.create_from_data(
+            self.isotopologue,
+            1,
+            0.5,
+            el_state_str="X(2PI)",
+            vib_state_str="(0, 3, 0)",
+            vib_state_labels="(v1, v2, v3)",
+        )
+        self.assertEqual(state.slug, "X2-PI_v0,3,0")
+
+
+class TestNormalisedState(TestCase):
+    state_columns = ["el_state_html", "vib_state_html", "energy", "lifetime"]
+    transition_columns = [
+        "initial_state__state_html",
+        "final_state__state_html",
+        "delta_energy",
+    ]
+
+    def setUp(self):
+        molecule = Molecule.create_from_data(formula_str="CO", name="carbon monoxide")
+        self.isotopologue = Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)", dataset_name="name", version=1
+        )
+        self.isotopologue.set_ground_el_state_str("X(1SIGMA+)")
+        states = []
+        for i, (el_state_str, v) in enumerate(
+            [("X(1SIGMA+)", 0), ("X(1SIGMA+)", 1), ("a(3PI)", 0), ("a(3PI)", 1)]
+        ):
+            with override_settings(NORMALISED_STATES=i % 2 == 0):
+                states.append(
+                    State.create_from_data(
+                        self.isotopologue,
+                        lifetime=0.1 * i if i else None,
+                        energy=0.5 * i,
+                        el_state_str=el_state_str,
+                        vib_state_str=str(v),
+                        vib_state_labels="v",
+                    )
+                )
+        for initial in states[1:]:
+            Transition.create_from_data(initial, states[0], 1.0)
+
+    def get_data(self, url_name, columns, filters=None, **kwargs):
+        response = self.client.get(
+            reverse(url_name, args=["CO"]),
+            {**datatable_params(columns, **kwargs), **(filters or {})},
+            HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+        )
+        return response.json()["data"]
+
+    def get_all_data(self):
+        return [
+            self.get_data("state-list-ajax", self.state_columns, **kwargs)
+            for kwargs in [
+                {"order_column": 0, "order_dir": "desc"},
+                {"order_column": 1},
+                {"search": "a3"},
+            ]
+        ] + [
+            self.get_data("transition-list-ajax", self.transition_columns, **kwargs)
+            for kwargs in [
+                {"order_column": 0, "order_dir": "desc"},
+                {"search": "X1Σ+; v=1"},
+                {"search": "a3Π"},
+            ]
+        ]
+
+    def test_lookups(self):
+        self.assertEqual(
+            sorted(ElectronicState.objects.values_list("el_state_str", flat=True)),
+            ["X(1Σ+)", "a(3Π)"],
+        )
+        with override_settings(NORMALISED_STATES=True):
+            call_command("sync_state_labels", stdout=io.StringIO())
+            self.assertEqual(
+                set(State.objects.values_list("state_html", "state_sort_key")),
+                {("", "")},
+            )
+            state = State.objects.get(energy=1.5)
+            self.assertEqual(state.state_html, "a<sup>3</sup>Π; <i>v</i>=1")
+            self.assertEqual(state.state_html_notags, "a3Π; v=1")
+            self.assertEqual(state.state_sort_key, "a(3Π); (01)")
+            self.assertEqual(
+                Transition.objects.get(initial_state=state).initial_state.state_html,
+                state.state_html,
+            )
+
+    def test_views(self):
+        call_command("sync_state_labels", stdout=io.StringIO())
+        self.assertNotIn("", State.objects.values_list("state_html", flat=True))
+        data = self.get_all_data()
+        self.assertEqual(len(data[2]), 2)
+        self.assertEqual(len(data[4]), 1)
+        self.assertEqual(len(data[5]), 2)
+        with override_settings(NORMALISED_STATES=True):
+            call_command("sync_state_labels", stdout=io.StringIO())
+            with self.assertNumQueries(6):
+                normalised_data = self.get_data(
+                    "transition-list-ajax", self.transition_columns
+                )
+            self.assertEqual(len(normalised_data), 3)
+            self.assertEqual(self.get_all_data(), data)
+
+    def test_el_state_filter(self):
+        el_state = ElectronicState.objects.get(el_state_str="a(3Π)")
+        response = self.client.get(reverse("state-list", args=["CO"]))
+        self.assertContains(response, f'<option value="{el_state.pk}">a3Π</option>')
+        for normalised in [False, True]:
+            with override_settings(NORMALISED_STATES=normalised):
+                data = self.get_data(
+                    "state-list-ajax",
+                    self.state_columns,
+                    filters={"el_state": el_state.pk},
+                    order_column=2,
+                )
+                self.assertEqual([row[2] for row in data], ["1.000", "1.500"])
+                # invalid filters are ignored:
+                data = self.get_data(
+                    "state-list-ajax", self.state_columns, filters={"el_state": "a"}
+                )
+                self.assertEqual(len(data), 4)
+
+    def test_range_filters(self):
+        response = self.client.get(reverse("state-list", args=["CO"]))
+        self.assertContains(response, 'name="q1_max"')
+        self.assertNotContains(response, 'name="q2_max"')
+        for filters, expected in [
+            ({"energy_min": "0.5", "energy_max": "1"}, ["0.500", "1.000"]),
+            ({"lifetime_max": "0.15"}, ["0.500"]),
+            # the infinite lifetimes are longer than any:
+            ({"lifetime_min": "0.15"}, ["0.000", "1.000", "1.500"]),
+            ({"q1_max": "0", "energy_max": ""}, ["0.000", "1.000"]),
+            # the invalid filters are ignored
+            ({"energy_min": "a"}, ["0.000", "0.500", "1.000", "1.500"]),
+            ({"energy_min": "nan"}, ["0.000", "0.500", "1.000", "1.500"]),
+        ]:
+            data = self.get_data(
+                "state-list-ajax", self.state_columns, filters=filters, order_column=2
+            )
+            self.assertEqual([row[2] for row in data], expected)
+        data = self.get_data(
+            "transition-list-ajax",
+            self.transition_columns,
+            filters={"delta_energy_max": "-0.75", "partial_lifetime_min": "1"},
+            order_column=2,
+        )
+        self.assertEqual([row[2] for row in data], ["-1.500", "-1.000"])
+        response = self.client.get(reverse("transition-list", args=["CO"]))
+        self.assertContains(response, 'name="initial_state__q1_max"')
+        self.assertContains(response, 'name="final_state__q1_min"')
+        for filters, expected in [
+            ({"initial_state__q1_max": "0"}, ["-1.000"]),
+            ({"initial_state__q1_min": "1"}, ["-1.500", "-0.500"]),
+            ({"final_state__q1_min": "1"}, []),
+        ]:
+            data = self.get_data(
+                "transition-list-ajax",
+                self.transition_columns,
+                filters=filters,
+                order_column=2,
+            )
+            self.assertEqual([row[2] for row in data], expected)
+
+
+class TestVibQuanta(TestCase):
+    def setUp(self):
+        molecule = Molecule.create_from_data(formula_str="CO", name="carbon monoxide")
+        self.isotopologue = Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)", dataset_name="name", version=1
+        )
+        State.create_from_data(
+            self.isotopologue, 1, 0, vib_state_str="100", vib_state_labels="v"
+        )
+        State.bulk_create_from_data(
+            self.isotopologue,
+            [
+                dict(lifetime=1, energy=v, vib_state_str=str(v), vib_state_labels="v")
+                for v in [9, 10, 2]
+            ],
+        )
+
+    def test_vib_quanta(self):
+        self.assertEqual(
+            list(State.objects.order_by("pk").values_list("q1", "q2", "q12")),
+            [(100, None, None), (9, None, None), (10, None, None), (2, None, None)],
+        )
+        self.assertEqual(
+            [
+                state.vib_state_str
+                for state in State.objects.filter(q1__lte=9).order_by(
+                    *State.vib_state_order()
+                )
+            ],
+            ["2", "9"],
+        )
+
+    def test_vib_state_sort(self):
+        for order_dir, expected in [
+            ("asc", ["2", "9", "10", "100"]),
+            ("desc", ["100", "10", "9", "2"]),
+        ]:
+            response = self.client.get(
+                reverse("state-list-ajax", args=["CO"]),
+                datatable_params(
+                    ["vib_state_str", "vib_state_html"],
+                    order_column=1,
+                    order_dir=order_dir,
+                ),
+                HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+            )
+            self.assertEqual([row[0] for row in response.json()["data"]], expected)
+
+
+class TestPageCache(TestCase):
+    def setUp(self):
+        molecule = Molecule.create_from_data(formula_str="CO", name="carbon monoxide")
+        isotopologue = Isotopologue.create_from_data(
+            molecule, iso_formula_str="(12C)(16O)", dataset_name="name", version=1
+        )
+        self.states = [
+            State.create_from_data(
+                isotopologue,
+                lifetime=1,
+                energy=v,
+                vib_state_str=str(v),
+                vib_state_labels="v",
+            )
+            for v in range(2)
+        ]
+        Transition.create_from_data(self.states[1], self.states[0], 1.0)
+
+    def test_cached_pages(self):
+        for url in [
+            reverse("state-list", args=["CO"]),
+            reverse("transition-list", args=["CO"]),
+            reverse("transition-to-state-list", args=[self.states[0].pk]),
+        ]:
+            response = self.client.get(url)
+            self.assertEqual(response["Cache-Control"], "max-age=60")
+            # only the stamps of the isotopologue are queried for the cached page:
+            with self.assertNumQueries(1):
+                cached_response = self.client.get(url)
+            self.assertEqual(cached_response.content, response.content)
+            self.assertEqual(cached_response["ETag"], response["ETag"])
+        response = self.client.get(
+            reverse("transition-from-state-list", args=[self.states[1].pk])
+        )
+        self.assertIn("from the state <i>v</i>=1", response.content.decode())
+
+        # re-rendered once the states change:
+        State.create_from_data(
+            self.states[0].isotopologue,
+            lifetime=1,
+            energy=2,
+            vib_state_str="2",
+            vib_state_labels="v",
+        )
+        with self.assertNumQueries(3):
+            self.client.get(reverse("state-list", args=["CO"]))
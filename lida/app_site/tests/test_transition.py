@@ -2,6 +2,7 @@ from django.test import TestCase
 
 from ..models import Molecule, Isotopologue, State, Transition
 from ..models.exceptions import TransitionError
+from .factories import create_dataset
 
 
 # noinspection PyTypeChecker
@@ -257,3 +258,169 @@ class TestTransition(TestCase):
         s2.save()
         self.assertEqual(Transition.objects.get(pk=tr1_pk).delta_energy, 41)
         self.assertEqual(Transition.objects.get(pk=tr2_pk).delta_energy, 39)
+
+    def test_decay_rank(self):
+        s1, s2, s3 = [
+            State.create_from_data(
+                self.isotopologue,
+                lifetime=0.1,
+                energy=energy,
+                vib_state_str=vib_state_str,
+                vib_state_labels="(v1, v2, v3)",
+            )
+            for energy, vib_state_str in [
+                (1, "(1, 0, 0)"),
+                (2, "(0, 2, 0)"),
+                (3, "(0, 0, 3)"),
+            ]
+        ]
+        tr1 = Transition.create_from_data(s3, s1, 0.3)
+        tr2 = Transition.create_from_data(s3, s2, 0.2)
+        tr3 = Transition.create_from_data(s3, self.state_low, 0.4)
+        tr4 = Transition.create_from_data(s2, s1, 0.5)
+
+        def ranks(*transitions):
+            return [Transition.objects.get(pk=tr.pk).decay_rank for tr in transitions]
+
+        self.assertEqual(ranks(tr1, tr2, tr3, tr4), [2, 1, 3, 1])
+        tr2.delete()
+        self.assertEqual(ranks(tr1, tr3, tr4), [1, 2, 1])
+
+        # the grouped pass over the whole isotopologue:
+        Transition.objects.update(decay_rank=None)
+        self.isotopologue.rank_decay_channels()
+        self.assertEqual(ranks(tr1, tr3, tr4), [1, 2, 1])
+
+        Transition.max_decay_rank, max_decay_rank = 1, Transition.max_decay_rank
+        try:
+            self.isotopologue.rank_decay_channels()
+        finally:
+            Transition.max_decay_rank = max_decay_rank
+        self.assertEqual(ranks(tr1, tr3, tr4), [1, None, 1])
+
+        # left to the callers ranking many saved transitions at once:
+        tr3.partial_lifetime = 0.1
+        tr3.save(rank=False)
+        self.assertEqual(ranks(tr1, tr3, tr4), [1, None, 1])
+        tr3.save()
+        self.assertEqual(ranks(tr1, tr3, tr4), [2, 1, 1])
+
+    def test_decay_rank_queries(self):
+        isotopologue, states = create_dataset(
+            "HCl", "(1H)(35Cl)", number_states=40, number_transitions=0
+        )
+        initial_state = states[-1]
+        for v in range(30):
+            Transition.create_from_data(initial_state, states[v], 1 + v)
+        ranks = initial_state.transition_from_set.order_by("partial_lifetime")
+
+        # a single save does not depend on the number of the channels of the state:
+        # the insert, 2 selects of the ranked channels, the update of the changed
+        # ranks (if any), and the counts and saves of the 2 states and isotopologue
+        transition = Transition(
+            initial_state=initial_state, final_state=states[30], partial_lifetime=42
+        )
+        transition.sync(save=False)
+        with self.assertNumQueries(9):
+            transition.save()
+        self.assertIsNone(ranks.get(pk=transition.pk).decay_rank)
+        # a new strongest channel shifts all the ranks, in a single update:
+        transition.partial_lifetime = 0.5
+        with self.assertNumQueries(10):
+            transition.save()
+        self.assertEqual(
+            list(ranks.values_list("decay_rank", flat=True)),
+            [*range(1, Transition.max_decay_rank + 1), *[None] * 21],
+        )
+        self.assertEqual(ranks.first(), transition)
+        with self.assertNumQueries(10):
+            transition.delete()
+        self.assertEqual(
+            list(ranks.values_list("decay_rank", flat=True)),
+            [*range(1, Transition.max_decay_rank + 1), *[None] * 20],
+        )
+
+    def test_branching_ratio(self):
+        s = State.create_from_data(
+            self.isotopologue,
+            lifetime=0.1,
+            energy=42,
+            vib_state_str="(9, 9, 9)",
+            vib_state_labels="(v1, v2, v3)",
+        )
+        tr1 = Transition.create_from_data(s, self.state_low, 0.4)
+        tr2 = Transition.create_from_data(s, self.state_high, 0.2)
+        tr3 = Transition.create_from_data(self.state_high, self.state_low, 0)
+        self.assertAlmostEqual(tr1.branching_ratio, 0.25)
+        self.assertAlmostEqual(tr2.branching_ratio, 0.5)
+        self.assertIsNone(tr3.branching_ratio)
+
+        # changing the lifetime of the initial state re-syncs the branching ratios:
+        s.lifetime = 0.2
+        s.save()
+        self.assertAlmostEqual(Transition.objects.get(pk=tr1.pk).branching_ratio, 0.5)
+        self.assertAlmostEqual(Transition.objects.get(pk=tr2.pk).branching_ratio, 1)
+        s.lifetime = None
+        s.save()
+        self.assertIsNone(Transition.objects.get(pk=tr1.pk).branching_ratio)
+
+        # bulk re-computation for the whole isotopologue:
+        State.objects.filter(pk=s.pk).update(lifetime=0.04)
+        Transition.objects.update(branching_ratio=-1)
+        self.isotopologue.sync_branching_ratios()
+        self.assertAlmostEqual(Transition.objects.get(pk=tr1.pk).branching_ratio, 0.1)
+        self.assertAlmostEqual(Transition.objects.get(pk=tr2.pk).branching_ratio, 0.2)
+        self.assertIsNone(Transition.objects.get(pk=tr3.pk).branching_ratio)
+
+    def test_bulk_create_from_data(self):
+        s = State.create_from_data(
+            self.isotopologue,
+            lifetime=0.1,
+            energy=42,
+            vib_state_str="(9, 9, 9)",
+            vib_state_labels="(v1, v2, v3)",
+        )
+        tr = Transition.create_from_data(self.state_high, self.state_low, 0.2)
+        transitions_data = [
+            (s, self.state_low, 0.4),
+            (s, self.state_high, 0.2),
+        ]
+        # the same number of queries for any number of transitions:
+        with self.assertNumQueries(9):
+            transitions = Transition.bulk_create_from_data(transitions_data)
+        self.assertEqual(self.isotopologue.number_transitions, 3)
+        for transition in [tr, *transitions]:
+            saved_transition = Transition.objects.get(pk=transition.pk)
+            self.assertEqual(saved_transition.delta_energy, transition.delta_energy)
+            # the same as synced one by one:
+            values = {
+                name: getattr(saved_transition, name)
+                for name in Transition.sync_functions
+            }
+            saved_transition.sync(save=False)
+            for name, value in values.items():
+                self.assertEqual(getattr(saved_transition, name), value)
+        self.assertEqual(
+            [Transition.objects.get(pk=t.pk).decay_rank for t in transitions], [2, 1]
+        )
+        self.assertAlmostEqual(transitions[0].branching_ratio, 0.25)
+        self.assertEqual(
+            [
+                (state.number_transitions_from, state.number_transitions_to)
+                for state in State.objects.filter(
+                    pk__in=[s.pk, self.state_high.pk, self.state_low.pk]
+                ).order_by("energy")
+            ],
+            [(0, 2), (1, 1), (2, 0)],
+        )
+
+        with self.assertRaises(TransitionError):
+            Transition.bulk_create_from_data(transitions_data[:1])
+        with self.assertRaises(TransitionError):
+            Transition.bulk_create_from_data([(s, self.diff_state_low, 0.1)])
+        with self.assertRaises(TransitionError):
+            Transition.bulk_create_from_data([(self.state_low, s, 0.1)] * 2)
+        with self.assertRaises(TransitionError):
+            Transition.bulk_create_from_data([(self.state_low, s, -0.1)])
+        self.assertEqual(self.isotopologue.transition_set.count(), 3)
+        self.assertEqual(Transition.bulk_create_from_data([]), [])
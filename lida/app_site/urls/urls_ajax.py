@@ -6,6 +6,7 @@ from ..views import (
     TransitionListAjaxView,
     TransitionToStateListAjaxView,
     TransitionFromStateListAjaxView,
+    DecayChannelsAjaxView,
 )
 
 urlpatterns = [
@@ -25,6 +26,11 @@ urlpatterns = [
         TransitionFromStateListAjaxView.as_view(),
         name="transition-from-state-list-ajax",
     ),
+    path(
+        "state/decay_channels/<int:state_pk>/",
+        DecayChannelsAjaxView.as_view(),
+        name="state-decay-channels-ajax",
+    ),
     path(
         "transition/list/<str:mol_slug>/",
         TransitionListAjaxView.as_view(),
@@ -0,0 +1,109 @@
+"""HTTP validators (ETag and Last-Modified) for the views serving the LIDA data.
+
+The data served only change when the underlying dataset is (re-)populated, which
+is reflected by the time_modified stamps of the affected Isotopologue (any State or
+Transition save re-syncs and saves its Isotopologue) and Molecule instances. The
+validators are derived from those stamps with a single query per request, so that
+unchanged data are answered with 304 Not Modified without touching the data tables.
+"""
+import asyncio
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+from lida.metrics import cache_requests
+
+
+def get_stamps(request, get_isotopologues, *args, **kwargs):
+    """Version stamps of the isotopologues relevant for the request, memoized on
+    the request, so the etag and last_modified functions (and the view itself) share
+    a single query.
+    """
+    if not hasattr(request, "_lida_stamps"):
+        request._lida_stamps = list(
+            get_isotopologues(request, *args, **kwargs)
+            .order_by("pk")
+            .values_list("pk", "version", "time_modified", "molecule__time_modified")
+        )
+    return request._lida_stamps
+
+
+def conditional_on_isotopologues(get_isotopologues, max_age=0):
+    """View decorator adding the ETag and Last-Modified validators derived from the
+    isotopologues (and their molecules) the view serves data of.
+
+    Both the synchronous and the asynchronous views can be decorated, the validators
+    of the latter are queried in a thread (with sync_to_async).
+
+    Parameters
+    ----------
+    get_isotopologues : callable
+        get_isotopologues(request, *args, **kwargs) returning an Isotopologue
+        queryset. No validators are added if the queryset is empty.
+    max_age : int
+        Seconds for which the clients may reuse the responses without revalidating
+        them (Cache-Control max-age). By default, they always revalidate.
+    """
+
+    def decorator(view_func):
+        def etag_func(request, *args, **kwargs):
+            stamps = get_stamps(request, get_isotopologues, *args, **kwargs)
+            if not stamps:
+                return None
+            digest = hashlib.md5(repr(stamps).encode()).hexdigest()
+            return f'"{digest}"'
+
+        def last_modified_func(request, *args, **kwargs):
+            stamps = get_stamps(request, get_isotopologues, *args, **kwargs)
+            if not stamps:
+                return None
+            return max(max(iso_time, mol_time) for _, _, iso_time, mol_time in stamps)
+
+        def finalize(response):
+            result = "hit" if response.status_code == 304 else "miss"
+            cache_requests.inc(cache="http_conditional", result=result)
+            if max_age:
+                patch_cache_control(response, max_age=max_age)
+            else:
+                # the data may change with any re-population, always revalidate:
+                patch_cache_control(response, no_cache=True)
+            return response
+
+        if asyncio.iscoroutinefunction(view_func):
+
+            @wraps(view_func)
+            async def async_wrapped_view(request, *args, **kwargs):
+                # as django.views.decorators.http.condition, for the async views:
+                etag = await sync_to_async(etag_func)(request, *args, **kwargs)
+                last_modified = last_modified_func(request, *args, **kwargs)
+                if last_modified is not None:
+                    last_modified = int(last_modified.timestamp())
+                response = get_conditional_response(
+                    request, etag=etag, last_modified=last_modified
+                )
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                if request.method in ("GET", "HEAD"):
+                    if last_modified and not response.has_header("Last-Modified"):
+                        response["Last-Modified"] = http_date(last_modified)
+                    if etag:
+                        response.setdefault("ETag", etag)
+                return finalize(response)
+
+            return async_wrapped_view
+
+        conditional_view = condition(
+            etag_func=etag_func, last_modified_func=last_modified_func
+        )(view_func)
+
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            return finalize(conditional_view(request, *args, **kwargs))
+
+        return wrapped_view
+
+    return decorator
@@ -0,0 +1,60 @@
+"""Server-side cache of the rendered HTML pages of the data views.
+
+The HTML pages of the states and transitions lists are only the shells of the
+datatables (the data themselves are served by the ajax views), which depend on
+nothing but the url and the molecule (or state) they list. They are rendered once
+and kept in the default Django cache, keyed by the url path and the version stamps
+of the isotopologue (see conditional.get_stamps), so they are re-rendered whenever
+its data are re-populated. A cached page costs a single (stamps) query, which is
+shared with its HTTP validators, and the browsers reuse the pages for
+settings.HTML_PAGE_MAX_AGE seconds without requesting them at all.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from lida.metrics import cache_requests
+from .conditional import conditional_on_isotopologues, get_stamps
+
+# the pages of the superseded stamps are not deleted, but expire after a day
+PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def cache_page_on_isotopologues(get_isotopologues):
+    """View decorator caching the rendered pages of the view for the version stamps
+    of the isotopologues they show (get_isotopologues as for the
+    conditional_on_isotopologues decorator, which is also applied). Pages of unknown
+    isotopologues (empty get_isotopologues querysets) and error responses are never
+    cached.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def cached_view(request, *args, **kwargs):
+            stamps = get_stamps(request, get_isotopologues, *args, **kwargs)
+            if not stamps:
+                return view_func(request, *args, **kwargs)
+            key = "html_page:" + hashlib.md5(
+                repr((request.path, stamps)).encode()
+            ).hexdigest()
+            content = cache.get(key)
+            cache_requests.inc(
+                cache="html_page", result="miss" if content is None else "hit"
+            )
+            if content is not None:
+                return HttpResponse(content)
+            response = view_func(request, *args, **kwargs)
+            if hasattr(response, "render"):
+                response.render()
+            if response.status_code == 200:
+                cache.set(key, response.content, PAGE_CACHE_TIMEOUT)
+            return response
+
+        return conditional_on_isotopologues(
+            get_isotopologues, max_age=settings.HTML_PAGE_MAX_AGE
+        )(cached_view)
+
+    return decorator
@@ -1,8 +1,16 @@
+import hashlib
+
+from django.core.cache import cache
 from django.template.loader import render_to_string
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django_datatables_serverside.views import ServerSideDataTableView
 
-from app_site.models import Molecule
+from app_site.models import Isotopologue, Molecule
+from lida.metrics import cache_requests
+from ..conditional import conditional_on_isotopologues, get_stamps
+
+MOLECULE_ROWS_CACHE_KEY = "molecule_list_rows"
 
 
 def molecule_details_html(molecule):
@@ -25,12 +33,62 @@ def number_transitions_value(molecule):
     return f'<a href="{href}" class="{cls}">{val}</a>'
 
 
-class MoleculeListAjaxView(ServerSideDataTableView):
-    custom_value_getters = {
-        "html": molecule_details_html,
-        "isotopologue__mass": lambda mol: f"{mol.isotopologue.mass:.2f}",
-        "isotopologue__number_states": number_states_value,
-        "isotopologue__number_transitions": number_transitions_value,
+def all_isotopologues(request):
+    return Isotopologue.objects.all()
+
+
+# the renderers of the molecule table cells
+molecule_value_getters = {
+    "html": molecule_details_html,
+    "isotopologue__mass": lambda mol: f"{mol.isotopologue.mass:.2f}",
+    "isotopologue__number_states": number_states_value,
+    "isotopologue__number_transitions": number_transitions_value,
+}
+
+
+def render_molecule_row(molecule):
+    """The rendered cells of the molecule table row, {column: value}."""
+    return {column: get(molecule) for column, get in molecule_value_getters.items()}
+
+
+def get_molecule_rows(stamps):
+    """The rendered rows of all the molecules, {molecule pk: row}, cached for as long
+    as the stamps (see conditional.get_stamps) of all the isotopologues do not change,
+    i.e. until any Molecule or Isotopologue is saved, added or deleted (in any
+    process).
+    """
+    digest = hashlib.md5(repr(stamps).encode()).hexdigest()
+    cached = cache.get(MOLECULE_ROWS_CACHE_KEY)
+    if cached is not None and cached[0] == digest:
+        cache_requests.inc(cache="molecule_list", result="hit")
+        return cached[1]
+    cache_requests.inc(cache="molecule_list", result="miss")
+    rows = {
+        molecule.pk: render_molecule_row(molecule)
+        for molecule in Molecule.objects.select_related("isotopologue")
     }
+    cache.set(MOLECULE_ROWS_CACHE_KEY, (digest, rows), timeout=None)
+    return rows
+
+
+@method_decorator(conditional_on_isotopologues(all_isotopologues), name="get")
+class MoleculeListAjaxView(ServerSideDataTableView):
+    """The rendered cells (with the molecule details modals) are all read from the
+    cached rows, rather than rendered for each molecule on each request.
+    """
+
     surrogate_columns_search = {"html": "formula_str"}
     queryset = Molecule.objects.all()
+
+    def get(self, request, *args, **kwargs):
+        rows = get_molecule_rows(get_stamps(request, all_isotopologues))
+
+        def get_row(molecule):
+            # rendered on the fly if the molecule was added since the stamps were read
+            return rows.get(molecule.pk) or render_molecule_row(molecule)
+
+        self.custom_value_getters = {
+            column: lambda molecule, column=column: get_row(molecule)[column]
+            for column in molecule_value_getters
+        }
+        return super().get(request, *args, **kwargs)
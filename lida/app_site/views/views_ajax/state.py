@@ -1,7 +1,9 @@
 from django.urls import reverse
-from django_datatables_serverside.views import ServerSideDataTableView
+from django.utils.decorators import method_decorator
 
-from app_site.models import State
+from app_site.models import Isotopologue, State
+from ..conditional import conditional_on_isotopologues
+from .utils import DataTableView
 
 
 def number_transitions_from_value(instance):
@@ -22,11 +24,13 @@ def number_transitions_to_value(instance):
     return f'<a href="{href}" class="{cls}">{val}</a>'
 
 
-class StateListAjaxView(ServerSideDataTableView):
-    surrogate_columns_search = {
-        "el_state_html": "el_state_html_notags",
-    }
-    surrogate_columns_sort = {"vib_state_str": "vib_state_sort_key"}
+@method_decorator(
+    conditional_on_isotopologues(
+        lambda request, mol_slug: Isotopologue.objects.filter(molecule__slug=mol_slug)
+    ),
+    name="get",
+)
+class StateListAjaxView(DataTableView):
     custom_value_getters = {
         "energy": lambda instance: f"{instance.energy:.3f}",
         "lifetime": lambda instance: f"{instance.lifetime:.2e}"
@@ -35,9 +39,32 @@ class StateListAjaxView(ServerSideDataTableView):
         "number_transitions_from": number_transitions_from_value,
         "number_transitions_to": number_transitions_to_value,
     }
+    range_filters = ["energy", "lifetime", *State.vib_quanta_fields]
+    infinite_nulls = ["lifetime"]
+
+    @property
+    def surrogate_columns_search(self):
+        return {
+            "el_state_html": State.label_path("el_state_html_notags"),
+            "vib_state_html": State.label_path("vib_state_html"),
+        }
+
+    @property
+    def surrogate_columns_sort(self):
+        return {
+            "el_state_html": State.label_path("el_state_html"),
+            "vib_state_html": State.vib_state_order(),
+            "vib_state_str": State.vib_state_order(),
+        }
 
     @property
     def queryset(self):
-        return State.objects.filter(
+        queryset = State.objects.filter(
             isotopologue__molecule__slug=self.kwargs["mol_slug"]
         ).all()
+        # the electronic state filter, by the ElectronicState id:
+        try:
+            el_state_id = int(self.request.GET["el_state"])
+        except (KeyError, ValueError):
+            return queryset
+        return queryset.filter(el_state_id=el_state_id)
@@ -1,41 +1,152 @@
-from django_datatables_serverside.views import ServerSideDataTableView
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views import View
 
-from app_site.models import Molecule, State
+from app_site.models import Isotopologue, Molecule, State, Transition
+from app_site.models.utils import normalised_states
+from ..conditional import conditional_on_isotopologues
+from .utils import DataTableView
 
+conditional_on_state = conditional_on_isotopologues(
+    lambda request, state_pk: Isotopologue.objects.filter(state__pk=state_pk)
+)
+conditional_on_molecule = conditional_on_isotopologues(
+    lambda request, mol_slug: Isotopologue.objects.filter(molecule__slug=mol_slug)
+)
 
-class _Base(ServerSideDataTableView):
-    surrogate_columns_search = {
-        "initial_state__state_html": "initial_state__state_html_notags",
-        "final_state__state_html": "final_state__state_html_notags",
-    }
-    surrogate_columns_sort = {
-        "initial_state__state_html": "initial_state__state_sort_key",
-        "final_state__state_html": "final_state__state_sort_key",
-    }
+
+def _state_label(state, field_name):
+    """Name of the field (or of the alias added by _Base.filter_queryset, in the
+    normalised storage mode) of the composite label of the related state.
+    """
+    if normalised_states():
+        return f"{state}_{field_name}"
+    return f"{state}__{field_name}"
+
+
+class _Base(DataTableView):
+    states = ["initial_state", "final_state"]
     custom_value_getters = {
         "delta_energy": lambda tr: f"{tr.delta_energy:.3f}",
         "partial_lifetime": lambda tr: f"{tr.partial_lifetime:.2e}"
         if tr.partial_lifetime is not None
         else "∞",
+        "branching_ratio": lambda tr: f"{tr.branching_ratio:.3f}"
+        if tr.branching_ratio is not None
+        else "",
     }
+    # the vibrational quanta of the states, e.g. initial_state__q1_max=3, filtered
+    # through the joined states by the (isotopologue, q1, ..., q12) index
+    range_filters = [
+        "delta_energy",
+        "partial_lifetime",
+        *(f"{state}__{field}" for state in states for field in State.vib_quanta_fields),
+    ]
     queryset = None
 
+    @property
+    def surrogate_columns_search(self):
+        return {
+            f"{state}__state_html": _state_label(state, "state_html_notags")
+            for state in self.states
+        }
 
+    @property
+    def surrogate_columns_sort(self):
+        return {
+            f"{state}__state_html": [
+                f"{state}__el_state_str",
+                *State.vib_state_order(f"{state}__"),
+            ]
+            for state in self.states
+        }
+
+    def filter_queryset(self, queryset):
+        """Joins the states (and their label lookups, aliasing the composite labels
+        searched by in the normalised storage mode), and applies the numeric filters
+        not supported by the datatables server.
+        """
+        queryset = queryset.select_related(
+            *(
+                path
+                for state in self.states
+                for path in [state, *State.label_relations(f"{state}__")]
+            )
+        )
+        if normalised_states():
+            queryset = queryset.alias(
+                **{
+                    _state_label(state, "state_html_notags"): State.label_expression(
+                        "state_html_notags", f"{state}__"
+                    )
+                    for state in self.states
+                }
+            )
+        try:
+            min_branching_ratio = float(self.request.GET["min_branching_ratio"])
+        except (KeyError, ValueError):
+            return queryset
+        return queryset.filter(branching_ratio__gte=min_branching_ratio)
+
+
+@method_decorator(conditional_on_state, name="get")
 class TransitionToStateListAjaxView(_Base):
     @property
     def queryset(self):
-        return State.objects.get(pk=self.kwargs["state_pk"]).transition_to_set.all()
+        return self.filter_queryset(
+            State.objects.get(pk=self.kwargs["state_pk"]).transition_to_set.all()
+        )
 
 
+@method_decorator(conditional_on_state, name="get")
 class TransitionFromStateListAjaxView(_Base):
     @property
     def queryset(self):
-        return State.objects.get(pk=self.kwargs["state_pk"]).transition_from_set.all()
+        return self.filter_queryset(
+            State.objects.get(pk=self.kwargs["state_pk"]).transition_from_set.all()
+        )
 
 
+@method_decorator(conditional_on_molecule, name="get")
 class TransitionListAjaxView(_Base):
     @property
     def queryset(self):
-        return Molecule.objects.get(
-            slug=self.kwargs["mol_slug"]
-        ).isotopologue.transition_set.all()
+        isotopologue = Molecule.objects.get(slug=self.kwargs["mol_slug"]).isotopologue
+        # the (redundant) isotopologue of the final states lets the final state range
+        # filters use the (isotopologue, q1, ..., q12) index as well
+        return self.filter_queryset(
+            isotopologue.transition_set.filter(final_state__isotopologue=isotopologue)
+        )
+
+
+@method_decorator(conditional_on_state, name="get")
+class DecayChannelsAjaxView(View):
+    """Lightweight view serving the k dominant decay channels of a single state, read
+    directly from the precomputed Transition.decay_rank, so the transitions from the
+    state never need to be sorted.
+    """
+
+    def get(self, request, state_pk):
+        try:
+            k = int(request.GET.get("k", Transition.max_decay_rank))
+        except ValueError:
+            k = Transition.max_decay_rank
+        transitions = (
+            Transition.objects.filter(initial_state_id=state_pk, decay_rank__lte=k)
+            .select_related("final_state", *State.label_relations("final_state__"))
+            .order_by("decay_rank")
+        )
+        data = []
+        for tr in transitions:
+            href = reverse("transition-from-state-list", args=[tr.final_state_id])
+            val = tr.final_state.state_html
+            data.append(
+                [
+                    tr.decay_rank,
+                    f'<a href="{href}" class="site-link">{val}</a>',
+                    f"{tr.partial_lifetime:.2e}",
+                    _Base.custom_value_getters["branching_ratio"](tr),
+                ]
+            )
+        return JsonResponse({"data": data})
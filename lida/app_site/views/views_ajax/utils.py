@@ -0,0 +1,59 @@
+from django_datatables_serverside._data_server import (
+    DataTablesServer as BaseDataTablesServer,
+)
+from django_datatables_serverside.views import ServerSideDataTableView
+
+from app_site.models.utils import get_range_filter
+
+
+class DataTablesServer(BaseDataTablesServer):
+    """DataTablesServer also sorting by the lists of fields in surrogate_columns_sort
+    (e.g. by all the vibrational quanta of the states), each field in turn.
+    """
+
+    def _sort_queryset(self, queryset):
+        columns_num_to_field = {
+            col_params["data"]: col_params["name"]
+            for col_params in self.parameters_received["columns"]
+        }
+        order_by_params = []
+        for order_params in self.parameters_received["order"]:
+            field_name = columns_num_to_field[order_params["column"]]
+            field_names = self.surrogate_columns_sort.get(field_name, field_name)
+            if isinstance(field_names, str):
+                field_names = [field_names]
+            prefix = "" if order_params["dir"] == "asc" else "-"
+            order_by_params.extend(f"{prefix}{name}" for name in field_names)
+        if not order_by_params:
+            return queryset
+        return queryset.order_by(*order_by_params)
+
+
+class DataTableView(ServerSideDataTableView):
+    """ServerSideDataTableView served by the DataTablesServer above, also filtering
+    the queryset by the ranges (the {field}_min and {field}_max GET parameters) of the
+    range_filters fields, with the nulls of the infinite_nulls fields standing for
+    infinity.
+    """
+
+    range_filters = []
+    infinite_nulls = []
+
+    def filter_ranges(self, queryset):
+        try:
+            query = get_range_filter(
+                self.request.GET, self.range_filters, infinite_nulls=self.infinite_nulls
+            )
+        except ValueError:
+            return queryset
+        return queryset.filter(query)
+
+    def get(self, request, *_, **__):
+        dt_server = DataTablesServer(
+            request=request,
+            queryset=self.filter_ranges(self.queryset),
+            custom_value_getters=self.custom_value_getters,
+            surrogate_columns_search=self.surrogate_columns_search,
+            surrogate_columns_sort=self.surrogate_columns_sort,
+        )
+        return dt_server.serve_data()
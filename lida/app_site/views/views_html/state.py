@@ -1,10 +1,18 @@
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView
 
-from app_site.models import Molecule
-from .utils import Column, Order
+from app_site.models import ElectronicState, Isotopologue, Molecule, State
+from ..page_cache import cache_page_on_isotopologues
+from .utils import Column, Filter, Order, RangeFilter
 
 
+@method_decorator(
+    cache_page_on_isotopologues(
+        lambda request, mol_slug: Isotopologue.objects.filter(molecule__slug=mol_slug)
+    ),
+    name="get",
+)
 class StateListView(TemplateView):
     template_name = "site/datatable.html"
     extra_context = {
@@ -52,5 +60,31 @@ class StateListView(TemplateView):
             Column("Transitions from", "number_transitions_from", 4),
             Column("Transitions to", "number_transitions_to", 5),
         ]
+        context["range_filters"] = [
+            RangeFilter("Energy (eV)", "energy"),
+            RangeFilter("Lifetime (s)", "lifetime"),
+        ]
+        if mol.number_atoms > 1 and mol.isotopologue.resolves_vib:
+            # a range filter for each of the vibrational quanta, e.g. v1, v2, v3
+            quantum_labels = mol.isotopologue.vib_quantum_labels_html.strip("()")
+            context["range_filters"] += [
+                RangeFilter(label, field)
+                for label, field in zip(
+                    quantum_labels.split(", "), State.vib_quanta_fields
+                )
+            ]
+        if mol.isotopologue.resolves_el:
+            el_states = (
+                ElectronicState.objects.filter(states__isotopologue=mol.isotopologue)
+                .distinct()
+                .order_by("el_state_str")
+            )
+            context["filters"] = [
+                Filter(
+                    column_label_el,
+                    "el_state",
+                    el_states.values_list("pk", "el_state_html_notags"),
+                )
+            ]
 
         return context
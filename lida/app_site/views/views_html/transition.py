@@ -1,8 +1,17 @@
 from django.urls import reverse
+from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView
 
-from app_site.models import Molecule, State
-from .utils import Column, Order
+from app_site.models import Isotopologue, Molecule, State
+from ..page_cache import cache_page_on_isotopologues
+from .utils import Column, Order, RangeFilter
+
+cache_page_on_state = cache_page_on_isotopologues(
+    lambda request, state_pk: Isotopologue.objects.filter(state__pk=state_pk)
+)
+cache_page_on_molecule = cache_page_on_isotopologues(
+    lambda request, mol_slug: Isotopologue.objects.filter(molecule__slug=mol_slug)
+)
 
 
 class _Base(TemplateView):
@@ -27,6 +36,11 @@ class _Base(TemplateView):
             ),
             Column("Δ<em>E</em> (eV)", "delta_energy", 2),
             Column("Partial lifetime (s)", "partial_lifetime", 3),
+            Column("Branching ratio", "branching_ratio", 4),
+        ],
+        "range_filters": [
+            RangeFilter("Δ<em>E</em> (eV)", "delta_energy"),
+            RangeFilter("Partial lifetime (s)", "partial_lifetime"),
         ],
         "scroller": True,
     }
@@ -39,6 +53,20 @@ class _Base(TemplateView):
         self.save_state_and_molecule()
         context = super().get_context_data(**kwargs)
         context["title"] = f"{self.molecule.slug} transitions"
+        isotopologue = self.molecule.isotopologue
+        if self.molecule.number_atoms > 1 and isotopologue.resolves_vib:
+            # a range filter for each of the vibrational quanta of either state
+            quantum_labels = isotopologue.vib_quantum_labels_html.strip("()")
+            context["range_filters"] = context["range_filters"] + [
+                RangeFilter(f"{heading} {label}", f"{state}__{field}")
+                for heading, state in [
+                    ("Initial", "initial_state"),
+                    ("Final", "final_state"),
+                ]
+                for label, field in zip(
+                    quantum_labels.split(", "), State.vib_quanta_fields
+                )
+            ]
         context["search_footer"] = True
         context["length_change"] = True
         # to be implemented in the child classes:
@@ -60,6 +88,7 @@ class _Base(TemplateView):
             )
 
 
+@method_decorator(cache_page_on_state, name="get")
 class TransitionToStateListView(_Base):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -73,6 +102,7 @@ class TransitionToStateListView(_Base):
         return context
 
 
+@method_decorator(cache_page_on_state, name="get")
 class TransitionFromStateListView(_Base):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -87,6 +117,7 @@ class TransitionFromStateListView(_Base):
         return context
 
 
+@method_decorator(cache_page_on_molecule, name="get")
 class TransitionListView(_Base):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
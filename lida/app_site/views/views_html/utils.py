@@ -22,3 +22,18 @@ class Order:
     def __init__(self, index, direction="asc"):
         self.index = index
         self.dir = direction
+
+
+class Filter:
+    def __init__(self, heading, parameter, choices):
+        self.heading = heading
+        self.parameter = parameter
+        # list of (value, label) pairs
+        self.choices = choices
+
+
+class RangeFilter:
+    def __init__(self, heading, parameter):
+        self.heading = heading
+        # the {parameter}_min and {parameter}_max GET parameters
+        self.parameter = parameter
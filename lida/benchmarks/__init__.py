@@ -0,0 +1,6 @@
+"""Benchmarks of the LIDA hot paths.
+
+The benchmark modules are run as scripts from within the top-level lida directory
+(next to manage.py), e.g. ``python -m benchmarks.compression``, and print their
+results as json.
+"""
@@ -0,0 +1,196 @@
+"""Throughput of concurrent API downloads served under WSGI and under ASGI.
+
+The same set of concurrent downloads (the streamed transitions exports) is served
+in-process by the Django WSGIHandler on a fixed number of worker threads (as a
+threaded sync worker would) and by the lida.asgi application on a single event loop
+(as a single ASGI worker would). The clients read the responses slowly (with the
+--client-delay per 64 kB sent, standing in for the network), which ties up a whole
+worker thread per download under WSGI, but not under ASGI. The wall time, the
+downloads throughput and the per-download latency percentiles are reported.
+
+    python -m benchmarks.asgi [--downloads 32] [--threads 4] [--client-delay 20]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import math
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from wsgiref.util import setup_testing_defaults
+
+from .loadtest import percentile
+from .synthetic import SCALES, generate_scale
+from .utils import setup_django, write_results
+
+# the ASGIHandler sends the streamed responses in messages of up to 64 kB
+MESSAGE_SIZE = 2 ** 16
+
+
+def populate(scale, data_dir):
+    """Populates the synthetic dataset, if the database has no molecule yet."""
+    from app_site.models import Molecule
+    from res.populate_molecule import populate_molecule
+
+    if not Molecule.objects.exists():
+        dataset_dir = generate_scale(data_dir, scale)
+        with contextlib.redirect_stdout(io.StringIO()):
+            with contextlib.redirect_stderr(io.StringIO()):
+                populate_molecule(dataset_dir)
+    return Molecule.objects.first()
+
+
+def download_wsgi(handler, path, query_string, client_delay):
+    """Serves a single download by the WSGI handler, read by a slow client."""
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query_string,
+        "HTTP_HOST": "testserver",
+        "wsgi.input": BytesIO(),
+    }
+    setup_testing_defaults(environ)
+    start = time.perf_counter()
+    size = 0
+    response = handler(environ, lambda status, headers: None)
+    try:
+        for part in response:
+            size += len(part)
+            time.sleep(client_delay * max(1, math.ceil(len(part) / MESSAGE_SIZE)))
+    finally:
+        response.close()
+    return time.perf_counter() - start, size
+
+
+async def download_asgi(application, path, query_string, client_delay):
+    """Serves a single download by the ASGI application, read by a slow client."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query_string.encode(),
+        "root_path": "",
+        "headers": [(b"host", b"testserver")],
+        "client": ("127.0.0.1", 0),
+        "server": ("testserver", 80),
+    }
+    start = time.perf_counter()
+    size = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body" and message.get("body"):
+            size += len(message["body"])
+            await asyncio.sleep(client_delay)
+
+    await application(scope, receive, send)
+    return time.perf_counter() - start, size
+
+
+def summarize(wall_time, downloads):
+    latencies = sorted(latency for latency, _ in downloads)
+    return {
+        "wall_time": wall_time,
+        "throughput": len(downloads) / wall_time,
+        "megabytes_per_second": sum(size for _, size in downloads) / wall_time / 1e6,
+        "latency": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "max": latencies[-1],
+            "mean": statistics.mean(latencies),
+        },
+    }
+
+
+def benchmark_wsgi(path, query_string, downloads, threads, client_delay):
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [
+            executor.submit(download_wsgi, handler, path, query_string, client_delay)
+            for _ in range(downloads)
+        ]
+        results = [future.result() for future in futures]
+    return summarize(time.perf_counter() - start, results)
+
+
+def benchmark_asgi(path, query_string, downloads, client_delay):
+    from lida.asgi import application
+
+    async def serve():
+        return await asyncio.gather(
+            *(
+                download_asgi(application, path, query_string, client_delay)
+                for _ in range(downloads)
+            )
+        )
+
+    start = time.perf_counter()
+    results = asyncio.run(serve())
+    return summarize(time.perf_counter() - start, results)
+
+
+def run(downloads=32, threads=4, client_delay=0.02, scale="diatomic", data_dir=None):
+    from django.urls import reverse
+
+    molecule = populate(scale, data_dir)
+    path = reverse("api_endpoint")
+    query_string = f"molecule={molecule.formula_str}&category=transitions&format=json"
+    return {
+        "downloads": downloads,
+        "client_delay": client_delay,
+        "number_transitions": molecule.isotopologue.number_transitions,
+        "results": {
+            f"WSGI, {threads} threads": benchmark_wsgi(
+                path, query_string, downloads, threads, client_delay
+            ),
+            "ASGI, 1 event loop": benchmark_asgi(
+                path, query_string, downloads, client_delay
+            ),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--downloads", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=4, help="WSGI worker threads")
+    parser.add_argument(
+        "--client-delay", type=float, default=20, help="ms per 64 kB read by a client"
+    )
+    parser.add_argument(
+        "--scale",
+        choices=list(SCALES),
+        default="diatomic",
+        help="synthetic dataset populated into an empty database",
+    )
+    parser.add_argument("--database", help="SQLite database file with the data")
+    parser.add_argument("--output", help="json file to write the results into")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        setup_django(args.database or Path(tmp_dir) / "benchmark.sqlite3")
+        results = run(
+            args.downloads,
+            args.threads,
+            args.client_delay / 1000,
+            args.scale,
+            Path(tmp_dir) / "data",
+        )
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
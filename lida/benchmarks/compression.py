@@ -0,0 +1,104 @@
+"""Bytes-on-wire and time-to-last-byte of the API and datatables ajax responses,
+for each of the available content encodings, and of the conditional (304)
+re-validation requests.
+
+Runs against the data in the configured database:
+    python -m benchmarks.compression [--molecule CO ...] [--output results.json]
+"""
+import argparse
+
+from .utils import (
+    AJAX_HEADERS,
+    datatable_query,
+    get_body,
+    setup_django,
+    timed,
+    write_results,
+)
+
+
+def get_urls(molecule):
+    from django.urls import reverse
+
+    urls = {}
+    for category in "states", "transitions":
+        for fmt in "json", "csv":
+            urls[f"api {category} {fmt}"] = (
+                f"{reverse('api_endpoint')}?molecule={molecule.formula_str}"
+                f"&category={category}&format={fmt}",
+                {},
+            )
+    urls["ajax states"] = (
+        reverse("state-list-ajax", args=[molecule.slug]),
+        datatable_query("state-list-ajax", order=((2, "asc"),)),
+    )
+    urls["ajax transitions"] = (
+        reverse("transition-list-ajax", args=[molecule.slug]),
+        datatable_query("transition-list-ajax"),
+    )
+    return urls
+
+
+def benchmark_url(client, url, params, repeat):
+    from lida.compression import get_encodings
+
+    results = {}
+    for encoding in ["identity", *get_encodings()]:
+
+        def get():
+            response = client.get(
+                url, params, HTTP_ACCEPT_ENCODING=encoding, **AJAX_HEADERS
+            )
+            return response, get_body(response)
+
+        ttlb, (response, body) = timed(get, repeat=repeat)
+        results[encoding] = {
+            "content_encoding": response.get("Content-Encoding", "identity"),
+            "bytes": len(body),
+            "time_to_last_byte": ttlb,
+        }
+        etag = response.get("ETag")
+        if etag and encoding == "identity":
+
+            def revalidate():
+                return client.get(url, params, HTTP_IF_NONE_MATCH=etag, **AJAX_HEADERS)
+
+            ttlb, response = timed(revalidate, repeat=repeat)
+            results["revalidation"] = {
+                "status_code": response.status_code,
+                "bytes": len(get_body(response)),
+                "time_to_last_byte": ttlb,
+            }
+    return results
+
+
+def run(molecules=None, repeat=5):
+    from django.test import Client
+
+    from app_site.models import Molecule
+
+    client = Client()
+    queryset = Molecule.objects.all()
+    if molecules:
+        queryset = queryset.filter(formula_str__in=molecules)
+    results = {}
+    for molecule in queryset:
+        results[molecule.formula_str] = {
+            name: benchmark_url(client, url, params, repeat)
+            for name, (url, params) in get_urls(molecule).items()
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--molecule", action="append", help="defaults to all")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="json file to write the results into")
+    args = parser.parse_args()
+    setup_django()
+    write_results(run(args.molecule, args.repeat), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Per-request overhead of the database connection handling.
+
+Serves a sequence of requests through the full WSGI handler (in a single thread, as a
+sync worker would) with the connections closed after each request (CONN_MAX_AGE=0),
+with persistent connections, and with persistent connections and health checks, and
+reports the request latencies and the number of the connections opened. The streamed
+API exports are also served with and without the export connection pool.
+
+The SQLite connections are much cheaper than the networked MySQL ones, the
+--connect-latency option adds a delay to each new connection, standing in for the
+MySQL connection handshake (a few ms even on a local network).
+
+    python -m benchmarks.connections [--requests 200] [--connect-latency 5]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from .utils import datatable_query, setup_django, write_results
+
+
+class ConnectionCounter:
+    """Patches the database backend to count (and optionally slow down) the new
+    connections.
+    """
+
+    def __init__(self, alias="default", latency=0.0):
+        from django.db import connections
+
+        self.count = 0
+        backend_class = type(connections[alias])
+        get_new_connection = backend_class.get_new_connection
+
+        def counting_get_new_connection(wrapper, conn_params):
+            self.count += 1
+            if latency:
+                time.sleep(latency)
+            return get_new_connection(wrapper, conn_params)
+
+        backend_class.get_new_connection = counting_get_new_connection
+
+
+def create_data():
+    """A small dataset to serve, if the database has none."""
+    from app_site.models import Isotopologue, Molecule, State, Transition
+
+    if Isotopologue.objects.exists():
+        return
+    molecule = Molecule.create_from_data("CO")
+    isotopologue = Isotopologue.create_from_data(
+        molecule, iso_formula_str="(12C)(16O)", dataset_name="benchmark", version=1
+    )
+    states = [
+        State.create_from_data(
+            isotopologue,
+            lifetime=1 / v if v else None,
+            energy=0.25 * v,
+            vib_state_str=str(v),
+            vib_state_labels="v",
+        )
+        for v in range(10)
+    ]
+    for initial, final in zip(states[1:], states):
+        Transition.create_from_data(initial, final, 1.0)
+
+
+def request(handler, path, query_string=""):
+    """Serves a single GET request by the WSGI handler, consuming the response."""
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query_string,
+        "HTTP_HOST": "testserver",
+        "HTTP_X_REQUESTED_WITH": "XMLHttpRequest",
+        "wsgi.input": BytesIO(),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    response = handler(environ, lambda status, headers: statuses.append(status))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    assert statuses[0].startswith("200"), statuses[0]
+
+
+def benchmark(handler, counter, path, query_string, number_requests):
+    from django.db import connection
+
+    connection.close()
+    counter.count = 0
+    latencies = []
+    for _ in range(number_requests):
+        start = time.perf_counter()
+        request(handler, path, query_string)
+        latencies.append(time.perf_counter() - start)
+    return {
+        "requests": number_requests,
+        "median": statistics.median(latencies),
+        "mean": statistics.mean(latencies),
+        "connections_opened": counter.count,
+    }
+
+
+def run(number_requests=200, connect_latency=0.0):
+    from django.conf import settings
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections
+    from django.urls import reverse
+
+    from app_site.models import Molecule
+
+    create_data()
+    molecule = Molecule.objects.first()
+    counter = ConnectionCounter(latency=connect_latency)
+    handler = WSGIHandler()
+    settings_dict = connections["default"].settings_dict
+    ajax_path = reverse("molecule-list-ajax")
+    export_path = reverse("api_endpoint")
+    export_query = f"molecule={molecule.formula_str}&category=transitions&format=csv"
+
+    ajax_query = urlencode(datatable_query("molecule-list-ajax"))
+    variants = {
+        "CONN_MAX_AGE=0": (0, False),
+        "CONN_MAX_AGE=600": (600, False),
+        "CONN_MAX_AGE=600, CONN_HEALTH_CHECKS": (600, True),
+    }
+    results = {}
+    for name, (max_age, health_checks) in variants.items():
+        settings_dict["CONN_MAX_AGE"] = max_age
+        settings_dict["CONN_HEALTH_CHECKS"] = health_checks
+        results[f"ajax {name}"] = benchmark(
+            handler, counter, ajax_path, ajax_query, number_requests
+        )
+
+    settings_dict["CONN_MAX_AGE"] = 0
+    settings_dict["CONN_HEALTH_CHECKS"] = False
+    for pool_size in 0, 2:
+        settings.EXPORT_CONNECTION_POOL_SIZE = pool_size
+        results[f"export CONN_MAX_AGE=0, pool size {pool_size}"] = benchmark(
+            handler, counter, export_path, export_query, number_requests
+        )
+    return {"connect_latency": connect_latency, "results": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--connect-latency",
+        type=float,
+        default=0.0,
+        help="ms added to each new connection, e.g. 5 as the MySQL stand-in",
+    )
+    parser.add_argument("--database", help="SQLite database file with the data")
+    parser.add_argument("--output", help="json file to write the results into")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        setup_django(args.database or Path(tmp_dir) / "benchmark.sqlite3")
+        results = run(args.requests, args.connect_latency / 1000)
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
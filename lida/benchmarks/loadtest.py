@@ -0,0 +1,258 @@
+"""Load test of the datatables ajax endpoints.
+
+A pool of threads (the simulated users) replays realistic datatables.net request
+sequences against the StateListAjaxView and TransitionListAjaxView: scrolling
+through the scroller-mode table (overlapping row windows), clicking on the column
+sorts, and typing into the search box (a request per keystroke). The throughput,
+the latency percentiles and the error rates are reported per endpoint, as json.
+
+By default, the Django app is served in-process by a threaded WSGI server (on a free
+local port) for the duration of the test, and the data in the configured database
+(or the --database SQLite file) are used. Pass --url to load a running server
+instead, which needs to be serving the same database the molecules are read from.
+
+    python -m benchmarks.loadtest [--users 8] [--duration 30] [--output load.json]
+"""
+import argparse
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from .utils import datatable_query, setup_django, write_results
+
+# the scroller mode loads the rows visible (~15) times the display buffer (9)
+SCROLLER_LENGTH = 135
+ENDPOINTS = ["state-list-ajax", "transition-list-ajax"]
+ORDERABLE_COLUMNS = {"state-list-ajax": 6, "transition-list-ajax": 5}
+
+
+class Session:
+    """A single user interacting with a single datatable: yields the GET parameters
+    of the ajax requests fired by the datatables.net, in order.
+    """
+
+    def __init__(self, rng, url_name, number_records, search_terms):
+        self.rng = rng
+        self.url_name = url_name
+        self.number_records = number_records
+        self.search_terms = search_terms
+        self.draw = 0
+
+    def query(self, **kwargs):
+        self.draw += 1
+        return datatable_query(
+            self.url_name, draw=self.draw, length=SCROLLER_LENGTH, **kwargs
+        )
+
+    def scroll(self):
+        yield self.query()
+        position = 0
+        for _ in range(self.rng.randint(3, 10)):
+            position += self.rng.randint(SCROLLER_LENGTH // 4, SCROLLER_LENGTH)
+            if position >= self.number_records:
+                break
+            # the new window is centered around the position scrolled to:
+            yield self.query(start=max(0, position - SCROLLER_LENGTH // 2))
+
+    def sort(self):
+        yield self.query()
+        for _ in range(self.rng.randint(1, 4)):
+            column = self.rng.randrange(ORDERABLE_COLUMNS[self.url_name])
+            yield self.query(order=((column, "asc"),))
+            yield self.query(order=((column, "desc"),))
+
+    def search(self):
+        yield self.query()
+        term = self.rng.choice(self.search_terms)
+        for i in range(1, len(term) + 1):
+            yield self.query(search=term[:i])
+
+    def requests(self):
+        scenario = self.rng.choice([self.scroll, self.sort, self.search])
+        return scenario.__name__, scenario()
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, latency, status):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+            self.statuses[endpoint][str(status)] += 1
+            if status != 200:
+                self.errors[endpoint] += 1
+
+    def summary(self, wall_time):
+        summary = {}
+        for endpoint, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            summary[endpoint] = {
+                "requests": len(latencies),
+                "throughput": len(latencies) / wall_time,
+                "error_rate": self.errors[endpoint] / len(latencies),
+                "statuses": dict(self.statuses[endpoint]),
+                "latency": {
+                    "p50": percentile(latencies, 50),
+                    "p95": percentile(latencies, 95),
+                    "p99": percentile(latencies, 99),
+                    "max": latencies[-1],
+                    "mean": sum(latencies) / len(latencies),
+                },
+            }
+        return summary
+
+
+def percentile(sorted_values, q):
+    """The nearest-rank q-th percentile."""
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def get_targets(molecules=None):
+    """[(url path, url name, number of records, search terms)] of the datatables of
+    all the molecules.
+    """
+    from django.urls import reverse
+
+    from app_site.models import Isotopologue
+
+    isotopologues = Isotopologue.objects.select_related("molecule")
+    if molecules:
+        isotopologues = isotopologues.filter(molecule__formula_str__in=molecules)
+    targets = []
+    for isotopologue in isotopologues:
+        slug = isotopologue.molecule.slug
+        terms = set()
+        for el_state_str, vib_state_str in isotopologue.state_set.values_list(
+            "el_state_str", "vib_state_str"
+        ).order_by("?")[:20]:
+            terms.add(f"v={vib_state_str}" if vib_state_str else el_state_str)
+        terms = sorted(term for term in terms if term) or [isotopologue.molecule.slug]
+        number_records = {
+            "state-list-ajax": isotopologue.number_states,
+            "transition-list-ajax": isotopologue.number_transitions,
+        }
+        for url_name in ENDPOINTS:
+            path = reverse(url_name, args=[slug])
+            targets.append((path, url_name, number_records[url_name], terms))
+    return targets
+
+
+def user(base_url, targets, results, deadline, think_time, seed):
+    rng = random.Random(seed)
+    while time.monotonic() < deadline:
+        path, url_name, number_records, terms = rng.choice(targets)
+        session = Session(rng, url_name, number_records, terms)
+        scenario, requests = session.requests()
+        endpoint = f"{url_name} {scenario}"
+        for params in requests:
+            if time.monotonic() >= deadline:
+                return
+            url = f"{base_url}{path}?{urllib.parse.urlencode(params)}"
+            request = urllib.request.Request(
+                url, headers={"X-Requested-With": "XMLHttpRequest"}
+            )
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as error:
+                status = error.code
+            except (urllib.error.URLError, OSError) as error:
+                status = type(error).__name__
+            latency = time.perf_counter() - start
+            results.record(url_name, latency, status)
+            results.record(endpoint, latency, status)
+            if think_time:
+                time.sleep(rng.expovariate(1 / think_time))
+
+
+def serve_in_process():
+    """Starts the threaded WSGI server in a daemon thread.
+
+    Returns
+    -------
+    tuple[ThreadedWSGIServer, str]
+        The server and its base url.
+    """
+    from django.conf import settings
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    class QuietWSGIRequestHandler(WSGIRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "127.0.0.1"]
+    server = ThreadedWSGIServer(("127.0.0.1", 0), QuietWSGIRequestHandler)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run(users=8, duration=30.0, base_url=None, molecules=None, think_time=0, seed=0):
+    targets = get_targets(molecules)
+    if not targets:
+        raise ValueError("No molecules to load test in the database!")
+    server = None
+    if base_url is None:
+        server, base_url = serve_in_process()
+    results = Results()
+    deadline = time.monotonic() + duration
+    threads = [
+        threading.Thread(
+            target=user,
+            args=(base_url, targets, results, deadline, think_time, seed + i),
+        )
+        for i in range(users)
+    ]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.monotonic() - start
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+    return {
+        "users": users,
+        "duration": wall_time,
+        "think_time": think_time,
+        "endpoints": results.summary(wall_time),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds")
+    parser.add_argument(
+        "--think-time", type=float, default=0, help="mean pause between requests (s)"
+    )
+    parser.add_argument("--url", help="base url of a running server to load test")
+    parser.add_argument("--molecule", action="append", help="defaults to all")
+    parser.add_argument("--database", help="SQLite database file with the data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="json file to write the results into")
+    args = parser.parse_args()
+    setup_django(args.database)
+    base_url = args.url.rstrip("/") if args.url else None
+    results = run(
+        args.users, args.duration, base_url, args.molecule, args.think_time, args.seed
+    )
+    write_results(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
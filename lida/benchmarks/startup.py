@@ -0,0 +1,105 @@
+"""Cold start-up time of the app: the wall time of booting a fresh interpreter into
+a WSGI worker ready to serve (the WSGI application set up and the url conf, with all
+the views, imported) or into a bare manage.py command (django.setup only), and the
+python -X importtime profile of the boot: the cumulative import time of each
+top-level package and the slowest individual modules.
+
+    python -m benchmarks.startup [--repeat 10] [--top 15] [--output results.json]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from .utils import write_results
+
+BOOTS = {
+    "wsgi worker": "from lida.wsgi import application\nimport lida.urls",
+    "manage.py command": "import django\ndjango.setup()",
+}
+
+# the packages which should not be imported by any boot, but only when first needed
+LAZY_PACKAGES = ["pyvalem", "pyparsing", "numpy", "pandas", "tqdm", "pyarrow"]
+
+
+def run_boot(code, importtime=False):
+    """Runs the boot code in a fresh interpreter, returns (wall time, stderr)."""
+    code = (
+        "import os\n"
+        "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lida.settings')\n"
+        f"{code}"
+    )
+    args = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", code]
+    start = time.perf_counter()
+    process = subprocess.run(
+        args,
+        cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return time.perf_counter() - start, process.stderr
+
+
+def parse_importtime(stderr):
+    """The (self, cumulative) import times in seconds of each imported module, from
+    the python -X importtime output, as {module: (self, cumulative)}.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    return modules
+
+
+def get_profile(modules, top):
+    packages = defaultdict(float)
+    for name, (self_time, _) in modules.items():
+        packages[name.split(".")[0]] += self_time
+    slowest = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)
+    return {
+        "total_import_time": sum(self_time for self_time, _ in modules.values()),
+        "packages": dict(
+            sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+        ),
+        "slowest_modules": {
+            name: cumulative for name, (_, cumulative) in slowest[:top]
+        },
+        "lazy_packages_imported": [
+            package for package in LAZY_PACKAGES if package in packages
+        ],
+    }
+
+
+def run(repeat=10, top=15):
+    results = {}
+    for name, code in BOOTS.items():
+        run_boot(code)  # warms up the file system caches and the bytecode
+        wall_times = [run_boot(code)[0] for _ in range(repeat)]
+        _, stderr = run_boot(code, importtime=True)
+        results[name] = {
+            "wall_time": {
+                "median": statistics.median(wall_times),
+                "min": min(wall_times),
+            },
+            **get_profile(parse_importtime(stderr), top),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15, help="packages and modules")
+    parser.add_argument("--output", help="json file to write the results into")
+    args = parser.parse_args()
+    write_results(run(args.repeat, args.top), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Benchmark suite timing the LIDA hot paths on the synthetic datasets.
+
+For each of the synthetic dataset scales (see benchmarks.synthetic), the dataset is
+populated into an emptied SQLite database, and the population, the
+sync_inconsistent_db and check_consistency commands, the datatables ajax
+paging, sorting and searching, and the API export are timed. The results (median
+times and the SQL query counts) are written as json, together with the git commit,
+so they can be compared between commits.
+
+    python -m benchmarks.suite [--scale diatomic ...] [--output results.json]
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+from pathlib import Path
+
+from .synthetic import SCALES, generate_scale
+from .utils import (
+    AJAX_HEADERS,
+    datatable_query,
+    get_body,
+    get_environment,
+    setup_django,
+    timed,
+    write_results,
+)
+
+
+def measure(func, repeat):
+    """Times the func (median over the repeats), counting its SQL queries."""
+    from lida.instrumentation import instrument
+
+    with instrument() as metrics:
+        func()
+    seconds = metrics.total_time
+    if repeat > 1:
+        seconds, _ = timed(func, repeat=repeat - 1)
+    return {"time": seconds, "query_count": metrics.query_count}
+
+
+def get_datatable_requests(molecule, number_states, number_transitions):
+    """{name: (url, params)} of the datatables ajax requests to time."""
+    from django.urls import reverse
+
+    states_url = reverse("state-list-ajax", args=[molecule.slug])
+    transitions_url = reverse("transition-list-ajax", args=[molecule.slug])
+    return {
+        "states first page": (states_url, {}),
+        "states middle page": (states_url, {"start": number_states // 2}),
+        "states sorted by energy desc": (states_url, {"order": ((2, "desc"),)}),
+        "states sorted by lifetime": (states_url, {"order": ((3, "asc"),)}),
+        "states search": (states_url, {"search": "v=1"}),
+        "transitions first page": (transitions_url, {}),
+        "transitions middle page": (
+            transitions_url,
+            {"start": number_transitions // 2},
+        ),
+        "transitions sorted by partial lifetime": (
+            transitions_url,
+            {"order": ((3, "asc"),)},
+        ),
+        "transitions sorted by branching ratio desc": (
+            transitions_url,
+            {"order": ((4, "desc"),)},
+        ),
+        "transitions search": (transitions_url, {"search": "v=1"}),
+    }
+
+
+def benchmark_datatables(client, molecule, isotopologue, repeat):
+    results = {}
+    requests = get_datatable_requests(
+        molecule, isotopologue.number_states, isotopologue.number_transitions
+    )
+    for name, (url, query) in requests.items():
+        url_name = "state-list-ajax" if "states" in name else "transition-list-ajax"
+        params = datatable_query(url_name, **query)
+
+        def request():
+            response = client.get(url, params, **AJAX_HEADERS)
+            assert response.status_code == 200, response.status_code
+            return get_body(response)
+
+        results[name] = measure(request, repeat)
+    return results
+
+
+def benchmark_api(client, molecule, repeat):
+    from django.urls import reverse
+
+    from app_api.export import get_binary_formats
+
+    results = {}
+    formats = ["json", "csv", "ndjson", *get_binary_formats()]
+    for category in "states", "transitions":
+        for fmt in formats:
+            url = reverse("api_endpoint")
+            params = {"molecule": molecule.formula_str, "category": category}
+            if fmt == "ndjson":
+                url = reverse("api-batch")
+            params["format"] = fmt
+
+            def request():
+                response = client.get(url, params)
+                assert response.status_code == 200, response.status_code
+                return get_body(response)
+
+            results[f"{category} {fmt}"] = measure(request, repeat)
+    return results
+
+
+def benchmark_scale(scale, data_dir, repeat):
+    from django.core.management import call_command
+    from django.test import Client
+
+    from app_site.management.commands.check_consistency import find_inconsistencies
+    from app_site.management.commands.sync_inconsistent_db import sync_inconsistent_db
+    from app_site.models import Isotopologue
+    from res.populate_molecule import populate_molecule
+
+    call_command("flush", interactive=False, verbosity=0)
+    dataset_dir = generate_scale(data_dir, scale)
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        with contextlib.redirect_stderr(io.StringIO()):
+            results["populate"] = measure(lambda: populate_molecule(dataset_dir), 1)
+    results["sync_inconsistent_db"] = measure(
+        lambda: sync_inconsistent_db(verbose=False), 1
+    )
+    results["check_consistency"] = measure(find_inconsistencies, repeat)
+
+    isotopologue = Isotopologue.objects.get(molecule__formula_str=dataset_dir.name)
+    client = Client()
+    results["datatables"] = benchmark_datatables(
+        client, isotopologue.molecule, isotopologue, repeat
+    )
+    results["api"] = benchmark_api(client, isotopologue.molecule, repeat)
+    return {
+        "number_states": isotopologue.number_states,
+        "number_transitions": isotopologue.number_transitions,
+        "results": results,
+    }
+
+
+def run(scales, repeat=5, database=None):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        setup_django(database or Path(tmp_dir) / "benchmark.sqlite3")
+        return {
+            "environment": get_environment(),
+            "scales": {
+                scale: benchmark_scale(scale, Path(tmp_dir) / "data", repeat)
+                for scale in scales
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scale",
+        action="append",
+        choices=list(SCALES),
+        help="defaults to the diatomic only",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--database", help="SQLite database file to use, all its data are flushed!"
+    )
+    parser.add_argument("--output", help="json file to write the results into")
+    args = parser.parse_args()
+    scales = args.scale or ["diatomic"]
+    write_results(run(scales, args.repeat, args.database), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Generator of synthetic LIDA datasets.
+
+Writes directories in the exact format of the exomol2lida outputs consumed by the
+res.populate_molecule script (meta_data.json, states_data.csv, states_electronic.csv,
+states_vibrational.csv and transitions_data.csv), at the scales defined in SCALES,
+from a small diatomic up to a large polyatomic. The data are random, but physically
+consistent (the lifetimes are the inverse sums of the partial decay rates, the
+transitions always decay to states of lower energy) and reproducible by the seed.
+
+    python -m benchmarks.synthetic OUTPUT_DIR [--scale diatomic ...]
+"""
+import argparse
+import csv
+import itertools
+import json
+import math
+import random
+from pathlib import Path
+
+# Each scale is a single molecule: all the combinations of the vibrational quanta
+# up to max_quanta in total are generated for each electronic state, and each state
+# decays into up to transitions_per_state lower states.
+SCALES = {
+    "diatomic": {
+        "formula": "CO",
+        "iso_formula": "(12C)(16O)",
+        "el_states": ["X(1SIGMA+)", "a(3PI)", "A(1PI)"],
+        "vib_labels": ["v"],
+        "max_quanta": 30,
+        "transitions_per_state": 5,
+    },
+    "triatomic": {
+        "formula": "H2O",
+        "iso_formula": "(1H)2(16O)",
+        "el_states": ["X(1A1)", "A(1B1)"],
+        "vib_labels": ["v1", "v2", "v3"],
+        "max_quanta": 12,
+        "transitions_per_state": 8,
+    },
+    "polyatomic": {
+        "formula": "CH4",
+        "iso_formula": "(12C)(1H)4",
+        "el_states": ["X(1A1)"],
+        "vib_labels": ["v1", "v2", "v3", "v4"],
+        "max_quanta": 14,
+        "transitions_per_state": 10,
+    },
+    "large-polyatomic": {
+        "formula": "C2H4",
+        "iso_formula": "(12C)2(1H)4",
+        "el_states": ["X(1A1)", "A(1B2)"],
+        "vib_labels": ["v1", "v2", "v3", "v4", "v5", "v6"],
+        "max_quanta": 10,
+        "transitions_per_state": 20,
+    },
+}
+
+
+def get_vib_states(n_modes, max_quanta):
+    """All the tuples of n_modes vibrational quanta summing up to max_quanta at most."""
+    return [
+        vib_state
+        for vib_state in itertools.product(range(max_quanta + 1), repeat=n_modes)
+        if sum(vib_state) <= max_quanta
+    ]
+
+
+def generate_dataset(
+    output_dir,
+    formula,
+    iso_formula,
+    el_states,
+    vib_labels,
+    max_quanta,
+    transitions_per_state,
+    seed=0,
+):
+    """Writes a single synthetic dataset into output_dir/formula.
+
+    Returns
+    -------
+    Path
+        The dataset directory, ready to be passed to res.populate_molecule.
+    """
+    rng = random.Random(seed)
+    dataset_dir = Path(output_dir) / formula
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+
+    # energies in eV: electronic term values and harmonic vibrational energies
+    el_energies = [0.0, *sorted(rng.uniform(1.0, 8.0) for _ in el_states[1:])]
+    vib_energies = [rng.uniform(0.05, 0.45) for _ in vib_labels]
+    states = []  # (energy, el_state_str, vib_state)
+    for el_state_str, el_energy in zip(el_states, el_energies):
+        for vib_state in get_vib_states(len(vib_labels), max_quanta):
+            energy = el_energy + sum(w * v for w, v in zip(vib_energies, vib_state))
+            states.append((energy, el_state_str, vib_state))
+    states.sort()
+
+    # transitions from each state into random lower states, favouring the near ones
+    transitions = []  # (i, f, partial_lifetime)
+    lifetimes = []
+    for i in range(len(states)):
+        candidates = range(max(0, i - 10 * transitions_per_state), i)
+        n_final = min(transitions_per_state, len(candidates))
+        final_states = rng.sample(candidates, n_final)
+        rates = []
+        for f in sorted(final_states):
+            partial_lifetime = 10 ** rng.uniform(-8, 2)
+            transitions.append((i, f, partial_lifetime))
+            rates.append(1 / partial_lifetime)
+        lifetimes.append(1 / sum(rates) if rates else math.inf)
+
+    with open(dataset_dir / "meta_data.json", "w") as fp:
+        json.dump(
+            {
+                "iso_formula": iso_formula,
+                "version": 1,
+                "input": {"dataset_name": f"synthetic-{seed}"},
+                "num_states": len(states),
+                "num_transitions": len(transitions),
+            },
+            fp,
+            indent=2,
+        )
+    _write_csv(
+        dataset_dir / "states_data.csv",
+        ["", "tau", "E"],
+        (
+            (i, lifetime, energy)
+            for i, (lifetime, (energy, _, _)) in enumerate(zip(lifetimes, states))
+        ),
+    )
+    _write_csv(
+        dataset_dir / "states_electronic.csv",
+        ["", "State"],
+        ((i, el_state_str) for i, (_, el_state_str, _) in enumerate(states)),
+    )
+    _write_csv(
+        dataset_dir / "states_vibrational.csv",
+        ["", *vib_labels],
+        ((i, *vib_state) for i, (_, _, vib_state) in enumerate(states)),
+    )
+    _write_csv(dataset_dir / "transitions_data.csv", ["i", "f", "tau_if"], transitions)
+    return dataset_dir
+
+
+def generate_scale(output_dir, scale, seed=0):
+    return generate_dataset(output_dir, **SCALES[scale], seed=seed)
+
+
+def _write_csv(path, header, rows):
+    with open(path, "w", newline="") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("output_dir")
+    parser.add_argument("--scale", action="append", choices=list(SCALES))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for scale in args.scale or SCALES:
+        print(generate_scale(args.output_dir, scale, args.seed))
+
+
+if __name__ == "__main__":
+    main()
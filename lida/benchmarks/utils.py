@@ -0,0 +1,162 @@
+import json
+import os
+import statistics
+import time
+
+
+def setup_django(sqlite_path=None):
+    """Configure Django for a stand-alone benchmark script, allowing the test client
+    to be used against the configured database.
+
+    Parameters
+    ----------
+    sqlite_path : str or Path, optional
+        If passed, the configured database is replaced by this SQLite database file,
+        which is migrated (and created, if it does not exist).
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lida.settings")
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.test.utils import setup_test_environment
+
+    if sqlite_path is not None:
+        settings.DATABASES = {
+            "default": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": str(sqlite_path),
+            }
+        }
+    django.setup()
+    setup_test_environment()
+    if sqlite_path is not None:
+        call_command("migrate", interactive=False, verbosity=0)
+
+
+def get_environment():
+    """The meta-data identifying the benchmarked code and environment."""
+    import platform
+    import subprocess
+    from datetime import datetime, timezone
+
+    import django
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": connection.vendor,
+    }
+
+
+def timed(func, *args, repeat=5, **kwargs):
+    """Returns the (median time in seconds, last result) of repeated func calls."""
+    times, result = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func(*args, **kwargs)
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times), result
+
+
+def get_body(response):
+    """The whole (possibly streamed) response body, which is consumed."""
+    if response.streaming:
+        return b"".join(response.streaming_content)
+    return response.content
+
+
+# the columns of the datatables as defined by the html views, by ajax url name:
+DATATABLE_COLUMNS = {
+    "molecule-list-ajax": [
+        "html",
+        "number_atoms",
+        "isotopologue__mass",
+        "isotopologue__number_states",
+        "isotopologue__number_transitions",
+    ],
+    "state-list-ajax": [
+        "el_state_html",
+        "vib_state_html",
+        "energy",
+        "lifetime",
+        "number_transitions_from",
+        "number_transitions_to",
+    ],
+    "transition-list-ajax": [
+        "initial_state__state_html",
+        "final_state__state_html",
+        "delta_energy",
+        "partial_lifetime",
+        "branching_ratio",
+    ],
+}
+DATATABLE_SEARCHABLE = {
+    "html",
+    "number_atoms",
+    "el_state_html",
+    "vib_state_html",
+    "initial_state__state_html",
+    "final_state__state_html",
+}
+
+
+def datatable_query(
+    url_name,
+    draw=1,
+    start=0,
+    length=50,
+    order=((0, "asc"),),
+    search="",
+    column_search=None,
+    **extra,
+):
+    """GET parameters of a datatables.net server-side ajax request, as sent by the
+    site/datatable.html template.
+
+    The column_search is {column index: search value} of the individual column
+    searches (the inputs in the table footer).
+    """
+    column_search = column_search or {}
+    params = {
+        "draw": draw,
+        "start": start,
+        "length": length,
+        "search[value]": search,
+        "search[regex]": "false",
+    }
+    for i, name in enumerate(DATATABLE_COLUMNS[url_name]):
+        params.update(
+            {
+                f"columns[{i}][data]": i,
+                f"columns[{i}][name]": name,
+                f"columns[{i}][searchable]": str(name in DATATABLE_SEARCHABLE).lower(),
+                f"columns[{i}][orderable]": "true",
+                f"columns[{i}][search][value]": column_search.get(i, ""),
+                f"columns[{i}][search][regex]": "false",
+            }
+        )
+    for i, (column, direction) in enumerate(order):
+        params[f"order[{i}][column]"] = column
+        params[f"order[{i}][dir]"] = direction
+    params.update(extra)
+    return params
+
+
+AJAX_HEADERS = {"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"}
+
+
+def write_results(results, output=None):
+    text = json.dumps(results, indent=2)
+    if output:
+        with open(output, "w") as fp:
+            fp.write(text)
+    print(text)
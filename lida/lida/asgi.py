@@ -3,14 +3,117 @@ ASGI config for lida project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The Django ASGIHandler iterates the streaming responses (the API exports) in the
+event loop thread itself, blocking the loop (and all the other requests) for as long
+as each chunk takes to generate. The ASGIHandler below advances each streaming
+response in a thread of its own instead, so a single ASGI worker serves many
+concurrent downloads, while their chunks (and the queries behind them) are still
+generated in order, on a single thread and so a single database connection. The
+queries are recorded by the instrumentation of the request (see lida.instrumentation)
+on the connection of that thread too.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
 
+import asyncio
+import contextvars
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.core.handlers import asgi
+from django.db import connections
+
+from lida.instrumentation import instrumented
+
+_DONE = object()
+
+
+def _instrumented(func, *args):
+    with instrumented(connections.all()):
+        return func(*args)
+
+
+def _close(iterable):
+    try:
+        if hasattr(iterable, "close"):
+            iterable.close()
+    finally:
+        # the connections opened by the thread would outlive the download otherwise
+        connections.close_all()
+
+
+async def iterate_in_thread(iterable):
+    """Asynchronous iterator over the (synchronous) iterable, advanced in a single
+    thread dedicated to it, in the context of the caller. The iterable (e.g. the
+    response) is closed in the same thread once done.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    executor = ThreadPoolExecutor(1, thread_name_prefix="lida-stream")
+
+    def run(func, *args):
+        return loop.run_in_executor(executor, context.run, _instrumented, func, *args)
+
+    try:
+        iterator = await run(iter, iterable)
+        try:
+            while True:
+                chunk = await run(next, iterator, _DONE)
+                if chunk is _DONE:
+                    return
+                yield chunk
+        finally:
+            await run(_close, iterable)
+    finally:
+        executor.shutdown(wait=False)
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """ASGIHandler generating each streaming response in a thread of its own."""
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": self.get_response_headers(response),
+            }
+        )
+        # access __iter__ rather than streaming_content, as the Django handler
+        chunks = iterate_in_thread(response)
+        try:
+            async for part in chunks:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+            await send({"type": "http.response.body"})
+        finally:
+            # closes the response too
+            await chunks.aclose()
+
+    @staticmethod
+    def get_response_headers(response):
+        """The response headers and cookies, as in the Django ASGIHandler."""
+        headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode("ascii")
+            if isinstance(value, str):
+                value = value.encode("latin1")
+            headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            headers.append(
+                (b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+            )
+        return headers
 
-from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lida.settings")
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+application = ASGIHandler()
@@ -0,0 +1,130 @@
+"""Transparent response compression.
+
+Extends the Django GZipMiddleware to only compress the text content types (the
+zip archives and binary API formats are compressed already), and to prefer the
+zstd or brotli encodings, if accepted by the client and if the optional
+zstandard or brotli libraries are installed.
+"""
+import re
+
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_CONTENT_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+)
+
+
+def _zstd_compress_string(s):
+    return zstandard.ZstdCompressor().compress(s)
+
+
+def _zstd_compress_sequence(sequence):
+    compressor = zstandard.ZstdCompressor().compressobj()
+    for item in sequence:
+        data = compressor.compress(item) + compressor.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _brotli_compress_string(s):
+    return brotli.compress(s, quality=5)
+
+
+def _brotli_compress_sequence(sequence):
+    compressor = brotli.Compressor(quality=5)
+    for item in sequence:
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def get_encodings():
+    """Available encodings as {name: (compress_string, compress_sequence)}, in the
+    order of preference.
+    """
+    encodings = {}
+    if zstandard is not None:
+        encodings["zstd"] = _zstd_compress_string, _zstd_compress_sequence
+    if brotli is not None:
+        encodings["br"] = _brotli_compress_string, _brotli_compress_sequence
+    encodings["gzip"] = compress_string, compress_sequence
+    return encodings
+
+
+def get_accepted_encodings(accept_encoding):
+    """Set of the encodings accepted by the Accept-Encoding header value (ignoring
+    the ones with q=0).
+    """
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if any(re.fullmatch(r"q=0(\.0*)?", param) for param in params):
+            continue
+        if coding:
+            accepted.add(coding.lower())
+    return accepted
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Compress the text content with the best encoding accepted by the client."""
+
+    def process_response(self, request, response):
+        # It's not worth attempting to compress really short responses.
+        if not response.streaming and len(response.content) < 200:
+            return response
+
+        # Avoid compressing if we've already got a content-encoding.
+        if response.has_header("Content-Encoding"):
+            return response
+
+        if not response.get("Content-Type", "").startswith(COMPRESSIBLE_CONTENT_TYPES):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        accepted = get_accepted_encodings(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        for encoding, (compress, compress_stream) in get_encodings().items():
+            if encoding in accepted:
+                break
+        else:
+            return response
+
+        if response.streaming:
+            # Delete the `Content-Length` header for streaming content, because
+            # we won't know the compressed size until we stream it.
+            response.streaming_content = compress_stream(response.streaming_content)
+            del response.headers["Content-Length"]
+        else:
+            # Return the compressed content only if it's actually shorter.
+            compressed_content = compress(response.content)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers["Content-Length"] = str(len(response.content))
+
+        # If there is a strong ETag, make it weak, as the GZipMiddleware does.
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+
+        return response
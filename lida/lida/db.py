@@ -0,0 +1,184 @@
+"""Database connection management.
+
+Persistent connections are configured by the standard CONN_MAX_AGE of each database
+in settings.DATABASES. On top of that, this module provides:
+
+- Connection health checks: the databases with CONN_HEALTH_CHECKS set have their
+  persistent connections checked at the start of each request, and the unusable ones
+  (e.g. closed by the MySQL server after its wait_timeout) are closed, so that the
+  request re-connects rather than failing. The option has the same meaning as the
+  Django>=4.1 setting of the same name.
+
+- A bounded pool of connections dedicated to the long streamed API exports
+  (settings.EXPORT_CONNECTION_POOL_SIZE), kept open across the requests (even with
+  CONN_MAX_AGE=0) and capping the number of the concurrent export queries. The pooled
+  connections live outside of the Django per-thread connection handling, the exports
+  iterate their querysets on them with the iterate function. The idle connections
+  are health-checked whenever checked out.
+"""
+import queue
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.models.query import ValuesListIterable
+
+from .instrumentation import instrumented
+from .routers import get_read_alias
+
+_local = threading.local()
+
+
+def check_connections_health(**kwargs):
+    """The request_started signal handler closing the unusable persistent connections
+    of the databases with CONN_HEALTH_CHECKS enabled.
+    """
+    for connection in connections.all():
+        if (
+            connection.settings_dict.get("CONN_HEALTH_CHECKS")
+            and connection.connection is not None
+            and not connection.in_atomic_block
+            and not connection.is_usable()
+        ):
+            connection.close()
+
+
+class PoolTimeout(DatabaseError):
+    pass
+
+
+class ConnectionPool:
+    """Bounded pool of database connections (DatabaseWrapper instances).
+
+    Parameters
+    ----------
+    alias : str
+        The database alias the pooled connections connect to.
+    size : int
+        Maximal number of the connections checked out at the same time.
+    timeout : float
+        Seconds to wait for a connection to be checked in, if all are in use.
+    """
+
+    def __init__(self, alias=DEFAULT_DB_ALIAS, size=4, timeout=30.0):
+        self.alias = alias
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._semaphore = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        """Context manager checking out a (healthy) connection from the pool."""
+        if not self._semaphore.acquire(timeout=self.timeout):
+            raise PoolTimeout(
+                f"No connection to {self.alias} freed up in {self.timeout} seconds."
+            )
+        try:
+            connection = self._checkout()
+            try:
+                yield connection
+            finally:
+                self._checkin(connection)
+        finally:
+            self._semaphore.release()
+
+    def _checkout(self):
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = connections.create_connection(self.alias)
+                connection.inc_thread_sharing()
+                return connection
+            # the pooled connections are shared by whichever threads check them out
+            connection.inc_thread_sharing()
+            if self._is_healthy(connection):
+                return connection
+            connection.close()
+            connection.dec_thread_sharing()
+
+    def _checkin(self, connection):
+        if connection.connection is not None and connection.errors_occurred:
+            connection.close()
+        connection.dec_thread_sharing()
+        self._idle.put(connection)
+
+    @staticmethod
+    def _is_healthy(connection):
+        return connection.connection is None or connection.is_usable()
+
+    def close(self):
+        """Closes all the idle connections."""
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            connection.inc_thread_sharing()
+            connection.close()
+            connection.dec_thread_sharing()
+
+
+_export_pools = {}
+_export_pools_lock = threading.Lock()
+
+
+def get_export_pool(alias=DEFAULT_DB_ALIAS):
+    """The pool for the streamed exports from the database alias, or None if disabled
+    in the settings.
+    """
+    size = getattr(settings, "EXPORT_CONNECTION_POOL_SIZE", 0)
+    if not size:
+        return None
+    with _export_pools_lock:
+        pool = _export_pools.get(alias)
+        if pool is None or pool.size != size:
+            pool = _export_pools[alias] = ConnectionPool(alias, size)
+        return pool
+
+
+@contextmanager
+def use_connection(connection):
+    """Makes the iterate function (in this thread) run the queries on the connection,
+    recorded by the instrumentation of the current context (see lida.instrumentation).
+    """
+    previous = getattr(_local, "connection", None)
+    _local.connection = connection
+    try:
+        with instrumented([connection]):
+            yield connection
+    finally:
+        _local.connection = previous
+
+
+def pooled(chunks):
+    """Wraps the (lazily evaluated) chunks of a streamed export, so that the querysets
+    iterated while generating them run on a connection from the export pool (if
+    enabled), connected to the database the data are read from in the current context
+    (see lida.routers). The connection is checked out when the streaming starts and
+    checked back in when it finishes (or the response is closed).
+    """
+    pool = get_export_pool(get_read_alias())
+    if pool is None:
+        yield from chunks
+        return
+    with pool.connection() as connection:
+        with use_connection(connection):
+            yield from chunks
+
+
+def iterate(queryset, chunk_size=2000):
+    """Iterates over the rows of the values_list queryset in chunks, on the connection
+    set by use_connection, or on the default Django connection if none was set.
+    """
+    connection = getattr(_local, "connection", None)
+    if connection is None:
+        return queryset.iterator(chunk_size=chunk_size)
+    if queryset._iterable_class is not ValuesListIterable:
+        raise TypeError("Only the values_list querysets can be iterated on the pool.")
+    compiler = queryset.query.chain().get_compiler(connection=connection)
+    return compiler.results_iter(
+        tuple_expected=True, chunked_fetch=True, chunk_size=chunk_size
+    )
@@ -0,0 +1,261 @@
+"""Per-request cost instrumentation.
+
+Records the number of SQL queries, the total database time, the slowest queries,
+the template rendering time, the remaining (Python) time and the response size of
+a request, or of any block of code wrapped in the instrument context manager.
+
+The InstrumentationMiddleware is opt-in: it only instruments the
+settings.INSTRUMENTATION_SAMPLE_RATE fraction of the requests (none by default), and
+reports the metrics as a Server-Timing header and a json line logged to the
+"lida.instrumentation" logger. The requests not sampled pay no overhead, the sampled
+ones pay a couple of perf_counter calls per SQL query.
+
+The queries are recorded on the Django connections of the thread the instrumentation
+started in, and on the connections its context (see activate) uses elsewhere: the
+pooled connections of the streamed exports (lida.db.use_connection), and those of
+the threads the ASGI handler generates the streaming responses in (lida.asgi).
+"""
+import heapq
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger("lida.instrumentation")
+
+SLOW_QUERIES = 3
+MAX_SQL_LENGTH = 300
+
+# the execute wrappers recording the queries of the current context
+_active = ContextVar("lida_execute_wrappers", default=())
+
+
+def activate(wrapper):
+    """Records the queries of the current context by the execute wrapper also on the
+    connections of the other threads and the pooled connections (see instrumented).
+    """
+    _active.set((*_active.get(), wrapper))
+
+
+def deactivate(wrapper):
+    _active.set(tuple(active for active in _active.get() if active is not wrapper))
+
+
+@contextmanager
+def instrumented(connections_):
+    """Context manager installing the execute wrappers activated in the current
+    context on the database connections for the duration of the block.
+    """
+    installed = []
+    for connection in connections_:
+        for wrapper in _active.get():
+            if wrapper not in connection.execute_wrappers:
+                connection.execute_wrappers.append(wrapper)
+                installed.append((connection, wrapper))
+    try:
+        yield
+    finally:
+        for connection, wrapper in installed:
+            connection.execute_wrappers.remove(wrapper)
+
+
+class Metrics:
+    """Metrics of a single instrumented request (or code block).
+
+    Implements the database execute_wrapper protocol, so it can be installed on the
+    connections to time all the queries executed.
+    """
+
+    def __init__(self, label=None, slow_queries=SLOW_QUERIES):
+        self.label = label
+        self.slow_queries = slow_queries
+        self.query_count = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.response_size = None
+        self.start = time.perf_counter()
+        self.end = None
+        self._slowest = []  # heap of (duration, sequence, sql)
+        self._installed = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.query_count += 1
+            self.db_time += duration
+            if self.slow_queries:
+                item = (duration, self.query_count, sql)
+                if len(self._slowest) < self.slow_queries:
+                    heapq.heappush(self._slowest, item)
+                elif duration > self._slowest[0][0]:
+                    heapq.heapreplace(self._slowest, item)
+
+    def install(self):
+        """Start timing the queries on all the (thread-local) database connections,
+        and on the other connections used in the current context.
+        """
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+            self._installed.append(connection)
+        activate(self)
+
+    def uninstall(self):
+        while self._installed:
+            self._installed.pop().execute_wrappers.remove(self)
+        deactivate(self)
+
+    def stop(self):
+        self.uninstall()
+        if self.end is None:
+            self.end = time.perf_counter()
+
+    @property
+    def total_time(self):
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+    @property
+    def python_time(self):
+        """The time not spent waiting for the database (nor rendering templates,
+        which may run queries of their own).
+        """
+        return max(self.total_time - self.db_time - self.template_time, 0.0)
+
+    @property
+    def slowest_queries(self):
+        return [
+            {"time": duration, "sql": sql[:MAX_SQL_LENGTH]}
+            for duration, _, sql in sorted(self._slowest, reverse=True)
+        ]
+
+    def as_dict(self):
+        return {
+            "label": self.label,
+            "query_count": self.query_count,
+            "db_time": self.db_time,
+            "template_time": self.template_time,
+            "python_time": self.python_time,
+            "total_time": self.total_time,
+            "response_size": self.response_size,
+            "slowest_queries": self.slowest_queries,
+        }
+
+    def server_timing(self):
+        """The Server-Timing header value, with the durations in milliseconds."""
+        return ", ".join(
+            [
+                f'db;dur={1e3 * self.db_time:.1f};desc="{self.query_count} queries"',
+                f"tmpl;dur={1e3 * self.template_time:.1f}",
+                f"app;dur={1e3 * self.python_time:.1f}",
+                f"total;dur={1e3 * self.total_time:.1f}",
+            ]
+        )
+
+    def log(self, **extra):
+        logger.info(json.dumps({**self.as_dict(), **extra}))
+
+
+@contextmanager
+def instrument(label=None, log=False, slow_queries=SLOW_QUERIES):
+    """Context manager instrumenting the code block, e.g.
+
+        with instrument("populate CO") as metrics:
+            ...
+        print(metrics.query_count, metrics.db_time)
+
+    Parameters
+    ----------
+    label : str, optional
+        Label of the block in the metrics.
+    log : bool
+        Whether to log the metrics to the "lida.instrumentation" logger on exit.
+    slow_queries : int
+        Number of the slowest queries to keep.
+    """
+    metrics = Metrics(label, slow_queries)
+    metrics.install()
+    try:
+        yield metrics
+    finally:
+        metrics.stop()
+        if log:
+            metrics.log()
+
+
+class InstrumentationMiddleware:
+    """Instruments the sampled requests, see the module docstring.
+
+    Should be listed first in settings.MIDDLEWARE, so the metrics cover the whole
+    middleware stack. The metrics of the streaming responses are logged only once
+    the streaming is exhausted, their Server-Timing header covers the time before
+    the streaming has started.
+    """
+
+    def __init__(self, get_response):
+        self.sample_rate = getattr(settings, "INSTRUMENTATION_SAMPLE_RATE", 0)
+        if not self.sample_rate:
+            raise MiddlewareNotUsed
+        self.slow_queries = getattr(
+            settings, "INSTRUMENTATION_SLOW_QUERIES", SLOW_QUERIES
+        )
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        metrics = Metrics(request.path, self.slow_queries)
+        request.instrumentation = metrics
+        metrics.install()
+        try:
+            response = self.get_response(request)
+        except Exception:
+            metrics.stop()
+            raise
+
+        response["Server-Timing"] = metrics.server_timing()
+        if response.streaming:
+            response.streaming_content = self._stream(
+                response.streaming_content, metrics, request, response
+            )
+        else:
+            metrics.stop()
+            metrics.response_size = len(response.content)
+            self._log(metrics, request, response)
+        return response
+
+    def process_template_response(self, request, response):
+        """Times the deferred rendering of the template responses."""
+        metrics = getattr(request, "instrumentation", None)
+        if metrics is not None:
+            start = time.perf_counter()
+
+            def callback(rendered_response):
+                metrics.template_time += time.perf_counter() - start
+
+            response.add_post_render_callback(callback)
+        return response
+
+    def _stream(self, streaming_content, metrics, request, response):
+        size = 0
+        try:
+            for chunk in streaming_content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            metrics.stop()
+            metrics.response_size = size
+            self._log(metrics, request, response)
+
+    @staticmethod
+    def _log(metrics, request, response):
+        metrics.log(method=request.method, status=response.status_code)
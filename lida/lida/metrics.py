@@ -0,0 +1,415 @@
+"""In-process metrics registry, exposed in the Prometheus text exposition format.
+
+The counters and histograms are updated in memory under a lock (safe across the
+threads of a worker). With the multi-process WSGI servers, each worker process
+periodically dumps its own values into a json file in the settings.METRICS_DIR
+shared directory, and the metrics view sums the values over all the files found
+there, so the served metrics cover all the workers, whichever one serves the
+request. The files are removed as their processes exit (or found dead, as the files
+are named by the process ids), so the restarted workers are not counted twice. The
+directory needs to be local to the host of the workers. Without the METRICS_DIR
+setting, only the process-local values are served.
+
+The MetricsMiddleware observing the requests is opt-in (settings.METRICS_ENABLED),
+and then only counts the SQL queries, without timing or keeping any of them (see
+lida.instrumentation for the detailed, sampled, per-request metrics).
+
+The metrics themselves are defined at the bottom of the module.
+"""
+import atexit
+import bisect
+import hmac
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+from .instrumentation import activate, deactivate
+
+FLUSH_INTERVAL = 1.0  # seconds
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}  # {label values tuple: value}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects the labels {self.labelnames}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key, **extra):
+        pairs = [*zip(self.labelnames, key), *extra.items()]
+        if not pairs:
+            return ""
+        escaped = (
+            (name, value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\""))
+            for name, value in pairs
+        )
+        return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+    @staticmethod
+    def merge(values, other):
+        """Adds the other values into the values (both {label values: value})."""
+        raise NotImplementedError
+
+    def expose(self, values):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.maybe_flush()
+
+    @staticmethod
+    def merge(values, other):
+        for key, value in other.items():
+            values[key] = values.get(key, 0) + value
+
+    def expose(self, values):
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{self._format_labels(key)} {value}"
+
+
+class Histogram(Metric):
+    """The values are stored as [per-bucket counts..., +Inf bucket count, sum]."""
+
+    type = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=None):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(buckets or DEFAULT_BUCKETS)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.registry.lock:
+            if key not in self.values:
+                self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts = self.values[key]
+            counts[i] += 1
+            counts[-1] += value
+        self.registry.maybe_flush()
+
+    def time(self, **labels):
+        """Context manager observing the duration of the block in seconds."""
+        return _Timer(self, labels)
+
+    @staticmethod
+    def merge(values, other):
+        for key, counts in other.items():
+            if key in values:
+                values[key] = [a + b for a, b in zip(values[key], counts)]
+            else:
+                values[key] = list(counts)
+
+    def expose(self, values):
+        bounds = [*(_format_float(b) for b in self.buckets), "+Inf"]
+        for key, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = self._format_labels(key, le=bound)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{self._format_labels(key)} {counts[-1]}"
+            yield f"{self.name}_count{self._format_labels(key)} {cumulative}"
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+def _format_float(value):
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        # unique across the worker restarts reusing the same pid:
+        self.process_id = f"{os.getpid()}_{time.time_ns()}"
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=None):
+        return self._register(
+            Histogram(self, name, documentation, labelnames, buckets)
+        )
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered!")
+        self.metrics[metric.name] = metric
+        return metric
+
+    @staticmethod
+    def get_directory():
+        directory = getattr(settings, "METRICS_DIR", None)
+        return Path(directory) if directory else None
+
+    def snapshot(self):
+        """The process-local values as {metric name: {label values: value}}."""
+        with self.lock:
+            return {
+                name: {key: _copy(value) for key, value in metric.values.items()}
+                for name, metric in self.metrics.items()
+            }
+
+    def maybe_flush(self):
+        if time.monotonic() - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Dumps the process-local values into the shared directory, if configured.
+        The file is replaced atomically, so it is never read half-written.
+        """
+        self._last_flush = time.monotonic()
+        directory = self.get_directory()
+        if directory is None:
+            return
+        # fork-safety: the registry might have been created in the parent process
+        if not self.process_id.startswith(f"{os.getpid()}_"):
+            self.process_id = f"{os.getpid()}_{time.time_ns()}"
+        data = {
+            name: [[list(key), value] for key, value in values.items()]
+            for name, values in self.snapshot().items()
+        }
+        with self._flush_lock:
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"{self.process_id}.json"
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(data))
+            os.replace(tmp_path, path)
+
+    def remove(self):
+        """Removes the file of this process from the shared directory, if any."""
+        directory = self.get_directory()
+        if directory is not None:
+            with self._flush_lock:
+                (directory / f"{self.process_id}.json").unlink(missing_ok=True)
+
+    def collect(self):
+        """Values aggregated over all the processes (or the process-local values, if
+        the shared directory is not configured).
+        """
+        directory = self.get_directory()
+        if directory is None:
+            return self.snapshot()
+        self.flush()
+        collected = {name: {} for name in self.metrics}
+        for path in directory.glob("*.json"):
+            if not _process_alive(path.stem):
+                # left behind by a killed worker
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                data = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            for name, items in data.items():
+                if name in self.metrics:
+                    self.metrics[name].merge(
+                        collected[name], {tuple(key): value for key, value in items}
+                    )
+        return collected
+
+    def expose(self):
+        """All the metrics in the Prometheus text exposition format."""
+        lines = []
+        for name, values in self.collect().items():
+            metric = self.metrics[name]
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            lines.extend(metric.expose(values))
+        return "\n".join(lines) + "\n"
+
+
+def _copy(value):
+    return list(value) if isinstance(value, list) else value
+
+
+def _process_alive(process_id):
+    """Whether the process of the process_id (pid_timestamp) is still running."""
+    try:
+        os.kill(int(process_id.split("_")[0]), 0)
+    except ValueError:
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # running under another user
+        return True
+    return True
+
+
+registry = Registry()
+atexit.register(registry.remove)
+
+
+def metrics_view(request):
+    """The metrics, served only to the requests authorized by the
+    settings.METRICS_TOKEN bearer token (and not at all without the token set).
+    """
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if not token:
+        raise Http404
+    authorization = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode()):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.expose(), content_type=CONTENT_TYPE)
+
+
+class _QueryCounter:
+    """Database execute_wrapper merely counting the queries of a request, timed from
+    its creation until stopped.
+    """
+
+    def __init__(self):
+        self.query_count = 0
+        self.start = time.perf_counter()
+        self.duration = None
+        self._installed = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.query_count += 1
+        return execute(sql, params, many, context)
+
+    def install(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+            self._installed.append(connection)
+        activate(self)
+
+    def stop(self):
+        while self._installed:
+            self._installed.pop().execute_wrappers.remove(self)
+        deactivate(self)
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.start
+
+
+class MetricsMiddleware:
+    """Counts the requests and observes their latency and SQL query counts, labeled
+    by the url name of the view, if settings.METRICS_ENABLED. The streaming
+    responses are observed once the streaming is exhausted.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = _QueryCounter()
+        counter.install()
+        try:
+            response = self.get_response(request)
+        except Exception:
+            counter.stop()
+            raise
+        if response.streaming:
+            response.streaming_content = self._stream(
+                response.streaming_content, counter, request, response
+            )
+        else:
+            self._observe(counter, request, response)
+        return response
+
+    def _stream(self, streaming_content, counter, request, response):
+        try:
+            yield from streaming_content
+        finally:
+            self._observe(counter, request, response)
+
+    @staticmethod
+    def _observe(counter, request, response):
+        counter.stop()
+        match = request.resolver_match
+        view = match.view_name if match is not None else "unresolved"
+        http_requests.inc(view=view, method=request.method, status=response.status_code)
+        http_request_duration.observe(counter.duration, view=view)
+        db_queries.observe(counter.query_count, view=view)
+
+
+http_requests = registry.counter(
+    "lida_http_requests_total",
+    "Number of the HTTP requests served.",
+    ["view", "method", "status"],
+)
+http_request_duration = registry.histogram(
+    "lida_http_request_duration_seconds",
+    "Time to the last byte of the HTTP responses.",
+    ["view"],
+)
+db_queries = registry.histogram(
+    "lida_db_queries_per_request",
+    "Number of the SQL queries executed per HTTP request.",
+    ["view"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+cache_requests = registry.counter(
+    "lida_cache_requests_total",
+    "Number of the cache lookups, by the cache and the result (hit or miss).",
+    ["cache", "result"],
+)
+populated_rows = registry.counter(
+    "lida_populated_rows_total",
+    "Number of the states and transitions populated into the database.",
+    ["category"],
+)
+populate_duration = registry.histogram(
+    "lida_populate_duration_seconds",
+    "Duration of the single-molecule data population.",
+    buckets=(1, 10, 30, 60, 300, 600, 1800, 3600, 7200, 14400),
+)
@@ -0,0 +1,133 @@
+"""Routing of the LIDA data reads to the read-only replicas of the primary database.
+
+The reads of the app_site and app_api models go to one of the settings.DATABASE_REPLICAS
+aliases, all the writes go to the primary (default) database. The replica is picked at
+random once per request by the ReplicaPinningMiddleware, so all the reads of a request
+(and of its streamed response) see the same replica; outside the requests it is picked
+per query. Without any replicas configured, everything uses the default database.
+
+Sticky-after-write: once a write is routed to the primary, all the following reads
+in the same context (request, or the whole population script run) are routed to the
+primary as well. The ReplicaPinningMiddleware extends this over the following
+requests of the same client (for settings.REPLICA_PIN_SECONDS, to cover the
+replication lag) by a cookie, so whoever triggered a write sees it.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+ROUTED_APP_LABELS = {"app_site", "app_api"}
+PIN_COOKIE = "lida_primary"
+
+_pinned = ContextVar("lida_pinned_to_primary", default=False)
+_written = ContextVar("lida_written_to_primary", default=False)
+_replica = ContextVar("lida_request_replica", default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, "DATABASE_REPLICAS", []))
+
+
+def get_read_alias():
+    """The database alias the LIDA data should be read from in the current context."""
+    replicas = get_replicas()
+    if _pinned.get() or not replicas:
+        return DEFAULT_DB_ALIAS
+    replica = _replica.get()
+    if replica in replicas:
+        return replica
+    return random.choice(replicas)
+
+
+@contextmanager
+def primary():
+    """Context manager routing all the reads within the block to the primary."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in ROUTED_APP_LABELS:
+            return get_read_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label in ROUTED_APP_LABELS:
+            _pinned.set(True)
+            _written.set(True)
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replicas get their schema replicated from the primary
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware:
+    """Routes the reads of the clients who wrote to the primary in the last
+    settings.REPLICA_PIN_SECONDS to the primary, and confines the sticky-after-write
+    pinning of each request to the request itself. The reads of the other requests all
+    go to a single replica, picked per request.
+    """
+
+    def __init__(self, get_response):
+        if not get_replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = PIN_COOKIE in request.COOKIES
+        replica = random.choice(get_replicas())
+        pinned_token, written_token = _pinned.set(pinned), _written.set(False)
+        replica_token = _replica.set(replica)
+        try:
+            response = self.get_response(request)
+            if _written.get():
+                response.set_cookie(
+                    PIN_COOKIE,
+                    "1",
+                    max_age=getattr(settings, "REPLICA_PIN_SECONDS", 15),
+                    httponly=True,
+                    samesite="Lax",
+                )
+            pinned = _pinned.get()
+        finally:
+            _pinned.reset(pinned_token)
+            _written.reset(written_token)
+            _replica.reset(replica_token)
+        if response.streaming:
+            response.streaming_content = self._routed_stream(
+                response.streaming_content, pinned, replica
+            )
+        return response
+
+    @staticmethod
+    def _routed_stream(streaming_content, pinned, replica):
+        """Keeps reading the streamed response from the database of its request."""
+        iterator = iter(streaming_content)
+        while True:
+            pinned_token, replica_token = _pinned.set(pinned), _replica.set(replica)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _pinned.reset(pinned_token)
+                _replica.reset(replica_token)
+            yield chunk
@@ -11,11 +11,31 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 from pathlib import Path
+from . import local_settings
 from .local_settings import SECRET_KEY, DEBUG, DATABASES, STATIC_URL, STATIC_ROOT, ALLOWED_HOSTS
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Persistent database connections: unless configured per database in the
+# local_settings, the connections are re-used by the requests for up to CONN_MAX_AGE
+# seconds, and checked at the start of each request (CONN_HEALTH_CHECKS, see
+# lida/db.py).
+for _database in DATABASES.values():
+    _database.setdefault("CONN_MAX_AGE", 60)
+    _database.setdefault("CONN_HEALTH_CHECKS", True)
+
+# Read-only replicas of the default database (their aliases in DATABASES), which the
+# app_site and app_api reads are routed to, and for how many seconds the clients who
+# wrote to the default database read from it, see lida/routers.py.
+DATABASE_REPLICAS = getattr(local_settings, "DATABASE_REPLICAS", [])
+DATABASE_ROUTERS = ["lida.routers.ReplicaRouter"]
+REPLICA_PIN_SECONDS = getattr(local_settings, "REPLICA_PIN_SECONDS", 15)
+
+# Size of the connection pool dedicated to the streamed API exports (0 disables it,
+# the exports then run on the request connections), see lida/db.py.
+EXPORT_CONNECTION_POOL_SIZE = getattr(local_settings, "EXPORT_CONNECTION_POOL_SIZE", 0)
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -31,7 +51,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "lida.instrumentation.InstrumentationMiddleware",
+    "lida.metrics.MetricsMiddleware",
+    "lida.routers.ReplicaPinningMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "lida.compression.CompressionMiddleware",
+    "django.middleware.http.ConditionalGetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -42,6 +67,14 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "lida.urls"
 
+# Fraction of the requests instrumented by the InstrumentationMiddleware (0 disables
+# it), and the number of the slowest SQL queries reported for each. Both can be set
+# in the local_settings.
+INSTRUMENTATION_SAMPLE_RATE = getattr(local_settings, "INSTRUMENTATION_SAMPLE_RATE", 0)
+INSTRUMENTATION_SLOW_QUERIES = getattr(
+    local_settings, "INSTRUMENTATION_SLOW_QUERIES", 3
+)
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -103,3 +136,64 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# Whether the MetricsMiddleware observes the latency and the query counts of all the
+# requests for the /metrics endpoint (off by default, as it wraps every query).
+METRICS_ENABLED = getattr(local_settings, "METRICS_ENABLED", False)
+
+# The bearer token of the /metrics requests (e.g. the bearer_token of the Prometheus
+# scrape config), the /metrics endpoint is not served at all without it.
+METRICS_TOKEN = getattr(local_settings, "METRICS_TOKEN", None)
+
+# Directory shared by all the worker processes (of the host), where each dumps its
+# metrics for the /metrics endpoint to aggregate. Only the metrics of the process
+# serving the /metrics request are exposed if not set.
+METRICS_DIR = getattr(local_settings, "METRICS_DIR", None)
+
+# Directory caching the SQLite snapshots served by the api/sqlite/ endpoint, a
+# lida_snapshots directory in the system temporary directory if not set.
+SNAPSHOT_DIR = getattr(local_settings, "SNAPSHOT_DIR", None)
+
+# The cache of the rendered molecule table rows and HTML pages (local to each process
+# by default, a shared cache saves rendering them in every process).
+CACHES = getattr(
+    local_settings,
+    "CACHES",
+    {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+)
+
+# Seconds for which the browsers may reuse the (server-side cached) HTML pages of the
+# states and transitions lists without requesting them again, see
+# app_site/views/page_cache.py.
+HTML_PAGE_MAX_AGE = getattr(local_settings, "HTML_PAGE_MAX_AGE", 60)
+
+# Number of the isotopologue transition graphs cached (per process) for the api/cascade/
+# endpoint, and the most states a single cascade response may list.
+CASCADE_CACHE_SIZE = getattr(local_settings, "CASCADE_CACHE_SIZE", 16)
+CASCADE_MAX_STATES = getattr(local_settings, "CASCADE_MAX_STATES", 10000)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "lida.instrumentation": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
+# Normalised storage mode of the states: their labels derived from the el_state_str
+# and vib_state_str are stored only once per distinct label, in the lookup tables,
+# and derived on the fly. Run the sync_state_labels command after switching it.
+NORMALISED_STATES = getattr(local_settings, "NORMALISED_STATES", False)
+
+# Database counters mode: the counters of the states and isotopologues and the delta
+# energies of the transitions are maintained by the database triggers (SQLite and
+# MySQL), so they stay in sync also with the bulk writes bypassing the save methods.
+# Run the sync_db_counters command after switching it.
+DB_COUNTERS = getattr(local_settings, "DB_COUNTERS", False)
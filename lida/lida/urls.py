@@ -16,8 +16,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("app_api.urls")),
+    path("metrics", metrics_view, name="metrics"),
     path("", include("app_site.urls")),
 ]
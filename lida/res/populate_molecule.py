@@ -4,10 +4,9 @@ Needs to be imported from the Django shell...
 import json
 from pathlib import Path
 
-import pandas as pd
-from tqdm import tqdm
-
 from app_site.models import Molecule, Isotopologue, State, Transition
+from lida.metrics import populate_duration, populated_rows
+from lida.routers import primary
 
 
 def populate_molecule(processed_data_dir):
@@ -29,6 +28,16 @@ def populate_molecule(processed_data_dir):
         logged by the `exomol2lida.process_dataset.DatasetProcessor`.
     """
 
+    with populate_duration.time(), primary():
+        _populate_molecule(processed_data_dir)
+
+
+def _populate_molecule(processed_data_dir):
+    # imported here, so that importing this module (or the benchmarks using it) does
+    # not cost the pandas start-up time
+    import pandas as pd
+    from tqdm import tqdm
+
     processed_data_dir = Path(processed_data_dir)
     molecule_formula = processed_data_dir.name
     with open(processed_data_dir / "meta_data.json") as fp:
@@ -92,34 +101,40 @@ def populate_molecule(processed_data_dir):
         ground_el_state_str = states_el.loc[i, "State"]
         isotopologue.set_ground_el_state_str(ground_el_state_str)
 
-    state_instances = {}  # django model instances
+    states = []
     print(f"Adding: States and transitions for {molecule_formula}.")
     for i in tqdm(states_data.index):
         lifetime, energy = states_data.loc[i, ["tau", "E"]]
         if states_el is not None:
             el_state_str = states_el.loc[i, "State"]
         if states_vib is not None:
-            vib_state = tuple(states_vib.loc[i])
+            # python ints rather than numpy scalars, which would leak into the str
+            vib_state = tuple(states_vib.loc[i].tolist())
             if len(vib_state) == 1:
                 vib_state = vib_state[0]
             vib_state_str = str(vib_state)
-        state = State.create_from_data(
-            isotopologue=isotopologue,
-            lifetime=float(lifetime),
-            energy=float(energy),
-            el_state_str=el_state_str,
-            vib_state_labels=vib_state_labels,
-            vib_state_str=vib_state_str,
+        states.append(
+            dict(
+                lifetime=float(lifetime),
+                energy=float(energy),
+                el_state_str=el_state_str,
+                vib_state_labels=vib_state_labels,
+                vib_state_str=vib_state_str,
+            )
         )
-        state_instances[i] = state
+    # all the states inserted at once, each distinct state label parsed only once
+    state_instances = dict(
+        zip(states_data.index, State.bulk_create_from_data(isotopologue, states))
+    )
+    populated_rows.inc(len(state_instances), category="states")
 
+    transitions = []
     for j in tqdm(transitions_data.index):
         i, f, tau_if = transitions_data.loc[j, ["i", "f", "tau_if"]]
-        Transition.create_from_data(
-            initial_state=state_instances[i],
-            final_state=state_instances[f],
-            partial_lifetime=float(tau_if)
-        )
+        transitions.append((state_instances[i], state_instances[f], float(tau_if)))
+    # all the transitions inserted at once, the decay ranks and counts synced once
+    Transition.bulk_create_from_data(transitions)
+    populated_rows.inc(len(transitions_data), category="transitions")
     assert State.objects.filter(isotopologue=isotopologue).count() == len(states_data)
     assert Transition.objects.filter(
         initial_state__isotopologue=isotopologue